@@ -2,6 +2,7 @@
 from .ble_wrapper import BLEWrapper
 from .ble_event_handler import BLEEventHandler
 from .ble_commands import BLECommands
+from .frames import EXTENDED_FIELDS
 
 # Define what should be available when the module is imported
-__all__ = ["BLEWrapper", "BLEEventHandler", "BLECommands"]
\ No newline at end of file
+__all__ = ["BLEWrapper", "BLEEventHandler", "BLECommands", "EXTENDED_FIELDS"]
\ No newline at end of file
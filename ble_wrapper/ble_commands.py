@@ -11,6 +11,17 @@ class BLECommands:
     # *** SETUP RELATED
 
     UPDATE_NAME = "name"
+    SYNC_TIME = "time" # argument: the Unix time in seconds
+
+    # *** NOTIFICATION RELATED ***
+
+    SET_DEADBAND = "deadband" # argument: <field>=<deadband>, e.g. "pm2_5=2.5"
+    SET_HEARTBEAT = "heartbeat" # argument: max seconds between notifications
+
+    # *** HISTORY RELATED ***
+
+    SEND_HISTORY = "history" # argument: the earliest timestamp in seconds, all records if omitted
+    SEND_HISTORY_COMPRESSED = "historyz" # same, as delta/varint encoded blocks
 
 
     # Map command strings to constants
@@ -19,5 +30,10 @@ class BLECommands:
         SETUP_MODE: SETUP_MODE,
         DATA_MODE: DATA_MODE,
         # DISCONNECT: DISCONNECT, 
-        UPDATE_NAME: UPDATE_NAME
+        UPDATE_NAME: UPDATE_NAME,
+        SYNC_TIME: SYNC_TIME,
+        SET_DEADBAND: SET_DEADBAND,
+        SET_HEARTBEAT: SET_HEARTBEAT,
+        SEND_HISTORY: SEND_HISTORY,
+        SEND_HISTORY_COMPRESSED: SEND_HISTORY_COMPRESSED
     }
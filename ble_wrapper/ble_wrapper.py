@@ -1,17 +1,30 @@
-import aioble
 import asyncio
 import struct
-import time
+
+from hal import aioble
 
 from .ble_event_handler import BLEEventHandler
-from .constants import ENV_SENSE_UUID, BIO_INFO_CHARACTERISTICS_UUID, REQUEST_CHARACTERISTICS_UUID, RESPONSE_CHARACTERISTICS_UUID, MACHINE_TIME_CHARACTERISTICS_UUID
+from .frame_batcher import FrameBatcher, DEFAULT_ATT_MTU, ATT_HEADER_SIZE
+from .frames import EXTENDED_SIZE, pack_extended
+from .notify_policy import NotifyPolicy
+from .constants import ENV_SENSE_UUID, BIO_INFO_CHARACTERISTICS_UUID, BIO_INFO_EXTENDED_CHARACTERISTICS_UUID, HISTORY_CHARACTERISTICS_UUID, REQUEST_CHARACTERISTICS_UUID, RESPONSE_CHARACTERISTICS_UUID, MACHINE_TIME_CHARACTERISTICS_UUID
 from .constants import HANDSHAKE_MSG, HANDSHAKE_TIMEOUT_MS
 from .constants import ADV_APPEARANCE_GENERIC_THERMOMETER, ADV_INTERVAL_MS
-from .constants import RESPONSE_TIMEOUT_MS, BAD_RESPONSE, OK_RESPONSE
+from .constants import RESPONSE_TIMEOUT_MS, BAD_RESPONSE, OK_RESPONSE, DESTROY_TIMEOUT
+from .constants import BIOINFO_FORMAT, BIOINFO_SIZE
+from .constants import PREFERRED_MTU, MTU_EXCHANGE_TIMEOUT_MS, MAX_BATCH_FRAMES, BATCH_MAX_DELAY_MS
+from .constants import HISTORY_WINDOW_PACKETS, HISTORY_PROGRESS_RESPONSE, HISTORY_DONE_RESPONSE
 
 from .utilities import get_logger
 from . import utilities
 
+from clock import system_clock
+from history import HistoryEncoder
+from shutdown import ShutdownCoordinator
+
+# Marks a missing value in the bioinfo data
+INVALID_VALUE = float("-inf")
+
 
 class BLEWrapper:
     """
@@ -23,8 +36,13 @@ class BLEWrapper:
 
     Processing of all commands are delegated to the event handler. This includes commands related to BLE functionality, such as the "disconnect" command.
 
+    The bioinfo characteristic is written on every update, so reads always get the latest data, but connected clients
+    are notified only when the notify policy decides the update is worth it. After the handshake, a larger ATT MTU is
+    negotiated and the notified extended frames are batched, as many per notification as the MTU fits.
+
     Attributes:
         name (str): The name of the BLE device.
+        notify_policy (NotifyPolicy): Decides which bioinfo updates are notified, with per-field deadbands and a heartbeat.
         _data (dict): Sensor data including temperature, humidity, PM2.5, CO concentration, and timestamp of last update.
     """
     
@@ -42,17 +60,32 @@ class BLEWrapper:
         self._service_uuids = [ENV_SENSE_UUID]
         self._event_handler = event_handler
         self._data = {
-            "temperature": float("-inf"), # float
-            "humidity": float("-inf"), # float
-            "pm2_5": float("-inf"), # float
-            "co_concentration": float("-inf"), # float
-            "last_update": -1 # int, time.tick_ms // 1000
+            "temperature": INVALID_VALUE, # float
+            "humidity": INVALID_VALUE, # float
+            "pm2_5": INVALID_VALUE, # float
+            "co_concentration": INVALID_VALUE, # float
+            "last_update": -1 # int, Unix time in seconds
         }
 
+        # Preallocated value of the bioinfo characteristic, packed in place on every update
+        self._bioinfo_frame = bytearray(BIOINFO_SIZE)
+        self._extended_frame = bytearray(EXTENDED_SIZE)
+        self.notify_policy = NotifyPolicy()
+        self._batcher = FrameBatcher(EXTENDED_SIZE, MAX_BATCH_FRAMES, BATCH_MAX_DELAY_MS)
+        self._mtu = DEFAULT_ATT_MTU
+        self._batches = 0
+        self._extended_skipped = 0
+
+        # Preallocated packet of the history transfers
+        self._history_packet = bytearray(PREFERRED_MTU - ATT_HEADER_SIZE)
+
         # Events
         self._destroy_signal = asyncio.Event()
         self._handshake_event = asyncio.Event()
 
+        # Held while a response is indicated, the characteristic indicates one value at a time
+        self._response_lock = asyncio.Lock()
+
         # Tasks
         self._peripheral_task = None
         self._machine_time_task = None
@@ -74,8 +107,10 @@ class BLEWrapper:
         One service
         - Environment sensing service
 
-        Four characteristics
+        Six characteristics
         - Bioinfo
+        - Bioinfo extended
+        - History
         - Machine time
         - Request
         - Response
@@ -93,16 +128,32 @@ class BLEWrapper:
             capture=False
         )
 
+        self.bioinfo_extended_characteristic = aioble.Characteristic(
+            service=self.bioinfo_service,
+            uuid=BIO_INFO_EXTENDED_CHARACTERISTICS_UUID,
+            read=True,
+            notify=True
+        )
+
+        self.history_characteristic = aioble.Characteristic(
+            service=self.bioinfo_service,
+            uuid=HISTORY_CHARACTERISTICS_UUID,
+            notify=True
+        )
+
         self.machine_time_characteristics = aioble.Characteristic(
             service=self.bioinfo_service,
             uuid=MACHINE_TIME_CHARACTERISTICS_UUID,
             read=True,
         )
         
+        # The stack keeps a 20-byte buffer for written values unless the initial value is larger, so size it for a
+        # request of the preferred MTU
         self.request_characteristic = aioble.Characteristic(
             service=self.bioinfo_service,
             uuid=REQUEST_CHARACTERISTICS_UUID,
-            write=True
+            write=True,
+            initial=bytes(PREFERRED_MTU - ATT_HEADER_SIZE)
         )
 
         self.response_characteristic = aioble.Characteristic(
@@ -155,6 +206,24 @@ class BLEWrapper:
         return valid_handshake
 
 
+    async def _negotiate_mtu(self, connection):
+        """
+        Ask the central for a larger ATT MTU and size the notification batches to the result. Keeps the default MTU,
+        one frame per notification, if the central does not support the exchange.
+        """
+        try:
+            self._mtu = await connection.exchange_mtu(PREFERRED_MTU, timeout_ms=MTU_EXCHANGE_TIMEOUT_MS)
+        except Exception as e:
+            get_logger().warning(f"MTU exchange failed, {type(e).__name__}: {e}. Keeping the default MTU.")
+            self._mtu = DEFAULT_ATT_MTU
+        capacity = self._batcher.set_mtu(self._mtu)
+        if capacity == 0:
+            get_logger().warning(f"MTU: {self._mtu}, too small for the {EXTENDED_SIZE}-byte extended frame, "
+                                 "which is not notified and only read")
+        else:
+            get_logger().info(f"MTU: {self._mtu}, {capacity} extended frames per notification")
+
+
     # *** COROUTINE SERVICES ***
 
 
@@ -185,6 +254,10 @@ class BLEWrapper:
 
                     # Either wait for disconnection or disconnect directly according to the handshake result.
                     if valid_handshake:
+                        # notify the first update of every connection
+                        self.notify_policy.reset()
+                        await self._negotiate_mtu(connection)
+
                         if self._event_handler is not None:
                             self._event_handler.on_handshake_success()
 
@@ -192,6 +265,10 @@ class BLEWrapper:
                         if self._request_task is None:
                             self._request_task = asyncio.create_task(self._request_service())
 
+                        # Keep the machine time fresh for this client only, nothing reads it while disconnected
+                        if self._machine_time_task is None:
+                            self._machine_time_task = asyncio.create_task(self._update_time_service())
+
                         await connection.disconnected()
                     else:
                         await connection.disconnected(disconnect=True)
@@ -203,9 +280,14 @@ class BLEWrapper:
 
                     # clean up after disconnection
                     self._connection = None
+                    self._mtu = DEFAULT_ATT_MTU
+                    self._batcher.set_mtu(DEFAULT_ATT_MTU)
                     if self._request_task is not None:
                         self._request_task.cancel()
                         self._request_task = None
+                    if self._machine_time_task is not None:
+                        self._machine_time_task.cancel()
+                        self._machine_time_task = None
                         
         except AttributeError as e:
             # the aioble.advertise returns a None
@@ -217,14 +299,12 @@ class BLEWrapper:
 
     async def _update_time_service(self):
         """
-        Update the machine-time-characteristics every 1 second
+        Update the machine-time-characteristics every 1 second while a client is connected, with the Unix time in
+        seconds. Started after the handshake and cancelled on disconnection.
         """
-
-        # NOTE: we did not deal with the wrap-around issue with tick_ms (which occurs in roughly 24 days)
         try:
-            while True:
-                current_time = time.ticks_ms()
-                time_data = utilities.encode_int(current_time // 1000)
+            while self.is_connected():
+                time_data = utilities.encode_int(system_clock.now())
                 self.machine_time_characteristics.write(time_data)
 
                 # sleep for a second
@@ -250,7 +330,9 @@ class BLEWrapper:
                     await self.request_characteristic.written()
                     data = self.request_characteristic.read()
                     request = data.decode("utf-8")
-                    get_logger().info(f"Raw request (max length is 20 bytes): {request}")
+                    # a request is limited by the MTU and by the buffer of the request characteristic
+                    max_length = min(self._mtu, PREFERRED_MTU) - ATT_HEADER_SIZE
+                    get_logger().info(f"Raw request (max length is {max_length} bytes): {request}")
                     try:
                         command, argument = utilities.parse_command(request)
                         
@@ -258,23 +340,13 @@ class BLEWrapper:
                         get_logger().error(f"Request service: ValueError {e}")
 
                         # write a BAD response
-                        if self.is_connected():
-                            await self.response_characteristic.indicate(
-                                self._connection, 
-                                data=BAD_RESPONSE, 
-                                timeout_ms=RESPONSE_TIMEOUT_MS
-                            )
+                        await self._indicate_response(BAD_RESPONSE)
                         continue
 
                     get_logger().info(f"Received command [{command}] with argument [{argument}]")
 
                     # write a OK response
-                    if self.is_connected():
-                        await self.response_characteristic.indicate(
-                            self._connection, 
-                            data=OK_RESPONSE, 
-                            timeout_ms=RESPONSE_TIMEOUT_MS
-                        )
+                    await self._indicate_response(OK_RESPONSE)
                     
                     # send the command as an event
                     if self._event_handler is not None:
@@ -324,9 +396,6 @@ class BLEWrapper:
         if self._peripheral_task is None:
             self._peripheral_task = asyncio.create_task(self._advertise_and_connect_service())
 
-        if self._machine_time_task is None:
-            self._machine_time_task = asyncio.create_task(self._update_time_service())
-
 
     def stop(self):
         """Stop the BLE module."""
@@ -346,16 +415,28 @@ class BLEWrapper:
             humidity=None,
             pm2_5=None,
             co_concentration=None,
-            keep_old=True):
+            keep_old=True,
+            extended=None,
+            timestamp=0):
         """
         Update the bioinfo characteristics with the provided values.
 
+        The legacy bioinfo characteristic carries the four floats. If `extended` is given, the extended characteristic
+        carries every channel in fixed point, see `frames.EXTENDED_FIELDS`. Both are notified together, the extended
+        frames in batches if the MTU fits more than one. If the MTU does not fit a whole extended frame, e.g. the
+        default MTU of 23, the notification would be cut, so the extended frame is only written for reads.
+
+        The values are packed in place into a preallocated frame, so an update allocates no buffers. The connected client
+        is notified if the notify policy decides so.
+
         Args:
             temperature (Optional[float]): The temperature data.
             humidity (Optional[float]): The humidity data. Within 0.0 .. 1.0. Raises ValueError if out of range.
             pm2_5 (Optional[float]): PM2.5 concentration in µg/m³. Raises ValueError if less than 0.
             co_concentration (Optional[float]): CO concentration in PPM. Raises ValueError if less than 0.
             keep_old (Optional[bool]): True to keep old values for missing fields, False to set missing fields to None.
+            extended (Optional[Sequence[int]]): The fixed-point value of every field of the extended frame, in order.
+            timestamp (Optional[int]): The time of the readings in seconds, for the extended frame.
 
         Returns:
             bool: True if successful, False otherwise.
@@ -365,7 +446,7 @@ class BLEWrapper:
         # clear self.data if not keep old
         if not keep_old:
             for key in self._data:
-                self._data[key] = float("-inf")
+                self._data[key] = INVALID_VALUE
             
         # update the data
         if temperature != None:
@@ -377,18 +458,38 @@ class BLEWrapper:
         if co_concentration != None:
             self._data["co_concentration"] = co_concentration
 
-        self._data["last_update"] = time.ticks_ms() // 1000
+        self._data["last_update"] = system_clock.now()
 
         # write to the GATTS characteristics
-        packed_data = struct.pack(
-            '<ffffi',
+        struct.pack_into(
+            BIOINFO_FORMAT,
+            self._bioinfo_frame,
+            0,
             self._data["temperature"],
             self._data["humidity"],
             self._data["pm2_5"],
             self._data["co_concentration"],
             self._data["last_update"]
         )
-        self.bioinfo_characteristic.write(packed_data)
+        notify = self.is_connected() and self.notify_policy.should_notify(self._data)
+        self.bioinfo_characteristic.write(self._bioinfo_frame, send_update=notify)
+
+        if extended is not None:
+            pack_extended(self._extended_frame, extended, timestamp)
+            if self._batcher.capacity == 0:
+                # a notification would lose the timestamp and the last fields, the client reads the whole frame
+                self.bioinfo_extended_characteristic.write(self._extended_frame)
+                if notify:
+                    self._extended_skipped += 1
+            elif self._batcher.capacity == 1:
+                self.bioinfo_extended_characteristic.write(self._extended_frame, send_update=notify)
+            else:
+                # reads get the latest frame, notifications the batches
+                self.bioinfo_extended_characteristic.write(self._extended_frame)
+                ready = self._batcher.add(self._extended_frame) if notify else self._batcher.is_ready()
+                if ready and self.is_connected():
+                    self.bioinfo_extended_characteristic.notify(self._connection, self._batcher.flush())
+                    self._batches += 1
 
         if self._event_handler is not None:
             self._event_handler.on_bioinfo_data_updated()
@@ -409,8 +510,157 @@ class BLEWrapper:
             dict: A dictionary containing the latest bioinformatics data advertised.
         """
         return self._data
+
+
+    def get_notify_stats(self):
+        """
+        Getter for the notification counters.
+
+        Fields:
+            - sent (int): The number of updates notified, see `NotifyPolicy.get_stats()`.
+            - suppressed (int): The number of updates not notified.
+            - mtu (int): The ATT MTU of the current connection.
+            - batch_capacity (int): The number of extended frames per notification, 0 if the MTU is too small.
+            - batches (int): The number of batched notifications of extended frames.
+            - extended_skipped (int): The number of extended frames not notified because the MTU is too small.
+
+        Returns:
+            dict: A dictionary with the notification counters.
+        """
+        stats = self.notify_policy.get_stats()
+        stats["mtu"] = self._mtu
+        stats["batch_capacity"] = self._batcher.capacity
+        stats["batches"] = self._batches
+        stats["extended_skipped"] = self._extended_skipped
+        return stats
     
 
+    async def send_history(self, history, since, compressed=False, store=None):
+        """
+        Stream the history records since a timestamp to the client, as notifications on the history characteristic.
+
+        Every notification carries as many records as the MTU fits: raw, each packed by `history.pack_record()`, or
+        compressed, as one block of `HistoryEncoder`. After every HISTORY_WINDOW_PACKETS notifications, a
+        "HISTORY <records sent>" response is indicated and acknowledged by the client before continuing, which paces
+        the transfer to the client. The transfer ends with a "HISTORY_DONE <records sent>" response.
+
+        When the history does not reach back to `since`, the records are read from the store instead, found through
+        its time index.
+
+        Records appended during the transfer are not sent. Once the history is full, the oldest records may be
+        overwritten while they are streamed.
+
+        Args:
+            history (History): the history to send from.
+            since (int): the earliest timestamp to send, in seconds.
+            compressed (bool): True to send delta/varint encoded blocks, False to send raw records.
+            store (Optional[RecordStore]): the flash store of the records packed by `history.pack_record()`.
+
+        A compressed transfer is refused with a BAD_REQUEST response if a record cannot fit in a notification.
+
+        Returns:
+            int: the number of records sent, or -1 if the transfer was refused or interrupted.
+        """
+        payload_size = min(self._mtu - ATT_HEADER_SIZE, len(self._history_packet))
+        if compressed:
+            try:
+                encoder = HistoryEncoder(len(history.channels), payload_size)
+            except ValueError as e:
+                get_logger().warning(f"Cannot send a compressed history: {e}")
+                await self.send_response(BAD_RESPONSE)
+                return -1
+
+        from_store = store is not None and len(store) > 0 \
+            and (len(history) == 0 or since < history.timestamps[history.index(0)])
+        if from_store:
+            records = store.since(since)
+            if compressed:
+                packets = encoder.encode_records(history, records)
+            else:
+                packets = self._pack_records(records, history.record_size, payload_size)
+        elif compressed:
+            packets = encoder.encode(history, history.since(since))
+        else:
+            packets = self._pack_history(history, history.since(since), payload_size)
+
+        get_logger().info(f"Sending history since {since}, compressed={compressed}, from_store={from_store}, "
+                          f"{payload_size} bytes per notification")
+
+        n_records = 0
+        n_packets = 0
+        n_bytes = 0
+        try:
+            for packet in packets:
+                if not self.is_connected():
+                    return -1
+                self.history_characteristic.notify(self._connection, packet)
+                n_packets += 1
+                n_bytes += len(packet)
+                n_records += packet[1] if compressed else len(packet) // history.record_size
+
+                if n_packets % HISTORY_WINDOW_PACKETS == 0:
+                    if not await self.send_response(f"{HISTORY_PROGRESS_RESPONSE} {n_records}"):
+                        get_logger().warning("History transfer not acknowledged, stopping")
+                        return -1
+
+            if not await self.send_response(f"{HISTORY_DONE_RESPONSE} {n_records}"):
+                return -1
+
+        except aioble.DeviceDisconnectedError:
+            get_logger().warning("Device disconnected during the history transfer")
+            return -1
+
+        get_logger().info(f"Sent {n_records} history records in {n_bytes} bytes")
+        return n_records
+
+
+    def _pack_history(self, history, indices, payload_size):
+        """
+        Pack raw history records into packets of as many records as fit in the payload.
+
+        Yields:
+            memoryview: each packet, in the preallocated history packet. Valid until the next packet is requested.
+        """
+        record_size = history.record_size
+        records_per_packet = max(1, payload_size // record_size)
+        packet = self._history_packet
+        view = memoryview(packet)
+
+        n_in_packet = 0
+        for index in indices:
+            history.pack_record(index, packet, n_in_packet * record_size)
+            n_in_packet += 1
+            if n_in_packet == records_per_packet:
+                yield view[:n_in_packet * record_size]
+                n_in_packet = 0
+
+        if n_in_packet > 0:
+            yield view[:n_in_packet * record_size]
+
+
+    def _pack_records(self, records, record_size, payload_size):
+        """
+        Pack records read back from the store into packets of as many records as fit in the payload.
+
+        Yields:
+            memoryview: each packet, in the preallocated history packet. Valid until the next packet is requested.
+        """
+        records_per_packet = max(1, payload_size // record_size)
+        view = memoryview(self._history_packet)
+
+        n_in_packet = 0
+        for record in records:
+            offset = n_in_packet * record_size
+            view[offset:offset + record_size] = record
+            n_in_packet += 1
+            if n_in_packet == records_per_packet:
+                yield view[:n_in_packet * record_size]
+                n_in_packet = 0
+
+        if n_in_packet > 0:
+            yield view[:n_in_packet * record_size]
+
+
     async def send_response(self, msg):
         """
         Send a response to the client.
@@ -422,12 +672,7 @@ class BLEWrapper:
             bool: True if success, False otherwise.
         """
         try:
-            if self.is_connected():
-                await self.response_characteristic.indicate(
-                    self._connection, 
-                    data=msg.encode("utf-8"), 
-                    timeout_ms=RESPONSE_TIMEOUT_MS
-                )
+            if await self._indicate_response(msg.encode("utf-8")):
                 get_logger().info(f"Sent response: {msg}")
                 return True
             else:
@@ -437,6 +682,21 @@ class BLEWrapper:
             get_logger().warning("Timed out on send response")
             return False
 
+
+    async def _indicate_response(self, data):
+        """
+        Indicate a response and wait for the client to confirm it, after the response being indicated if any, so the
+        command responses and the history progress responses never overlap.
+
+        Returns:
+            bool: True if indicated, False if no client is connected.
+        """
+        async with self._response_lock:
+            if not self.is_connected():
+                return False
+            await self.response_characteristic.indicate(self._connection, data=data, timeout_ms=RESPONSE_TIMEOUT_MS)
+            return True
+
     
     def is_connected(self):
         """
@@ -451,51 +711,41 @@ class BLEWrapper:
             return self._connection.is_connected()
         
     
-    async def destroy(self):
+    async def destroy(self, timeout=DESTROY_TIMEOUT):
         """
-        Destroy the BLE wrapper and freeing up resources.
+        Destroy the BLE wrapper and freeing up resources. The tasks are signalled at once and awaited together, and
+        the ones still running after `timeout` seconds are cancelled.
+
+        The peripheral and request tasks wait on the client, in `advertise()`, `disconnected()` and `written()`,
+        without checking the destroy signal, so they are cancelled at once instead.
+
+        Returns:
+            dict: the report of `ShutdownCoordinator.run()`, with the tasks that overran.
         """
 
         # Send a destroy signal
         get_logger().info("Sending destroy signal...")
         self._destroy_signal.set()
+        for task in (self._peripheral_task, self._request_task):
+            if task is not None:
+                task.cancel()
 
         # Wait for tasks to finish
-        try:
-            if isinstance(self._peripheral_task, asyncio.Task):
-                await asyncio.wait_for(self._peripheral_task, timeout=10)
-
-            if isinstance(self._machine_time_task, asyncio.Task):
-                await asyncio.wait_for(self._machine_time_task, timeout=10)
+        coordinator = ShutdownCoordinator(timeout)
+        coordinator.add_task("peripheral", self._peripheral_task)
+        coordinator.add_task("machine_time", self._machine_time_task)
+        coordinator.add_task("request", self._request_task)
+        report = await coordinator.run()
 
-            if isinstance(self._request_task, asyncio.Task):
-                await asyncio.wait_for(self._request_task, timeout=10)
-
-        except asyncio.TimeoutError:
-            get_logger().warning("Destroy signal timed out, sending task cancel signal...")
-            
-            # cancel the tasks
+        get_logger().info("All tasks finished")
+        return report
 
-            if isinstance(self._peripheral_task, asyncio.Task):
-                self._peripheral_task.cancel()
-            
-            if isinstance(self._machine_time_task, asyncio.Task):
-                self._machine_time_task.cancel()
-            
-            if isinstance(self._request_task, asyncio.Task):
-                self._request_task.cancel()
-            
-            # wait for the tasks to be cancelled
 
-            if isinstance(self._peripheral_task, asyncio.Task):
-                await asyncio.wait_for(self._peripheral_task, timeout=10)
-            
-            if isinstance(self._machine_time_task, asyncio.Task):
-                await asyncio.wait_for(self._machine_time_task, timeout=10)
-            
-            if isinstance(self._request_task, asyncio.Task):
-                await asyncio.wait_for(self._request_task, timeout=10)
-        
-        get_logger().info("All tasks finished")
+    def abort(self):
+        """Cancel every task without waiting, e.g. when `destroy()` overran a shutdown deadline."""
+        self._destroy_signal.set()
+        for task in (self._peripheral_task, self._machine_time_task, self._request_task):
+            if task is not None:
+                task.cancel()
         
     
\ No newline at end of file
@@ -1,20 +1,24 @@
-import bluetooth
+from hal import UUID
 
 # org.bluetooth.service.environmental_sensing
-ENV_SENSE_UUID = bluetooth.UUID(0x181A)
+ENV_SENSE_UUID = UUID(0x181A)
 # org.bluetooth.characteristic.temperature
-ENV_SENSE_TEMP_UUID = bluetooth.UUID(0x2A6E)
+ENV_SENSE_TEMP_UUID = UUID(0x2A6E)
 # org.bluetooth.characteristic.gap.appearance.xml
 ADV_APPEARANCE_GENERIC_THERMOMETER = const(768)
 
 # bioinfo-characteristics UUID
-BIO_INFO_CHARACTERISTICS_UUID = bluetooth.UUID("9fda7cce-48d4-4b1a-9026-6d46eec4e63a")
+BIO_INFO_CHARACTERISTICS_UUID = UUID("9fda7cce-48d4-4b1a-9026-6d46eec4e63a")
+# bioinfo-extended-characteristics UUID, the versioned frame of every channel, see frames.py
+BIO_INFO_EXTENDED_CHARACTERISTICS_UUID = UUID("6aa2d0cc-1c0c-464f-9445-77f85cf79b5e")
+# history-characteristics UUID, the bulk transfer of the history records
+HISTORY_CHARACTERISTICS_UUID = UUID("fed58bcc-adb1-407d-baae-62c83a42d0aa")
 # request-characteristics UUID
-REQUEST_CHARACTERISTICS_UUID = bluetooth.UUID("4f2d7b8e-23b9-4bc7-905f-a8e3d7841f6a")
+REQUEST_CHARACTERISTICS_UUID = UUID("4f2d7b8e-23b9-4bc7-905f-a8e3d7841f6a")
 # response-characteristics UUID
-RESPONSE_CHARACTERISTICS_UUID = bluetooth.UUID("93e89c7d-65e3-41e6-b59f-1f3a6478de45")
+RESPONSE_CHARACTERISTICS_UUID = UUID("93e89c7d-65e3-41e6-b59f-1f3a6478de45")
 # machine-time-characteristics UUID
-MACHINE_TIME_CHARACTERISTICS_UUID = bluetooth.UUID("4fd3a9d8-5e82-4c1e-a2d3-9bc23f3a8341")
+MACHINE_TIME_CHARACTERISTICS_UUID = UUID("4fd3a9d8-5e82-4c1e-a2d3-9bc23f3a8341")
 
 # expected handshake message from client
 HANDSHAKE_MSG = "hello"
@@ -23,6 +27,28 @@ HANDSHAKE_TIMEOUT_MS = 1000
 # How frequently to send advertising beacons.
 ADV_INTERVAL_MS = 250_000
 
+# Layout of the bioinfo characteristic: temperature, humidity, PM2.5, CO concentration and last update
+BIOINFO_FORMAT = "<ffffi"
+BIOINFO_SIZE = const(20)
+
+# ATT MTU requested from the central after the handshake, the central may settle on less
+PREFERRED_MTU = const(247)
+MTU_EXCHANGE_TIMEOUT_MS = 1000
+
+# Extended frames batched into one notification: at most as many as fit in the preferred MTU, and a frame waits at
+# most this long for the batch to fill up
+MAX_BATCH_FRAMES = const(7)
+BATCH_MAX_DELAY_MS = 10_000
+
+# History transfers wait for the client to acknowledge a progress indication on the response characteristic after
+# every window of notifications, so the BLE stack never queues more than a window
+HISTORY_WINDOW_PACKETS = const(16)
+HISTORY_PROGRESS_RESPONSE = "HISTORY"
+HISTORY_DONE_RESPONSE = "HISTORY_DONE"
+
 RESPONSE_TIMEOUT_MS = 1000
 BAD_RESPONSE = "BAD_REQUEST"
 OK_RESPONSE = "OK"
+
+# Longest wait for the tasks to finish on destroy, after which they are cancelled
+DESTROY_TIMEOUT = 10 # seconds
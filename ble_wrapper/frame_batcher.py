@@ -0,0 +1,108 @@
+import time
+
+# ATT header of a notification: opcode and attribute handle
+ATT_HEADER_SIZE = const(3)
+
+# Default ATT MTU before any exchange, leaving 20 bytes of payload
+DEFAULT_ATT_MTU = const(23)
+
+
+class FrameBatcher:
+    """
+    Packs consecutive fixed-size frames into one notification, as many as fit in the negotiated ATT MTU.
+
+    Frames are copied into a preallocated buffer. A batch is ready when it is full, or when its oldest frame has
+    waited for `max_delay_ms`. With an MTU too small for two frames, every frame is its own batch, and with an MTU
+    too small for one frame, the capacity is 0: a notification would be cut, so the frames must not be notified.
+
+    Attributes:
+        frame_size (int): the size of one frame in bytes.
+        max_frames (int): the largest batch, sizing the buffer.
+        max_delay_ms (int): the longest time a frame waits in a batch, in milliseconds.
+        capacity (int): the number of frames per batch for the current MTU, 0 if a frame does not fit.
+    """
+
+    def __init__(self, frame_size, max_frames, max_delay_ms):
+        self.frame_size = frame_size
+        self.max_frames = max_frames
+        self.max_delay_ms = max_delay_ms
+
+        self._buffer = bytearray(frame_size * max_frames)
+        self._view = memoryview(self._buffer)
+        self._length = 0 # number of frames in the batch
+        self._started = 0 # time.ticks_ms() of the oldest frame in the batch
+
+        self.set_mtu(DEFAULT_ATT_MTU)
+
+
+    def __len__(self):
+        return self._length
+
+
+    def set_mtu(self, mtu):
+        """
+        Size the batches for an ATT MTU, dropping the pending frames.
+
+        Args:
+            mtu (int): the negotiated ATT MTU.
+
+        Returns:
+            int: the number of frames per batch, 0 if a frame does not fit.
+        """
+        capacity = (mtu - ATT_HEADER_SIZE) // self.frame_size
+        self.capacity = min(capacity, self.max_frames)
+        self._length = 0
+        return self.capacity
+
+
+    def add(self, frame, now=None):
+        """
+        Copy a frame into the batch.
+
+        Args:
+            frame (bytearray): the frame, `frame_size` bytes.
+            now (Optional[int]): the current time from time.ticks_ms(). None to read it.
+
+        Returns:
+            bool: True if the batch is ready to be sent with `flush()`.
+        """
+        if now is None:
+            now = time.ticks_ms()
+        if self._length == 0:
+            self._started = now
+
+        offset = self._length * self.frame_size
+        self._view[offset:offset + self.frame_size] = frame
+        self._length += 1
+        return self.is_ready(now)
+
+
+    def is_ready(self, now=None):
+        """
+        Whether the batch is full or its oldest frame has waited for `max_delay_ms`.
+
+        Args:
+            now (Optional[int]): the current time from time.ticks_ms(). None to read it.
+
+        Returns:
+            bool: True if the batch should be sent.
+        """
+        if self._length == 0:
+            return False
+        if self._length >= self.capacity:
+            return True
+        if now is None:
+            now = time.ticks_ms()
+        return time.ticks_diff(now, self._started) >= self.max_delay_ms
+
+
+    def flush(self):
+        """
+        Take the pending frames, emptying the batch.
+
+        Returns:
+            memoryview: the frames, back to back. Valid until the next `add()`.
+        """
+        size = self._length * self.frame_size
+        self._length = 0
+        return self._view[:size]
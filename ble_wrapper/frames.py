@@ -0,0 +1,67 @@
+import struct
+
+from history import INVALID_INT16
+
+# Version in the header byte of the extended frame. The legacy "<ffffi" frame has no header and counts as version 1.
+EXTENDED_VERSION = const(2)
+
+# Fixed-point fields of the extended frame, in order, after the header byte and the validity bitmask.
+# Bit i of the bitmask is set if field i is valid. Invalid fields are sent as 0.
+EXTENDED_FIELDS = (
+    "temperature", # int16, hundredths of a degree celcius
+    "humidity", # uint16, per mille
+    "pm1", # uint16, µg/m³, atmospheric
+    "pm2_5", # uint16, µg/m³, atmospheric
+    "pm10", # uint16, µg/m³, atmospheric
+    "n_0_3um", # uint16, particles beyond 0.3um in 0.1 L of air
+    "n_0_5um", # uint16, beyond 0.5um
+    "n_1um", # uint16, beyond 1um
+    "n_2_5um", # uint16, beyond 2.5um
+    "n_5um", # uint16, beyond 5um
+    "n_10um", # uint16, beyond 10um
+    "co", # uint16, tenths of a PPM
+    "co_range" # uint16, tenths of a PPM
+)
+
+# Header byte, validity bitmask, the fields and a uint32 timestamp in seconds: 33 bytes, one notification from an
+# ATT MTU of 36 bytes up. Below, e.g. at the default MTU of 23, the frame is not notified, only read.
+EXTENDED_FORMAT = "<BHh" + "H" * (len(EXTENDED_FIELDS) - 1) + "I"
+EXTENDED_SIZE = struct.calcsize(EXTENDED_FORMAT)
+
+_FIELDS_OFFSET = 3
+_TIMESTAMP_OFFSET = EXTENDED_SIZE - 4
+
+
+def pack_extended(buffer, values, timestamp):
+    """
+    Pack an extended frame in place, field by field, so nothing is allocated.
+
+    Args:
+        buffer (bytearray): the frame, at least EXTENDED_SIZE bytes.
+        values (Sequence[int]): the fixed-point value of every field in EXTENDED_FIELDS, in order. INVALID_INT16 for a
+            missing temperature, negative for the other missing values.
+        timestamp (int): the time of the readings, in seconds.
+    """
+    mask = 0
+    offset = _FIELDS_OFFSET
+
+    value = values[0]
+    if value != INVALID_INT16:
+        mask |= 1
+    else:
+        value = 0
+    struct.pack_into("<h", buffer, offset, value)
+
+    for i in range(1, len(EXTENDED_FIELDS)):
+        offset += 2
+        value = values[i]
+        if value >= 0:
+            mask |= 1 << i
+            if value > 0xFFFF:
+                value = 0xFFFF
+        else:
+            value = 0
+        struct.pack_into("<H", buffer, offset, value)
+
+    struct.pack_into("<BH", buffer, 0, EXTENDED_VERSION, mask)
+    struct.pack_into("<I", buffer, _TIMESTAMP_OFFSET, timestamp)
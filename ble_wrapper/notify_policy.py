@@ -0,0 +1,133 @@
+import time
+
+# Smallest change of each bioinfo field that triggers a notification
+DEFAULT_DEADBANDS = {
+    "temperature": 0.1, # degree celcius
+    "humidity": 0.005, # 0.0 .. 1.0
+    "pm2_5": 1.0, # µg/m³
+    "co_concentration": 0.1 # PPM
+}
+
+# Notify at least this often, even if nothing changed
+DEFAULT_MAX_SILENCE_MS = 30_000
+
+_INVALID = float("-inf")
+
+
+class NotifyPolicy:
+    """
+    Decides when the bioinfo data is worth a notification: when a field moved past its deadband since the latest
+    notification, when a field became valid or invalid, or when nothing was sent for `max_silence_ms`.
+
+    Attributes:
+        deadbands (dict[str, float]): the smallest change of each field that triggers a notification.
+        max_silence_ms (int): the longest time without a notification, in milliseconds.
+    """
+
+    def __init__(self, deadbands=None, max_silence_ms=DEFAULT_MAX_SILENCE_MS):
+        self.deadbands = DEFAULT_DEADBANDS.copy()
+        if deadbands is not None:
+            self.deadbands.update(deadbands)
+        self.max_silence_ms = max_silence_ms
+
+        self._last_sent = {field: None for field in self.deadbands}
+        self._last_sent_time = None
+        self._stats = {
+            "sent": 0,
+            "suppressed": 0
+        }
+
+
+    def get_stats(self):
+        """
+        Get the notification counters.
+
+        Fields:
+        - "sent" (int): number of updates notified.
+        - "suppressed" (int): number of updates not notified, since no field moved past its deadband.
+
+        Returns
+            dict: The counters dict.
+        """
+        return self._stats.copy()
+
+
+    def set_deadband(self, field, deadband):
+        """
+        Set the deadband of a field.
+
+        Args:
+            field (str): the bioinfo field, e.g. "pm2_5".
+            deadband (float): the smallest change that triggers a notification. 0 to notify on every change.
+
+        Raises:
+            ValueError: if the field is unknown or the deadband is negative.
+        """
+        if field not in self.deadbands:
+            raise ValueError(f"Unknown field: {field}")
+        if deadband < 0:
+            raise ValueError(f"Negative deadband: {deadband}")
+        self.deadbands[field] = deadband
+
+
+    def set_max_silence(self, max_silence_ms):
+        """
+        Set the longest time without a notification.
+
+        Args:
+            max_silence_ms (int): the time in milliseconds.
+
+        Raises:
+            ValueError: if the time is not positive.
+        """
+        if max_silence_ms <= 0:
+            raise ValueError(f"Non-positive max silence: {max_silence_ms}")
+        self.max_silence_ms = max_silence_ms
+
+
+    def reset(self):
+        """Forget the latest notification, so the next update is notified. Call on every new connection."""
+        self._last_sent_time = None
+
+
+    def should_notify(self, data, now=None):
+        """
+        Decide whether to notify an update, and count it as sent or suppressed.
+
+        Args:
+            data (dict): the bioinfo data, with a value for every field with a deadband.
+            now (Optional[int]): the current time from time.ticks_ms(). None to read it.
+
+        Returns:
+            bool: True if the update should be notified.
+        """
+        if now is None:
+            now = time.ticks_ms()
+
+        notify = self._last_sent_time is None \
+            or time.ticks_diff(now, self._last_sent_time) >= self.max_silence_ms \
+            or self._changed(data)
+
+        if notify:
+            for field in self._last_sent:
+                self._last_sent[field] = data[field]
+            self._last_sent_time = now
+            self._stats["sent"] += 1
+        else:
+            self._stats["suppressed"] += 1
+        return notify
+
+
+    def _changed(self, data):
+        """Whether any field moved past its deadband since the latest notification."""
+        for field, deadband in self.deadbands.items():
+            value = data[field]
+            last = self._last_sent[field]
+            if value == last:
+                continue
+            # a field becoming valid or invalid always counts, -inf minus -inf is not a number
+            if value == _INVALID or last == _INVALID or last is None:
+                return True
+            if abs(value - last) >= deadband:
+                return True
+        return False
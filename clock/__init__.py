@@ -0,0 +1,5 @@
+# Import the Clock class and the clock of the device to make them accessible from the module level
+from .clock import Clock, system_clock
+
+# Define what should be available when the module is imported
+__all__ = ["Clock", "system_clock"]
\ No newline at end of file
@@ -0,0 +1,128 @@
+import time
+
+from hal import RTC
+
+from .utilities import get_logger
+
+
+class Clock:
+    """
+    Wall clock and uptime of the device, safe across the wraparound of `time.ticks_ms()`.
+
+    The uptime is accumulated from the ticks elapsed since the previous reading, in whole seconds plus the milliseconds
+    past them, so it never wraps. `time.ticks_diff()` is only valid within half the ticks period, about six days on
+    the Pico, so the clock must be read more often than that; every sample reads it.
+
+    The wall clock is the uptime plus an offset: from the RTC at boot, then from the client with `sync()`, which also
+    sets the RTC. Timestamps never go back: after a step backwards, `now()` holds the latest timestamp until the time
+    catches up, so the history and the record store stay sorted by time.
+
+    Attributes:
+        synced (bool): whether the time was set by a client since boot.
+    """
+
+    def __init__(self):
+        self._last_ticks = time.ticks_ms()
+        self._seconds = 0 # uptime, whole seconds
+        self._millis = 0 # uptime, milliseconds past the whole seconds
+        self._offset = int(time.time()) # Unix time at boot, from the RTC until synced
+        self._latest = 0 # latest timestamp returned by now()
+        self.synced = False
+
+
+    # *** PUBLIC GETTERS ***
+
+
+    def uptime(self):
+        """
+        Get the time since boot.
+
+        Returns:
+            int: the uptime in seconds.
+        """
+        self._advance()
+        return self._seconds
+
+
+    def uptime_ms(self):
+        """
+        Get the time since boot, e.g. to stamp readings. Monotonic, and does not wrap like `time.ticks_ms()`.
+
+        Returns:
+            int: the uptime in milliseconds.
+        """
+        self._advance()
+        return self._seconds * 1000 + self._millis
+
+
+    def now(self):
+        """
+        Get the wall clock time.
+
+        Returns:
+            int: the Unix time in seconds, never earlier than a previous call.
+        """
+        self._advance()
+        timestamp = self._offset + self._seconds
+        if timestamp < self._latest:
+            return self._latest
+        self._latest = timestamp
+        return timestamp
+
+
+    # *** PUBLIC METHODS ***
+
+
+    def sync(self, timestamp):
+        """
+        Set the wall clock and the RTC to the time from the client.
+
+        Args:
+            timestamp (int): the Unix time in seconds.
+
+        Returns:
+            int: the step of the wall clock in seconds, negative if it was ahead.
+        """
+        self._advance()
+        step = timestamp - (self._offset + self._seconds)
+        self._offset = timestamp - self._seconds
+        self.synced = True
+
+        try:
+            date = time.gmtime(timestamp) # year, month, day, hours, minutes, seconds, weekday, ...
+            RTC().datetime((date[0], date[1], date[2], date[6], date[3], date[4], date[5], 0))
+        except (OSError, OverflowError) as e:
+            get_logger().warning(f"Failed to set the RTC: {e}")
+
+        get_logger().info(f"Synced to {timestamp}, stepped by {step} s")
+        return step
+
+
+    def hold(self, timestamp):
+        """
+        Never return a time earlier than a timestamp, e.g. the latest one stored before a reboot reset the RTC.
+
+        Args:
+            timestamp (int): the Unix time in seconds.
+        """
+        if timestamp > self._latest:
+            self._latest = timestamp
+
+
+    # *** PRIVATE METHODS ***
+
+
+    def _advance(self):
+        """Add the ticks elapsed since the previous reading to the uptime."""
+        ticks = time.ticks_ms()
+        elapsed = time.ticks_diff(ticks, self._last_ticks)
+        if elapsed <= 0:
+            return
+        self._last_ticks = ticks
+        millis = self._millis + elapsed
+        self._seconds += millis // 1000
+        self._millis = millis % 1000
+
+
+# The clock of the device, shared by the drivers, the BLE wrapper and the context
+system_clock = Clock()
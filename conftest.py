@@ -0,0 +1,11 @@
+# Test configuration of the host-side suites, run on a normal Python environment from the repository root:
+#   pytest
+#   SOAK_DAYS=21 pytest tests/soak
+# `python -m pytest` puts the repository first on sys.path, where the MicroPython logging module shadows the standard
+# one before pytest starts; use `python -P -m pytest` instead.
+
+import os
+import sys
+
+# appended, so the standard logging module is used instead of the MicroPython one in the repository
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
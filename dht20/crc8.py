@@ -0,0 +1,37 @@
+CRC8_POLYNOMIAL = 0x31 # x^8 + x^5 + x^4 + 1
+CRC8_INIT = 0xFF
+
+
+def _build_table():
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ CRC8_POLYNOMIAL) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+# Precomputed once on import, one entry per byte value
+CRC8_TABLE = _build_table()
+
+
+def crc8(data, length):
+    """
+    Calculate the CRC-8 used by the DHT20 (polynomial 0x31, initial value 0xFF) with the lookup table.
+
+    Args:
+        data (bytearray): the bytes to check.
+        length (int): number of bytes from the start of `data` to include.
+
+    Returns:
+        int: the CRC-8 value.
+    """
+    crc = CRC8_INIT
+    table = CRC8_TABLE
+    for i in range(length):
+        crc = table[crc ^ data[i]]
+    return crc
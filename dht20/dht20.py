@@ -1,49 +1,65 @@
-from machine import Pin, I2C
 import time
 import asyncio
-import logging
 
-from .utilities import get_logger, config_logger
+from clock import system_clock
+from hal import Pin, I2C
+from history import INVALID_INT16
+from sensor_driver import SensorDriver
+
+from .crc8 import crc8
+from .utilities import get_logger, NAME
 
 ADDRESS = 0x38 # 7-bit I2C device address
 MEASUREMENT_COMMAND = b'\xAC'
 MEASUREMENT_PARAM_1 = b'\x33'
 MEASUREMENT_PARAM_2 = b'\x00'
 STATUS_WORD_COMMAND = b'\x71'
+STATUS_BUSY = 1 << 7
+
+# status word, 5 data bytes and the CRC
+FRAME_LENGTH = 7
 
-INIT_TIMEOUT = 5 # seconds
 DATA_TIMEOUT = 1 # seconds
+MEASUREMENT_TIME = 0.08 # seconds
+POLL_BACKOFF_MIN = 0.005 # seconds
+POLL_BACKOFF_MAX = 0.04 # seconds
 DEFAULT_INTERVAL = 1.0 # once every 1 second
 
+# Reset the sensor if no valid reading is received within this time, e.g. on repeated CRC errors
+NO_DATA_TIMEOUT_MS = 5000
 
-class DHT20:
 
-    def __init__(self, i2c=0, sda_pin=20, scl_pin=21, interval=DEFAULT_INTERVAL, debug=False):
-        
+class DHT20(SensorDriver):
+    """
+    Driver for the DHT20 temperature and humidity sensor, following the sensor reading process in the documentation.
+    https://aqicn.org/air/sensor/spec/asair-dht20.pdf
+    """
+
+    def __init__(self, i2c=0, sda_pin=20, scl_pin=21, interval=DEFAULT_INTERVAL, single_read=True, bus=None,
+                 debug=False):
+        """
+        Args:
+            bus (Optional[I2C]): the I2C bus of the sensor, e.g. a fake from hal. None to open the `i2c` port on the
+                pins.
+            single_read (bool): True to read the status word, data and CRC in one 7-byte transaction and reject frames
+                with a bad CRC. False to poll the status word and read the data separately, without a CRC check.
+        """
+
         self.i2c_port = i2c
         self.sda_pin = sda_pin
         self.scl_pin = scl_pin
-        self._i2c = I2C(self.i2c_port, sda=Pin(self.sda_pin), scl=Pin(self.scl_pin))
-        self.interval = interval
-        self._data = {
-            "humidity": float("-inf"),
-            "temperature": float("-inf"),
-            "timestamp": time.ticks_ms()
+        self._i2c = bus if bus is not None else I2C(self.i2c_port, sda=Pin(self.sda_pin), scl=Pin(self.scl_pin))
+        self.single_read = single_read
+        self._frame = bytearray(FRAME_LENGTH)
+        self._crc_errors = 0
+
+        self._read_latency = {
+            "last_ms": -1,
+            "max_ms": -1,
+            "polls": 0
         }
 
-        # Config the logger
-        if debug:
-            config_logger(log_level=logging.DEBUG)
-        else:
-            config_logger(log_level=logging.ERROR)
-
-        # Events
-        self._destroy_signal = asyncio.Event()
-        self._pause_signal = asyncio.Event()
-        self._resume_signal = asyncio.Event()
-
-        # Coroutine tasks
-        self._data_update_task = None
+        super().__init__(NAME, interval=interval, no_data_timeout_ms=NO_DATA_TIMEOUT_MS, debug=debug)
 
     
     # *** PUBLIC GETTERS ***
@@ -56,7 +72,9 @@ class DHT20:
         Fields:
         - "humidity" (float): relative humidity from 0 to 1. float("-inf") if no valid readings yet.
         - "temperature" (float): temperature in celcius. float("-inf") if no valid readings yet.
-        - "timestamp" (int): timestamp of the latest reading. Acquired by time.tick_ms().
+        - "humidity_permille" (int): relative humidity from 0 to 1000. INVALID_INT16 if no valid readings yet.
+        - "temperature_centi" (int): temperature in hundredths of a degree celcius. INVALID_INT16 if no valid readings yet.
+        - "timestamp" (int): milliseconds since boot of the latest reading, from the system clock.
 
         Returns
             dict: The data dict.
@@ -64,85 +82,37 @@ class DHT20:
         return self._data.copy()
 
 
-    # *** PUBLIC LIFECYCLE METHODS ***
-
-
-    async def start(self):
-        """
-        Start the sensor by following the sensor reading process in the documentation. https://aqicn.org/air/sensor/spec/asair-dht20.pdf
-
-        Returns:
-            bool: True if successful. False if failed.
+    def get_read_latency(self):
         """
-        get_logger().info("Start: starting DHT20...")
-
-        # STEP 1: initialization
-
-        try:
-            if not await asyncio.wait_for(self._init_sensor(), INIT_TIMEOUT):
-                get_logger().warning("failed")
-                return False
-        except asyncio.TimeoutError:
-            get_logger().error("timeout")
-        
-        get_logger().info("Initialization completed")
-
-        # Start the data service
+        Get the latency of the latest measurement read.
 
-        self._data_update_task = asyncio.create_task(self._data_update_service())
-        # await self._data_update_service()
-
-        get_logger().info("start success")
-        return True
-    
-
-    def pause(self):
-        """Pause data collection."""
-        get_logger().info("Pausing data collection...")
-        self._pause_signal.set()
-
-    
-    def resume(self):
-        """Resume data collection."""
-        get_logger().info("Resuming data collection...")
-        self._pause_signal.clear()
-        self._resume_signal.set()
+        Fields:
+        - "last_ms" (int): time from the start of the latest read until the data was available, in milliseconds. -1 if no reads yet.
+        - "max_ms" (int): the longest read latency so far, in milliseconds. -1 if no reads yet.
+        - "polls" (int): number of status word polls in the latest read.
 
-    
-    async def destroy(self):
-        """
-        Destroy the DHT20 instance and freeing up resources.
+        Returns
+            dict: The latency dict.
         """
+        return self._read_latency.copy()
 
-        # Send a destroy signal
-        get_logger().info("Sending destroy signal...")
-        self._destroy_signal.set()
 
-        # Wait for tasks to finish
-        try:
-            if isinstance(self._data_update_task, asyncio.Task):
-                await asyncio.wait_for(self._data_update_task, timeout=10)
+    def get_crc_errors(self):
+        """
+        Get the number of frames rejected because of a bad CRC.
 
-        except asyncio.TimeoutError:
-            get_logger().warning("Destroy signal timed out, sending task cancel signal...")
-            
-            # cancel the tasks
+        Returns
+            int: The number of rejected frames.
+        """
+        return self._crc_errors
 
-            if isinstance(self._data_update_task, asyncio.Task):
-                self._data_update_task.cancel()
-            
-            # wait for the tasks to be cancelled
 
-            if isinstance(self._data_update_task, asyncio.Task):
-                await asyncio.wait_for(self._data_update_task, timeout=10)
+    # *** SENSOR DRIVER HOOKS ***
 
 
-    # *** PRIVATE METHODS ***
-    
-    
     async def _init_sensor(self):
         """
-        Initialize the sensor. Only required when first starting up.
+        Initialize the sensor. Required when first starting up, and to reset the sensor.
 
         Returns:
             bool: True if successful, False if failed.
@@ -180,6 +150,55 @@ class DHT20:
         return False
     
 
+    async def _acquire(self):
+        """
+        Trigger a measurement and read its raw data.
+
+        Returns:
+            bytearray: the raw data. None if the CRC check failed.
+        """
+
+        # STEP 2: trigger measurement
+
+        if not await self._trigger_measurement():
+            raise OSError("failed to send measurement command")
+
+        # STEP 3 and 4: read and validate data
+
+        return await asyncio.wait_for(self._get_raw_data(), DATA_TIMEOUT)
+
+
+    def _parse_data(self, data):
+        """
+        Parse the binary sensor data into the humidity and temperature fields of the data dict.
+
+        Args:
+            data (bytearray): the raw data from the sensor, starting with the status word
+        """
+
+        raw_humidity, raw_temperature = self._parse_raw(data)
+
+        self._data["humidity"] = raw_humidity / (2**20)
+        self._data["temperature"] = raw_temperature / (2**20) * 200 - 50
+
+        humidity_permille, temperature_centi = self._parse_fixed_point(raw_humidity, raw_temperature)
+        self._data["humidity_permille"] = humidity_permille
+        self._data["temperature_centi"] = temperature_centi
+
+
+    def _invalid_data(self):
+        return {
+            "humidity": float("-inf"),
+            "temperature": float("-inf"),
+            "humidity_permille": INVALID_INT16,
+            "temperature_centi": INVALID_INT16,
+            "timestamp": system_clock.uptime_ms()
+        }
+
+
+    # *** PRIVATE METHODS ***
+
+
     async def _trigger_measurement(self):
         """
         Trigger the sensor to start a measurement.
@@ -204,142 +223,107 @@ class DHT20:
     
     async def _get_raw_data(self):
         """
-        Get the raw data from the sensor. Retries untill success. Throws OSError on unexpected disconnection.
+        Get the raw data from the sensor. Polls the status word until the measurement completes, yielding to the
+        event loop between polls with a bounded exponential backoff. Throws OSError on unexpected disconnection.
+
+        In single read mode, the status word, data and CRC are read in one transaction and the frame is rejected
+        if the CRC does not match.
+
+        The time from the start of the read to the data being available is kept in `_read_latency`.
         
         Returns
-            data (bytearray): the raw data.
+            data (bytearray): the raw data, starting with the status word. None if the CRC check failed.
         """
 
         get_logger().info("Reading raw data from sensor...")
+        start_time = time.ticks_ms()
 
         # wait 80ms for the measurement to complete
-        await asyncio.sleep(0.08)
+        await asyncio.sleep(MEASUREMENT_TIME)
 
-        read_successful = False
+        backoff = POLL_BACKOFF_MIN
+        n_polls = 0
         data = None
-        while not read_successful:
+        while True:
+            n_polls += 1
+
+            if self.single_read:
+                # the status word, the data and the CRC in one transaction
+                frame = self._frame
+                self._i2c.readfrom_into(ADDRESS, frame)
+                if not frame[0] & STATUS_BUSY:
+                    if crc8(frame, FRAME_LENGTH - 1) == frame[FRAME_LENGTH - 1]:
+                        data = frame
+                    else:
+                        self._crc_errors += 1
+                        get_logger().warning(f"CRC mismatch, rejecting frame {frame}")
+                    break
+                else:
+                    get_logger().debug("not ready")
+
             # if read status word Bit[7] is 0, the measurement is completed.
-            if self._i2c.writeto(ADDRESS, STATUS_WORD_COMMAND):
-                get_logger().info("waiting for status word...")
+            elif self._i2c.writeto(ADDRESS, STATUS_WORD_COMMAND):
+                get_logger().debug("waiting for status word...")
                 response = self._i2c.readfrom(ADDRESS, 1)
                 status_word = response[0]
-                get_logger().info(f"status word: {response}")
-                if ~status_word & (1 << 7):
-                    # if completed, read six bytes continuously
+                get_logger().debug(f"status word: {response}")
+                if not status_word & STATUS_BUSY:
+                    # if completed, read six bytes continuously, without the CRC
                     get_logger().info("reading data...")
                     data = self._i2c.readfrom(ADDRESS, 6)
-
-                    # STEP 4: data validation
-
-                    # TODO: CRC data validation. 
-                    # NOTE: Right now, everytime we read another byte, we receive \x18, which seems to be the status code.
-                    # after receiving six bytes, the next byte is the CRC check data.
-                    # - to perform CRC check, an ACK can be sent after the sixth byth is received
-                    # - otherwise, send NACK to end
-                    # print("reading crc...")
-                    # crc = self.i2c.readfrom(ADDRESS, 1)
-
-                    # set the read_successful to True
-                    read_successful = True
+                    break
                 else:
-                    get_logger().warning("not ready")
+                    get_logger().debug("not ready")
             else:
                 get_logger().warning("cannot send status word command")
+
+            # yield to the other tasks while the sensor is busy
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, POLL_BACKOFF_MAX)
+
+        latency = time.ticks_diff(time.ticks_ms(), start_time)
+        self._read_latency["last_ms"] = latency
+        self._read_latency["max_ms"] = max(self._read_latency["max_ms"], latency)
+        self._read_latency["polls"] = n_polls
         
         return data
-    
 
-    async def _data_update_service(self):
-        """
-        Updates the data periodically.
-        """
-        
-        get_logger().info("data update service started")
 
-        try:
-            while not self._destroy_signal.is_set():
-
-                if self._pause_signal.is_set():
-                    get_logger().info("Data collection paused. Waiting to resume...")
-                    await self._resume_signal.wait()
-                    self._resume_signal.clear()
-
-                get_logger().info(f"starting a data cycle at timestamp {time.ticks_ms()}...")
-                # wait for the next interval's start time
-                wait_time = self.interval - (time.ticks_ms() - self._data["timestamp"]) / 1000
-                get_logger().info(f"waiting for {wait_time} seconds")
-                if wait_time > 0:
-                    await asyncio.sleep(wait_time)
-
-                # STEP 2: trigger measurement
-
-                try:
-
-                    get_logger().info("Triggering measurement...")
-                    if not await self._trigger_measurement():
-                        # TODO: set the sensor into a warning status signalling that there is problem retrieving data
-                        continue
-
-                    # STEP 3: read data
-
-                    get_logger().info("Reading data from sensor...")
-                    try:
-                        data = await asyncio.wait_for(self._get_raw_data(), DATA_TIMEOUT)
-                    except OSError:
-                        # TODO: set sensor to warning
-                        get_logger().error("OSError, retry")
-                        continue
-                    except asyncio.TimeoutError:
-                        # TODO: set sensor to warning status
-                        continue
-
-                    # STEP 5: parse data
-
-                    # calculate the temperature and humidity value
-
-                    get_logger().info("Parsing data...")
-                    if data is not None:
-                        humidity, temperature = self._parse_data(data)
-                        self._data["humidity"] = humidity
-                        self._data["temperature"] = temperature
-                        self._data["timestamp"] = time.ticks_ms()
-
-                        get_logger().info(f"Humidity = {humidity}")
-                        get_logger().info(f"Temperature = {temperature}")
-                except Exception as e:
-                    get_logger().error(f"Error during DHT20 operation: {e}")
-                    self._data["humidity"] = float("-inf")
-                    self._data["temperature"] = float("-inf")
-                    self._data["timestamp"] = time.ticks_ms()
-                    await asyncio.sleep(1)
-                    get_logger().error(f"Retrying DHT20")
-            get_logger().info("data update service stopped via destroy signal")
-        except asyncio.CancelledError:
-            get_logger().info("data update service cancelled")
-            
-
-    def _parse_data(self, data):
+    def _parse_fixed_point(self, raw_humidity, raw_temperature):
         """
-        Parse the binary sensor data into a tuple of humidity and temperature.
+        Convert the raw fields into fixed-point humidity and temperature, using integers only.
 
         Args:
-            data (bytearray): the raw data from the sensor
+            raw_humidity (int): the raw 20-bit humidity
+            raw_temperature (int): the raw 20-bit temperature
 
         Returns:
-            Tuple[Double, Double]: tuple of humidity (0-1) and temperature (celcius)
+            Tuple[int, int]: tuple of humidity (0-1000 per mille) and temperature (hundredths of a degree celcius)
         """
 
-        data_int = int.from_bytes(data, 'big')
+        # raw * 1000 / 2^20, reduced to raw * 125 / 2^17 so the product stays a small int, rounded to nearest
+        humidity_permille = (raw_humidity * 125 + (1 << 16)) >> 17
+
+        # raw * 20000 / 2^20 - 5000, reduced to raw * 625 / 2^15 for the same reason
+        temperature_centi = ((raw_temperature * 625 + (1 << 14)) >> 15) - 5000
 
-        # Extract the first 8 bits for 'state'
-        state = (data_int >> (20 + 20)) & 0xFF  # Shift to the right and mask with 0xFF for 8 bits
+        return (humidity_permille, temperature_centi)
+
+
+    def _parse_raw(self, data):
+        """
+        Extract the two 20-bit fields with shifts on the individual bytes, without building a big integer.
 
-        # Extract the next 20 bits for 'humidity'
-        humidity = (data_int >> 20) & 0xFFFFF  # Mask with 0xFFFFF for 20 bits
-        humidity /= (2**20)
+        Byte 0 is the status word, followed by 20 bits of humidity and 20 bits of temperature.
+
+        Args:
+            data (bytearray): the raw data from the sensor, starting with the status word
+
+        Returns:
+            Tuple[int, int]: tuple of raw humidity and raw temperature
+        """
 
-        # Extract the final 20 bits for 'temperature'
-        temperature = data_int & 0xFFFFF  # Mask with 0xFFFFF for 20 bits
-        temperature = temperature / (2**20) * 200 - 50
+        raw_humidity = (data[1] << 12) | (data[2] << 4) | (data[3] >> 4)
+        raw_temperature = ((data[3] & 0x0F) << 16) | (data[4] << 8) | data[5]
 
-        return (humidity, temperature)
+        return (raw_humidity, raw_temperature)
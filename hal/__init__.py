@@ -0,0 +1,19 @@
+# The hardware and BLE stack of the device on MicroPython, scriptable fakes elsewhere, so the drivers and the BLE
+# wrapper run and are profiled off-device
+import sys
+
+if sys.implementation.name == "micropython":
+    from machine import Pin, UART, I2C, ADC, RTC
+    from neopixel import NeoPixel
+    from bluetooth import UUID
+    import aioble
+    ON_DEVICE = True
+else:
+    from . import compat
+    compat.install()
+    from .fakes import Pin, UART, I2C, ADC, RTC, NeoPixel, UUID
+    from . import ble as aioble
+    ON_DEVICE = False
+
+# Define what should be available when the module is imported
+__all__ = ["Pin", "UART", "I2C", "ADC", "RTC", "NeoPixel", "UUID", "aioble", "ON_DEVICE"]
\ No newline at end of file
@@ -0,0 +1,603 @@
+import asyncio
+import random
+import time
+
+# ATT MTU before any exchange
+DEFAULT_MTU = 23
+
+# ATT header of a notification, an indication or a write
+ATT_HEADER_SIZE = 3
+
+# Size of the buffer of a characteristic value unless its initial value or a local write is larger. Longer writes
+# from a central are cut to the buffer, as the stack does.
+DEFAULT_BUFFER_SIZE = 20
+
+# ATT error codes
+READ_NOT_PERMITTED = 0x02
+WRITE_NOT_PERMITTED = 0x03
+
+# Directions of the packets on a link
+_TO_CENTRAL = 0
+_TO_PERIPHERAL = 1
+
+# State of the simulated stack: the registered services, the pending advertisement, the open connections and the
+# centrals waiting for an advertisement
+_services = []
+_advertisement = None
+_connections = []
+_scanners = []
+
+
+class DeviceDisconnectedError(Exception):
+    pass
+
+
+class GattError(Exception):
+    def __init__(self, status):
+        super().__init__(f"GATT error {status:#04x}")
+        self._status = status
+
+
+def reset():
+    """Forget the registered services, the advertisement and the connections, e.g. between tests."""
+    global _advertisement
+    for connection in list(_connections):
+        connection._drop()
+    _services.clear()
+    _scanners.clear()
+    _advertisement = None
+
+
+async def _wait(future, timeout_ms):
+    """Await a future, raising asyncio.TimeoutError after `timeout_ms` milliseconds unless None."""
+    if timeout_ms is None:
+        return await future
+    return await asyncio.wait_for(future, timeout_ms / 1000)
+
+
+def _resolve(future, result):
+    """Set the result of a future still awaited."""
+    if not future.done():
+        future.set_result(result)
+
+
+def _find(uuid):
+    """The registered characteristic of a UUID, or None."""
+    for service in _services:
+        for characteristic in service.characteristics:
+            if characteristic.uuid == uuid:
+                return characteristic
+    return None
+
+
+class _Direction:
+    """The packets in flight one way on a link, and the connection event they go out on."""
+
+    def __init__(self):
+        self.pending = [] # due time from time.ticks_ms(), delivery function and its arguments, in arrival order
+        self.event = -1 # the latest connection event with a packet
+        self.used = 0 # number of packets sent on that event
+        self.ready = asyncio.Event()
+        self.task = None
+
+
+class Link:
+    """
+    Simulated radio link between the peripheral and a central.
+
+    Packets go out on connection events, every `interval_ms` milliseconds, at most `packets_per_event` each way per
+    event, and arrive `latency_ms` milliseconds after their event. A packet is lost with probability `loss` and sent
+    again on the next event, as the link layer does, so losses cost latency and throughput but no data. Packets arrive
+    in order, when time.ticks_ms() reaches their time, so a virtual clock drives the link too.
+
+    Attributes:
+        interval_ms (int): the connection interval.
+        latency_ms (int): the time on the air of a packet, after its connection event.
+        mtu (int): the largest ATT MTU of the central.
+        loss (float): the probability of losing a packet, from 0 to 1 excluded.
+        packets_per_event (int): the most packets each way on one connection event.
+    """
+
+    def __init__(self, interval_ms=30, latency_ms=0, mtu=247, loss=0.0, packets_per_event=4, seed=None):
+        if interval_ms <= 0:
+            raise ValueError(f"Non-positive connection interval: {interval_ms}")
+        if packets_per_event < 1:
+            raise ValueError(f"No packet per connection event: {packets_per_event}")
+        if not 0 <= loss < 1:
+            raise ValueError(f"Loss out of [0, 1): {loss}")
+        if mtu < DEFAULT_MTU:
+            raise ValueError(f"MTU under {DEFAULT_MTU}: {mtu}")
+        self.interval_ms = interval_ms
+        self.latency_ms = latency_ms
+        self.mtu = mtu
+        self.loss = loss
+        self.packets_per_event = packets_per_event
+
+        self._random = random.Random(seed)
+        self._start = 0 # time.ticks_ms() of the connection, the first connection event
+        self._ways = None
+        self._stats = {
+            "packets": 0,
+            "bytes": 0,
+            "retransmissions": 0
+        }
+
+
+    def get_stats(self):
+        """
+        Get the link counters, over every connection of the link.
+
+        Fields:
+        - "packets" (int): number of packets delivered, both ways.
+        - "bytes" (int): number of bytes delivered, ATT headers included.
+        - "retransmissions" (int): number of packets lost and sent again.
+
+        Returns
+            dict: The counters dict.
+        """
+        return self._stats.copy()
+
+
+    def _open(self):
+        """Start the first connection event now, and deliver packets until closed."""
+        self._start = time.ticks_ms()
+        self._ways = (_Direction(), _Direction())
+        for way in self._ways:
+            way.task = asyncio.create_task(self._pump(way))
+
+
+    def _close(self):
+        """Drop the packets in flight."""
+        if self._ways is not None:
+            for way in self._ways:
+                way.task.cancel()
+            self._ways = None
+
+
+    def _send(self, direction, size, deliver, *args):
+        """Send a packet of `size` bytes, calling `deliver(*args)` when it arrives."""
+        way = self._ways[direction]
+        elapsed = time.ticks_diff(time.ticks_ms(), self._start)
+        event = -(-elapsed // self.interval_ms)
+        if event > way.event:
+            way.event = event
+            way.used = 0
+
+        while True:
+            if way.used == self.packets_per_event:
+                way.event += 1
+                way.used = 0
+            way.used += 1
+            if self.loss == 0 or self._random.random() >= self.loss:
+                break
+            self._stats["retransmissions"] += 1
+
+        self._stats["packets"] += 1
+        self._stats["bytes"] += size
+        due = time.ticks_add(self._start, way.event * self.interval_ms + self.latency_ms)
+        way.pending.append((due, deliver, args))
+        way.ready.set()
+
+
+    async def _pump(self, way):
+        """Deliver the packets one way when their time comes."""
+        while True:
+            if not way.pending:
+                way.ready.clear()
+                await way.ready.wait()
+                continue
+            due, deliver, args = way.pending[0]
+            wait = time.ticks_diff(due, time.ticks_ms())
+            if wait > 0:
+                await asyncio.sleep(wait / 1000)
+                continue
+            way.pending.pop(0)
+            deliver(*args)
+
+
+class Device:
+    """The peer of a connection."""
+
+    def __init__(self, addr):
+        self.addr_type = 0
+        self.addr = addr
+
+
+    def __str__(self):
+        return f"Device(ADDR_PUBLIC, {self.addr})"
+
+
+class DeviceConnection:
+    """
+    The peripheral's end of a connection, as returned by `advertise()`.
+
+    Disconnection is immediate: the packets in flight are dropped, and the replies awaited on either end raise
+    DeviceDisconnectedError.
+
+    Attributes:
+        device (Device): the central.
+        link (Link): the link to the central.
+        mtu (int): the ATT MTU, DEFAULT_MTU until exchanged.
+    """
+
+    def __init__(self, link, device):
+        self.device = device
+        self.link = link
+        self.mtu = DEFAULT_MTU
+        self.client = ClientConnection(self)
+
+        self._connected = True
+        self._futures = [] # replies awaited on either end
+        self._disconnected = [] # futures of the disconnected() calls
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self._drop()
+
+
+    def is_connected(self):
+        return self._connected
+
+
+    async def exchange_mtu(self, mtu=None, timeout_ms=None):
+        """Exchange the ATT MTU with the central, and return the smaller of both."""
+        future = asyncio.get_running_loop().create_future()
+        self.link._send(_TO_CENTRAL, ATT_HEADER_SIZE, self._on_mtu_request, future)
+        self.mtu = min(mtu or self.link.mtu, await self._await(future, timeout_ms))
+        self.client.mtu = self.mtu
+        return self.mtu
+
+
+    async def disconnect(self, timeout_ms=2000):
+        self._drop()
+
+
+    async def disconnected(self, timeout_ms=None, disconnect=False):
+        if disconnect:
+            self._drop()
+        if not self._connected:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._disconnected.append(future)
+        await _wait(future, timeout_ms)
+
+
+    def _on_mtu_request(self, future):
+        """The central answers with its own MTU."""
+        self.link._send(_TO_PERIPHERAL, ATT_HEADER_SIZE, _resolve, future, self.link.mtu)
+
+
+    async def _await(self, future, timeout_ms):
+        """Await a reply over the link, raising DeviceDisconnectedError if the connection drops first."""
+        if not self._connected:
+            raise DeviceDisconnectedError()
+        self._futures.append(future)
+        try:
+            return await _wait(future, timeout_ms)
+        finally:
+            self._futures.remove(future)
+
+
+    def _drop(self):
+        """Disconnect both ends."""
+        if not self._connected:
+            return
+        self._connected = False
+        self.link._close()
+        _connections.remove(self)
+        for future in self._futures:
+            if not future.done():
+                future.set_exception(DeviceDisconnectedError())
+        for future in self._disconnected:
+            _resolve(future, None)
+        self._disconnected = []
+
+
+class ClientConnection:
+    """
+    The central's end of a connection, as returned by `connect()`, scripting the client of the peripheral.
+
+    Attributes:
+        link (Link): the link to the peripheral.
+        mtu (int): the ATT MTU, DEFAULT_MTU until the peripheral exchanges it.
+    """
+
+    def __init__(self, connection):
+        self.link = connection.link
+        self.mtu = DEFAULT_MTU
+
+        self._connection = connection
+        self._subscriptions = set() # UUIDs of the characteristics notified on updates
+        self._queues = {} # received values of each UUID and kind, notification or indication
+        self._receivers = {} # future awaiting the next value of each UUID and kind
+
+
+    def is_connected(self):
+        return self._connection.is_connected()
+
+
+    def characteristic(self, uuid):
+        """The characteristic of a UUID on the peripheral, or None if it has none."""
+        characteristic = _find(uuid)
+        if characteristic is None:
+            return None
+        return ClientCharacteristic(self, characteristic)
+
+
+    async def disconnect(self, timeout_ms=2000):
+        self._connection._drop()
+
+
+    async def disconnected(self, timeout_ms=None):
+        await self._connection.disconnected(timeout_ms)
+
+
+    def _receive(self, uuid, data, confirmation):
+        """Queue a notified or indicated value, and confirm an indication."""
+        key = (uuid, confirmation is not None)
+        self._queues.setdefault(key, []).append(data)
+        receiver = self._receivers.pop(key, None)
+        if receiver is not None:
+            _resolve(receiver, None)
+        if confirmation is not None:
+            self.link._send(_TO_PERIPHERAL, 1, _resolve, confirmation, None)
+
+
+    async def _next(self, uuid, indication, timeout_ms):
+        """The oldest notified or indicated value of a UUID not returned yet, waiting for it if none."""
+        key = (uuid, indication)
+        if not self._queues.get(key):
+            future = asyncio.get_running_loop().create_future()
+            self._receivers[key] = future
+            await self._connection._await(future, timeout_ms)
+        return self._queues[key].pop(0)
+
+
+class ClientCharacteristic:
+    """A characteristic of the peripheral, seen from the central."""
+
+    def __init__(self, client, characteristic):
+        self.uuid = characteristic.uuid
+        self._client = client
+        self._characteristic = characteristic
+
+
+    async def read(self, timeout_ms=1000):
+        """Read the value over the link."""
+        if not self._characteristic._read:
+            raise GattError(READ_NOT_PERMITTED)
+        future = asyncio.get_running_loop().create_future()
+        self._client.link._send(_TO_PERIPHERAL, ATT_HEADER_SIZE, self._on_read, future)
+        return await self._client._connection._await(future, timeout_ms)
+
+
+    async def write(self, data, response=None, timeout_ms=1000):
+        """
+        Write a value over the link, and wait for the write response with `response`, by default if the
+        characteristic accepts writes with response.
+
+        Raises:
+            ValueError: if the value does not fit in one packet.
+            GattError: if the characteristic is not writable.
+        """
+        characteristic = self._characteristic
+        if response is None:
+            response = characteristic._write
+        if not (characteristic._write if response else characteristic._write_no_response):
+            raise GattError(WRITE_NOT_PERMITTED)
+        if len(data) > self._client.mtu - ATT_HEADER_SIZE:
+            raise ValueError(f"{len(data)} bytes do not fit in an MTU of {self._client.mtu}")
+        connection = self._client._connection
+        if not connection.is_connected():
+            raise DeviceDisconnectedError()
+
+        future = asyncio.get_running_loop().create_future() if response else None
+        self._client.link._send(_TO_PERIPHERAL, ATT_HEADER_SIZE + len(data), self._on_write, bytes(data), future)
+        if future is not None:
+            await connection._await(future, timeout_ms)
+
+
+    async def subscribe(self, notify=True, indicate=False, timeout_ms=1000):
+        """Subscribe to the updates written with `send_update`, over the link."""
+        future = asyncio.get_running_loop().create_future()
+        self._client.link._send(_TO_PERIPHERAL, ATT_HEADER_SIZE + 2, self._on_subscribe, notify or indicate, future)
+        await self._client._connection._await(future, timeout_ms)
+
+
+    async def notified(self, timeout_ms=None):
+        """The oldest notified value not returned yet, waiting for it if none."""
+        return await self._client._next(self.uuid, False, timeout_ms)
+
+
+    async def indicated(self, timeout_ms=None):
+        """The oldest indicated value not returned yet, waiting for it if none."""
+        return await self._client._next(self.uuid, True, timeout_ms)
+
+
+    def _on_read(self, future):
+        value = self._characteristic._value
+        self._client.link._send(_TO_CENTRAL, ATT_HEADER_SIZE + len(value), _resolve, future, value)
+
+
+    def _on_write(self, data, future):
+        self._characteristic._on_write(self._client._connection, data)
+        if future is not None:
+            self._client.link._send(_TO_CENTRAL, 1, _resolve, future, None)
+
+
+    def _on_subscribe(self, subscribe, future):
+        if subscribe:
+            self._client._subscriptions.add(self.uuid)
+        else:
+            self._client._subscriptions.discard(self.uuid)
+        self._client.link._send(_TO_CENTRAL, 1, _resolve, future, None)
+
+
+class Service:
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self.characteristics = []
+
+
+class Characteristic:
+    """
+    A characteristic of the peripheral, with the aioble API.
+
+    Values notified or indicated are cut to the ATT MTU of the connection, and values written by a central to the
+    value buffer, as the stack does. The buffer holds DEFAULT_BUFFER_SIZE bytes, or the initial value or the longest
+    local write if larger.
+    """
+
+    def __init__(self, service, uuid, read=False, write=False, write_no_response=False, notify=False, indicate=False,
+                 initial=None, capture=False):
+        service.characteristics.append(self)
+        self.uuid = uuid
+        self._read = read
+        self._write = write
+        self._write_no_response = write_no_response
+        self._notify = notify
+        self._indicate = indicate
+        self._capture = capture
+        self._value = bytes(initial) if initial is not None else b""
+        self._buffer_size = max(DEFAULT_BUFFER_SIZE, len(self._value))
+        self._writes = [] # connection and value of the writes not returned by written() yet
+        self._write_waiter = None
+        self._indicating = False
+
+
+    def read(self):
+        return self._value
+
+
+    def write(self, data, send_update=False):
+        """Set the value, growing the buffer to fit, and notify it to the subscribed centrals with `send_update`."""
+        self._value = bytes(data)
+        self._buffer_size = max(self._buffer_size, len(self._value))
+        if send_update:
+            for connection in _connections:
+                if self.uuid in connection.client._subscriptions:
+                    self._send(connection, self._value, None)
+
+
+    async def written(self, timeout_ms=None):
+        """
+        Wait for a write from a central.
+
+        Returns:
+            DeviceConnection: the connection of the write. With `capture`, the connection and the value written.
+        """
+        if not (self._write or self._write_no_response):
+            raise ValueError("Not supported")
+        if not self._writes:
+            self._write_waiter = asyncio.get_running_loop().create_future()
+            try:
+                await _wait(self._write_waiter, timeout_ms)
+            finally:
+                self._write_waiter = None
+        connection, data = self._writes.pop(0)
+        return (connection, data) if self._capture else connection
+
+
+    def notify(self, connection, data=None):
+        if not connection.is_connected():
+            raise DeviceDisconnectedError()
+        self._send(connection, self._value if data is None else data, None)
+
+
+    async def indicate(self, connection, data=None, timeout_ms=1000):
+        """Send an indication and wait for the central to confirm it."""
+        if self._indicating:
+            raise ValueError("In progress")
+        if not connection.is_connected():
+            raise DeviceDisconnectedError()
+        future = asyncio.get_running_loop().create_future()
+        self._indicating = True
+        try:
+            self._send(connection, self._value if data is None else data, future)
+            await connection._await(future, timeout_ms)
+        finally:
+            self._indicating = False
+
+
+    def _send(self, connection, data, confirmation):
+        """Send a value to the central of a connection, as an indication if a confirmation is awaited."""
+        if isinstance(data, str):
+            # a MicroPython string is a buffer of its UTF-8 bytes
+            data = data.encode("utf-8")
+        payload = bytes(data[:connection.mtu - ATT_HEADER_SIZE])
+        connection.link._send(_TO_CENTRAL, ATT_HEADER_SIZE + len(payload), connection.client._receive, self.uuid,
+                              payload, confirmation)
+
+
+    def _on_write(self, connection, data):
+        """Keep a value written by a central, every value with `capture`, the latest one otherwise."""
+        data = data[:self._buffer_size]
+        self._value = data
+        if self._capture:
+            self._writes.append((connection, data))
+        else:
+            self._writes = [(connection, data)]
+        if self._write_waiter is not None:
+            _resolve(self._write_waiter, None)
+
+
+def register_services(*services):
+    """Replace the services of the GATT server."""
+    _services[:] = services
+
+
+async def advertise(interval_us, adv_data=None, resp_data=None, connectable=True, limited_disc=False,
+                    include_tx_power=False, name=None, services=None, appearance=0, manufacturer=None,
+                    timeout_ms=None):
+    """
+    Advertise until a central connects with `connect()`.
+
+    Returns:
+        DeviceConnection: the connection.
+    """
+    global _advertisement
+    future = asyncio.get_running_loop().create_future()
+    _advertisement = (name, future)
+    for scanner in _scanners:
+        _resolve(scanner, None)
+    try:
+        return await _wait(future, timeout_ms)
+    finally:
+        if _advertisement is not None and _advertisement[1] is future:
+            _advertisement = None
+
+
+async def connect(link=None, name=None, timeout_ms=None):
+    """
+    Connect to the peripheral as a central, waiting for it to advertise.
+
+    Args:
+        link (Optional[Link]): the link of the connection. None for a default link.
+        name (Optional[str]): the name advertised by the peripheral. None to connect to any.
+        timeout_ms (Optional[int]): the longest wait for the advertisement. None to wait forever.
+
+    Returns:
+        ClientConnection: the central's end of the connection.
+    """
+    global _advertisement
+    while _advertisement is None or (name is not None and _advertisement[0] != name):
+        scanner = asyncio.get_running_loop().create_future()
+        _scanners.append(scanner)
+        try:
+            await _wait(scanner, timeout_ms)
+        finally:
+            _scanners.remove(scanner)
+
+    future = _advertisement[1]
+    _advertisement = None
+    if link is None:
+        link = Link()
+    link._open()
+    connection = DeviceConnection(link, Device(f"02:00:00:00:00:{len(_connections) + 1:02x}"))
+    _connections.append(connection)
+    future.set_result(connection)
+    return connection.client
@@ -0,0 +1,40 @@
+import builtins
+import time
+
+# time.ticks_ms() of MicroPython wraps around every 2**30 milliseconds, and so do these
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) & _TICKS_MAX
+
+
+def ticks_us():
+    return int(time.monotonic() * 1_000_000) & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def sleep_ms(ms):
+    time.sleep(ms / 1000)
+
+
+def const(value):
+    return value
+
+
+def install():
+    """Add the MicroPython functions of `time` and the `const()` builtin that CPython lacks, keeping any present."""
+    for function in (ticks_ms, ticks_us, ticks_add, ticks_diff, sleep_ms):
+        if not hasattr(time, function.__name__):
+            setattr(time, function.__name__, function)
+    if not hasattr(builtins, "const"):
+        builtins.const = const
@@ -0,0 +1,112 @@
+import time
+
+# DHT20 commands and status bits
+_DHT20_MEASURE = 0xAC
+_DHT20_STATUS = 0x71
+_DHT20_BUSY = 0x80
+_DHT20_CALIBRATED = 0x18
+
+
+def _crc8(data):
+    """CRC-8 of the DHT20: polynomial 0x31, initial value 0xFF."""
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class FakeDHT20:
+    """
+    I2C device model of the DHT20, for `hal.I2C.attach(0x38, FakeDHT20())`.
+
+    A measurement command makes the sensor busy for `measurement_ms`, then reads return the status word, the raw
+    humidity and temperature of the current `humidity` and `temperature`, and the CRC. Set `corrupt` to send that many
+    frames with a bad CRC.
+
+    Attributes:
+        temperature (float): the temperature measured, in celcius.
+        humidity (float): the relative humidity measured, from 0 to 1.
+        measurement_ms (int): the time of a measurement, in milliseconds.
+        measurements (int): number of measurements triggered.
+        corrupt (int): number of the next frames sent with a bad CRC.
+    """
+
+    def __init__(self, temperature=22.0, humidity=0.45, measurement_ms=80):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.measurement_ms = measurement_ms
+        self.measurements = 0
+        self.corrupt = 0
+        self._ready = None # time.ticks_ms() when the measurement completes
+
+
+    def write(self, data):
+        if data[0] == _DHT20_MEASURE:
+            self._ready = time.ticks_add(time.ticks_ms(), self.measurement_ms)
+            self.measurements += 1
+        return len(data)
+
+
+    def read(self, nbytes):
+        busy = self._ready is not None and time.ticks_diff(time.ticks_ms(), self._ready) < 0
+        status = _DHT20_CALIBRATED | (_DHT20_BUSY if busy else 0)
+
+        humidity = max(0, min(0xFFFFF, int(self.humidity * (1 << 20))))
+        temperature = max(0, min(0xFFFFF, int((self.temperature + 50) / 200 * (1 << 20))))
+        frame = bytearray((
+            status,
+            humidity >> 12,
+            (humidity >> 4) & 0xFF,
+            ((humidity & 0x0F) << 4) | (temperature >> 16),
+            (temperature >> 8) & 0xFF,
+            temperature & 0xFF
+        ))
+        crc = _crc8(frame)
+        if nbytes >= 7 and not busy and self.corrupt > 0:
+            self.corrupt -= 1
+            crc ^= 0xFF
+        frame.append(crc)
+        return frame[:nbytes]
+
+
+def pms7003_frame(pm1, pm2_5, pm10, n_particles=(0, 0, 0, 0, 0, 0)):
+    """
+    Build a PMS7003 active mode frame, to stream on a fake UART.
+
+    Args:
+        pm1 (int): PM1.0 in µg/m³, sent as both the CF=1 and the atmospheric concentration.
+        pm2_5 (int): PM2.5 in µg/m³.
+        pm10 (int): PM10 in µg/m³.
+        n_particles (Sequence[int]): the particles beyond 0.3, 0.5, 1, 2.5, 5 and 10 um in 0.1 L of air.
+
+    Returns:
+        bytes: the 32-byte frame.
+    """
+    words = (28, pm1, pm2_5, pm10, pm1, pm2_5, pm10) + tuple(n_particles) + (0,)
+    frame = bytearray(b"\x42\x4d")
+    for word in words:
+        frame.append((word >> 8) & 0xFF)
+        frame.append(word & 0xFF)
+    checksum = sum(frame) & 0xFFFF
+    frame.append(checksum >> 8)
+    frame.append(checksum & 0xFF)
+    return bytes(frame)
+
+
+def ze07co_frame(concentration_deci, range_deci=5000):
+    """
+    Build a ZE07-CO initiative upload frame, to stream on a fake UART.
+
+    Args:
+        concentration_deci (int): the CO concentration in tenths of a PPM.
+        range_deci (int): the full range in tenths of a PPM.
+
+    Returns:
+        bytes: the 9-byte frame.
+    """
+    frame = bytearray((0xFF, 0x04, 0x03, 0x01, concentration_deci >> 8, concentration_deci & 0xFF,
+                       range_deci >> 8, range_deci & 0xFF))
+    frame.append((~sum(frame[1:]) + 1) & 0xFF)
+    return bytes(frame)
@@ -0,0 +1,302 @@
+import time
+
+# MicroPython raises OSError(EIO) when no device acknowledges its I2C address
+EIO = 5
+
+# Default size of the UART receive FIFO on the Pico
+DEFAULT_RXBUF = 256
+
+
+class Pin:
+    """Fake of machine.Pin, keeping the value set."""
+
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = 0 if value is None else value
+
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+
+
+    def on(self):
+        self._value = 1
+
+
+    def off(self):
+        self._value = 0
+
+
+    high = on
+    low = off
+
+
+class UART:
+    """
+    Fake of machine.UART, receiving bytes from scripts instead of a wire.
+
+    Bytes are received immediately with `feed()`, after a delay with `schedule()`, or periodically with `stream()`,
+    like a sensor in active mode. Scheduled bytes arrive when `time.ticks_ms()` reaches their time, so a virtual
+    clock drives them too. Bytes over the receive FIFO size are dropped and counted, like the hardware FIFO overflowing
+    when the driver reads too slowly. Written bytes are kept in `written`.
+
+    Attributes:
+        rxbuf (int): the size of the receive FIFO.
+        written (bytearray): every byte written.
+        overflows (int): number of bytes dropped on a full receive FIFO.
+    """
+
+    def __init__(self, id, baudrate=9600, bits=8, parity=None, stop=1, tx=None, rx=None, timeout=0, timeout_char=0,
+                 rxbuf=DEFAULT_RXBUF):
+        self.id = id
+        self.baudrate = baudrate
+        self.rxbuf = rxbuf
+        self.written = bytearray()
+        self.overflows = 0
+        self._rx = bytearray()
+        self._scheduled = [] # due time from time.ticks_ms() and bytes, in arrival order
+        self._streams = [] # next due time, interval in milliseconds, frame source and number of frames sent
+
+
+    def init(self, *args, **kwargs):
+        pass
+
+
+    def deinit(self):
+        pass
+
+
+    # *** SCRIPTING ***
+
+
+    def feed(self, data):
+        """Receive bytes now."""
+        free = self.rxbuf - len(self._rx)
+        if len(data) > free:
+            self.overflows += len(data) - max(free, 0)
+            data = data[:max(free, 0)]
+        self._rx.extend(data)
+
+
+    def schedule(self, data, delay_ms):
+        """Receive bytes in `delay_ms` milliseconds."""
+        due = time.ticks_add(time.ticks_ms(), delay_ms)
+        self._scheduled.append((due, bytes(data)))
+
+
+    def stream(self, frames, interval_ms):
+        """
+        Receive a frame every `interval_ms` milliseconds, starting in `interval_ms`.
+
+        Args:
+            frames (bytes | Callable[[int], bytes]): the frame, or a function of the frame number returning it.
+            interval_ms (int): the time between frames.
+        """
+        due = time.ticks_add(time.ticks_ms(), interval_ms)
+        self._streams.append([due, interval_ms, frames, 0])
+
+
+    def stop_streams(self):
+        """Stop every stream and scheduled reception."""
+        self._streams = []
+        self._scheduled = []
+
+
+    # *** machine.UART ***
+
+
+    def any(self):
+        self._pump()
+        return len(self._rx)
+
+
+    def read(self, nbytes=None):
+        self._pump()
+        if not self._rx:
+            return None
+        if nbytes is None:
+            nbytes = len(self._rx)
+        data = bytes(self._rx[:nbytes])
+        del self._rx[:nbytes]
+        return data
+
+
+    def readinto(self, buf, nbytes=None):
+        self._pump()
+        if not self._rx:
+            return None
+        if nbytes is None:
+            nbytes = len(buf)
+        nbytes = min(nbytes, len(self._rx), len(buf))
+        buf[:nbytes] = self._rx[:nbytes]
+        del self._rx[:nbytes]
+        return nbytes
+
+
+    def write(self, buf):
+        self.written.extend(buf)
+        return len(buf)
+
+
+    def _pump(self):
+        """Receive the scheduled and streamed bytes that are due."""
+        now = time.ticks_ms()
+        while self._scheduled and time.ticks_diff(now, self._scheduled[0][0]) >= 0:
+            self.feed(self._scheduled.pop(0)[1])
+        for stream in self._streams:
+            while time.ticks_diff(now, stream[0]) >= 0:
+                frames = stream[2]
+                self.feed(frames(stream[3]) if callable(frames) else frames)
+                stream[3] += 1
+                stream[0] = time.ticks_add(stream[0], stream[1])
+
+
+class I2C:
+    """
+    Fake of machine.I2C, forwarding the transactions to device models attached by address.
+
+    A device model has `write(data)`, returning the number of bytes acknowledged, and `read(nbytes)`. Addressing a
+    missing device raises OSError(EIO), like a missing acknowledgement.
+    """
+
+    def __init__(self, id=0, scl=None, sda=None, freq=400_000):
+        self.id = id
+        self.freq = freq
+        self._devices = {}
+
+
+    def attach(self, address, device):
+        """Attach a device model at a 7-bit address."""
+        self._devices[address] = device
+
+
+    def detach(self, address):
+        """Detach a device, e.g. to simulate a loose wire."""
+        self._devices.pop(address, None)
+
+
+    def scan(self):
+        return sorted(self._devices)
+
+
+    def writeto(self, addr, buf, stop=True):
+        return self._device(addr).write(bytes(buf))
+
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return bytes(self._device(addr).read(nbytes))
+
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self._device(addr).read(len(buf))
+
+
+    def _device(self, addr):
+        device = self._devices.get(addr)
+        if device is None:
+            raise OSError(EIO)
+        return device
+
+
+class ADC:
+    """Fake of machine.ADC, returning programmed values."""
+
+    def __init__(self, pin):
+        self.pin = pin
+        self._values = [0]
+        self._index = 0
+
+
+    def program(self, values):
+        """
+        Set the values returned by `read_u16()`, in order, then the last one forever.
+
+        Args:
+            values (int | Sequence[int]): the 16-bit values.
+        """
+        self._values = [values] if isinstance(values, int) else list(values)
+        self._index = 0
+
+
+    def read_u16(self):
+        value = self._values[self._index]
+        if self._index < len(self._values) - 1:
+            self._index += 1
+        return value
+
+
+class RTC:
+    """Fake of machine.RTC, keeping the time set."""
+
+    _datetime = (2021, 1, 1, 4, 0, 0, 0, 0)
+
+    def datetime(self, datetime=None):
+        if datetime is None:
+            return RTC._datetime
+        RTC._datetime = tuple(datetime)
+
+
+class NeoPixel:
+    """
+    Fake of neopixel.NeoPixel, keeping the colors set and the colors shown by the latest `write()`.
+
+    Attributes:
+        shown (list[tuple]): the colors sent to the strip by the latest `write()`.
+        writes (int): number of writes to the strip.
+    """
+
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self._colors = [(0,) * bpp for _ in range(n)]
+        self.shown = list(self._colors)
+        self.writes = 0
+
+
+    def __len__(self):
+        return self.n
+
+
+    def __setitem__(self, index, color):
+        self._colors[index] = tuple(color)
+
+
+    def __getitem__(self, index):
+        return self._colors[index]
+
+
+    def fill(self, color):
+        for i in range(self.n):
+            self._colors[i] = tuple(color)
+
+
+    def write(self):
+        self.shown = list(self._colors)
+        self.writes += 1
+
+
+class UUID:
+    """Fake of bluetooth.UUID, comparable and hashable."""
+
+    def __init__(self, value):
+        self.value = value.lower() if isinstance(value, str) else value
+
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self.value == other.value
+
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+    def __repr__(self):
+        return f"UUID({self.value!r})"
@@ -0,0 +1,150 @@
+import asyncio
+import selectors
+import time
+
+from .compat import ticks_add, _TICKS_MAX
+
+# Period of time.ticks_ms() and time.ticks_us(), as on MicroPython
+TICKS_PERIOD = _TICKS_MAX + 1
+
+# Functions of `time` replaced while a virtual clock is installed
+_PATCHED = ("ticks_ms", "ticks_us", "time", "sleep", "sleep_ms")
+
+
+class VirtualClock:
+    """
+    Simulated time behind time.ticks_ms(), time.ticks_us(), time.time(), the blocking sleeps and the event loop of
+    `run()`, so days of the application run in seconds.
+
+    The event loop never waits: when every task is blocked, the clock jumps to the next timer, e.g. the end of an
+    `asyncio.sleep()` or of an `asyncio.wait_for()`. Time only passes between timers, so code runs in zero simulated
+    time, and runs are deterministic. Start the ticks shortly before their wraparound with `start_ms` to exercise it.
+
+    Attributes:
+        epoch (int): the Unix time at the start, in seconds.
+    """
+
+    def __init__(self, start_ms=0, epoch=1_700_000_000):
+        """
+        Args:
+            start_ms (int): time.ticks_ms() at the start, e.g. `TICKS_PERIOD - 60_000` to wrap after a minute.
+            epoch (int): time.time() at the start, in seconds.
+        """
+        self.epoch = epoch
+        self._start_ms = start_ms & _TICKS_MAX
+        self._us = 0 # simulated time since the start, in microseconds
+        self._saved = None # the functions of `time` replaced by install()
+
+
+    def __enter__(self):
+        self.install()
+        return self
+
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.uninstall()
+
+
+    # *** PUBLIC GETTERS ***
+
+
+    def elapsed(self):
+        """
+        Get the simulated time since the start.
+
+        Returns:
+            float: the time in seconds.
+        """
+        return self._us / 1_000_000
+
+
+    def ticks_ms(self):
+        return ticks_add(self._start_ms, self._us // 1000)
+
+
+    def ticks_us(self):
+        return (self._start_ms * 1000 + self._us) & _TICKS_MAX
+
+
+    def time(self):
+        return self.epoch + self._us / 1_000_000
+
+
+    # *** PUBLIC METHODS ***
+
+
+    def advance(self, seconds):
+        """Let simulated time pass, to the nearest microsecond, the resolution of the event loop."""
+        if seconds > 0:
+            self._us += round(seconds * 1_000_000)
+
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+    def sleep_ms(self, ms):
+        self.advance(ms / 1000)
+
+
+    def install(self):
+        """Replace the functions of `time` with the simulated ones, until `uninstall()`."""
+        if self._saved is not None:
+            return
+        self._saved = {name: getattr(time, name, None) for name in _PATCHED}
+        for name in _PATCHED:
+            setattr(time, name, getattr(self, name))
+
+
+    def uninstall(self):
+        """Restore the functions of `time`."""
+        if self._saved is None:
+            return
+        for name, function in self._saved.items():
+            if function is None:
+                delattr(time, name)
+            else:
+                setattr(time, name, function)
+        self._saved = None
+
+
+    def run(self, main):
+        """
+        Run a coroutine to completion on a simulated event loop, like `asyncio.run()`.
+
+        Raises:
+            RuntimeError: if every task is blocked with no timer to wake them, which would never end.
+        """
+        with asyncio.Runner(loop_factory=lambda: VirtualEventLoop(self)) as runner:
+            return runner.run(main)
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """
+    Never waits nor polls, and advances the clock by the time the event loop would have waited instead. The loop
+    only polls to be woken from other threads or by signals, whose callbacks it runs on its next iteration anyway.
+    """
+
+    def __init__(self, clock):
+        super().__init__()
+        self._clock = clock
+
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise RuntimeError("Every task is blocked with no timer, the simulation would never end")
+        self._clock.advance(timeout)
+        return []
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Event loop on the time of a VirtualClock, jumping to the next timer instead of waiting for it."""
+
+    def __init__(self, clock):
+        super().__init__(_VirtualSelector(clock))
+        self._clock_resolution = 1e-6
+        self._virtual_clock = clock
+
+
+    def time(self):
+        return self._virtual_clock.elapsed()
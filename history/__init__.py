@@ -0,0 +1,7 @@
+# Import the History class to make it accessible from the module level
+from .history import History, INVALID_INT16, INVALID_UINT16
+from .rolling_stats import RollingStats
+from .codec import HistoryEncoder
+
+# Define what should be available when the module is imported
+__all__ = ["History", "RollingStats", "HistoryEncoder", "INVALID_INT16", "INVALID_UINT16"]
\ No newline at end of file
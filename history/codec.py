@@ -0,0 +1,186 @@
+from array import array
+
+# Version byte at the start of every block
+CODEC_VERSION = 2
+
+# Flag of the version byte, set if the first record of the block is raw
+RAW_FIRST_RECORD = 0x80
+
+# Version byte, number of records and the timestamp of the first record (uint32, little-endian)
+BLOCK_HEADER_SIZE = 6
+
+# Records per block, so the count fits in one byte
+MAX_BLOCK_RECORDS = 255
+
+# Largest encoded record: a 32-bit timestamp delta in 5 varint bytes, a 17-bit zigzag value delta in 3 bytes each
+_MAX_TIMESTAMP_SIZE = 5
+_MAX_VALUE_SIZE = 3
+
+# Size of a 16-bit value of a raw first record
+_RAW_VALUE_SIZE = 2
+
+
+def _write_varint(buffer, offset, value):
+    """Write an unsigned varint, 7 bits per byte from the least significant, and return the offset after it."""
+    while value >= 0x80:
+        buffer[offset] = (value & 0x7F) | 0x80
+        value >>= 7
+        offset += 1
+    buffer[offset] = value
+    return offset + 1
+
+
+class HistoryEncoder:
+    """
+    Encodes history records into self-contained blocks, each small enough for one notification.
+
+    Block layout:
+    - version (uint8): CODEC_VERSION, or'ed with RAW_FIRST_RECORD if the first record is raw.
+    - count (uint8): number of records in the block.
+    - timestamp (uint32, little-endian): timestamp of the first record.
+    - the first record: each channel value, zigzag varint, or raw if that does not fit in the block: each channel
+      value, 16-bit little-endian, signed or unsigned as its channel.
+    - every other record: the timestamp delta, varint, then each channel delta, zigzag varint.
+
+    Consecutive readings are close, so most deltas take one byte, against two per value and four per timestamp in
+    the raw records. A record that does not fit in the block starts the next block, where it always fits: the first
+    record is written raw, two bytes per value, if its varints take more room, e.g. three bytes per invalid marker.
+    The buffer is allocated once, with room for the largest record past the block size, so nothing is allocated per
+    record.
+
+    Attributes:
+        block_size (int): the largest block in bytes.
+    """
+
+    def __init__(self, n_channels, block_size):
+        """
+        Args:
+            n_channels (int): the number of channels of the history.
+            block_size (int): the largest block in bytes, e.g. the notification payload.
+
+        Raises:
+            ValueError: if the block size is too small for the header and a raw record.
+        """
+        if BLOCK_HEADER_SIZE + _RAW_VALUE_SIZE * n_channels > block_size:
+            raise ValueError(f"Blocks of {block_size} bytes cannot hold a record of {n_channels} channels")
+        self.block_size = block_size
+        self._max_record_size = _MAX_TIMESTAMP_SIZE + _MAX_VALUE_SIZE * n_channels
+        self._buffer = bytearray(BLOCK_HEADER_SIZE + max(block_size, self._max_record_size) + self._max_record_size)
+        self._view = memoryview(self._buffer)
+        self._previous = array("l", [0] * n_channels)
+        self._values = array("l", [0] * n_channels) # values of the record being encoded
+
+
+    def encode(self, history, indices):
+        """
+        Encode records of a history into blocks.
+
+        Args:
+            history (History): the history of the records.
+            indices (Iterable[int]): the physical indices of the records, in time order, e.g. `history.since(start)`.
+
+        Yields:
+            memoryview: each block, at most `block_size` bytes. Valid until the next block is requested.
+        """
+        return self._encode(self._history_values(history, indices))
+
+
+    def encode_records(self, history, records):
+        """
+        Encode packed records into blocks, e.g. read back from flash.
+
+        Args:
+            history (History): the history that packed the records with `pack_record()`.
+            records (Iterable[bytearray]): the packed records, in time order.
+
+        Yields:
+            memoryview: each block, as `encode()`.
+        """
+        return self._encode(self._record_values(history, records))
+
+
+    def _history_values(self, history, indices):
+        """Load the values of each record of a history, and yield its timestamp."""
+        timestamps = history.timestamps
+        columns = [history.columns[name] for name in history.channels]
+        values = self._values
+        for index in indices:
+            for i in range(len(columns)):
+                values[i] = columns[i][index]
+            yield timestamps[index]
+
+
+    def _record_values(self, history, records):
+        """Load the values of each packed record, and yield its timestamp."""
+        values = self._values
+        for record in records:
+            yield history.unpack_record(record, 0, values)
+
+
+    def _encode(self, timestamps):
+        """Encode the records of a source that loads the values of each record and yields its timestamp."""
+        offset = 0
+        count = 0
+        previous_timestamp = 0
+        for timestamp in timestamps:
+            if count == MAX_BLOCK_RECORDS:
+                self._buffer[1] = count
+                yield self._view[:offset]
+                count = 0
+
+            if count == 0:
+                offset = self._start_block(timestamp)
+            else:
+                start = offset
+                offset = _write_varint(self._buffer, offset, timestamp - previous_timestamp)
+                offset = self._write_values(offset)
+                if offset > self.block_size:
+                    # the record does not fit, send the block without it and start the next one with it
+                    self._buffer[1] = count
+                    yield self._view[:start]
+                    count = 0
+                    offset = self._start_block(timestamp)
+
+            previous_timestamp = timestamp
+            count += 1
+
+        if count > 0:
+            self._buffer[1] = count
+            yield self._view[:offset]
+
+
+    def _start_block(self, timestamp):
+        """Write the block header and the first record, raw if it does not fit, and return the offset after it."""
+        buffer = self._buffer
+        buffer[0] = CODEC_VERSION
+        buffer[2] = timestamp & 0xFF
+        buffer[3] = (timestamp >> 8) & 0xFF
+        buffer[4] = (timestamp >> 16) & 0xFF
+        buffer[5] = (timestamp >> 24) & 0xFF
+        previous = self._previous
+        for i in range(len(previous)):
+            previous[i] = 0
+        offset = self._write_values(BLOCK_HEADER_SIZE)
+        if offset <= self.block_size:
+            return offset
+
+        buffer[0] = CODEC_VERSION | RAW_FIRST_RECORD
+        offset = BLOCK_HEADER_SIZE
+        for value in self._values:
+            buffer[offset] = value & 0xFF
+            buffer[offset + 1] = (value >> 8) & 0xFF
+            offset += _RAW_VALUE_SIZE
+        return offset
+
+
+    def _write_values(self, offset):
+        """Write the zigzag delta of each channel value against the previous record, and return the offset after it."""
+        buffer = self._buffer
+        values = self._values
+        previous = self._previous
+        for i in range(len(values)):
+            value = values[i]
+            delta = value - previous[i]
+            previous[i] = value
+            offset = _write_varint(buffer, offset, (delta << 1) if delta >= 0 else ((-delta) << 1) - 1)
+        return offset
@@ -0,0 +1,207 @@
+import struct
+from array import array
+
+# Mark a missing value in a signed and an unsigned 16-bit column. INVALID_INT16 also marks the fixed-point readings of
+# the sensors and the fields of the extended BLE frame with no valid value.
+INVALID_INT16 = -32768
+INVALID_UINT16 = 0xFFFF
+
+# Unsigned 32-bit on the device and on CPython alike, unlike "L", which is 8 bytes on 64-bit CPython
+TIMESTAMP_TYPECODE = "I"
+_TIMESTAMP_FORMAT = "<" + TIMESTAMP_TYPECODE
+
+# Item sizes of the typecodes with the same size in an array and in a packed record, on the device and on CPython
+_ITEM_SIZES = {
+    "b": 1,
+    "B": 1,
+    "h": 2,
+    "H": 2,
+    "i": 4,
+    "I": 4,
+}
+
+
+class History:
+    """
+    Fixed-capacity ring buffer of readings, stored column by column in `array` objects.
+
+    Every record has a timestamp in seconds and one value per channel. Appending is O(1) and overwrites the oldest
+    record once full. Timestamps are expected to be non-decreasing, so a time window is found with a binary search.
+    Iterating over a window yields physical indices into the columns, so it allocates nothing per record.
+
+    Example:
+        for i in history.since(timestamp):
+            temperature = history.columns["temperature"][i]
+
+    Attributes:
+        capacity (int): the maximum number of records.
+        channels (tuple[str]): the channel names, in the order of the values passed to `append()`.
+        timestamps (array): the timestamp column.
+        columns (dict[str, array]): the value column of each channel.
+        record_size (int): the size of one record packed by `pack_record()`, in bytes.
+    """
+
+    def __init__(self, capacity, channels):
+        """
+        Args:
+            capacity (int): the maximum number of records.
+            channels (Sequence[Tuple[str, str]]): the name and the array typecode of each channel, e.g. ("pm2_5", "H").
+        """
+        self.capacity = capacity
+        self.channels = tuple(name for name, _ in channels)
+        self._typecodes = tuple(typecode for _, typecode in channels)
+        self._formats = tuple("<" + typecode for typecode in self._typecodes)
+        self._item_sizes = tuple(_ITEM_SIZES[typecode] for typecode in self._typecodes)
+        self.record_size = _ITEM_SIZES[TIMESTAMP_TYPECODE] + sum(self._item_sizes)
+
+        self.timestamps = array(TIMESTAMP_TYPECODE, [0] * capacity)
+        self.columns = {}
+        self._columns = []
+        for name, typecode in channels:
+            column = array(typecode, [0] * capacity)
+            self.columns[name] = column
+            self._columns.append(column)
+
+        self._head = 0 # physical index of the oldest record
+        self._length = 0
+
+
+    def __len__(self):
+        return self._length
+
+
+    def append(self, timestamp, values):
+        """
+        Append a record, overwriting the oldest one if full.
+
+        Args:
+            timestamp (int): the timestamp in seconds. Must not be earlier than the latest record.
+            values (Sequence[int]): one value per channel, in channel order.
+        """
+        if self._length < self.capacity:
+            index = self._head + self._length
+            if index >= self.capacity:
+                index -= self.capacity
+            self._length += 1
+        else:
+            index = self._head
+            self._head += 1
+            if self._head == self.capacity:
+                self._head = 0
+
+        self.timestamps[index] = timestamp
+        columns = self._columns
+        for i in range(len(columns)):
+            columns[i][index] = values[i]
+
+
+    def clear(self):
+        """Remove every record."""
+        self._head = 0
+        self._length = 0
+
+
+    def index(self, position):
+        """
+        Get the physical index of a record.
+
+        Args:
+            position (int): the position of the record, 0 being the oldest. Negative positions count from the newest.
+
+        Returns:
+            int: the index into `timestamps` and the columns.
+        """
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError("history position out of range")
+        index = self._head + position
+        if index >= self.capacity:
+            index -= self.capacity
+        return index
+
+
+    def since(self, start, end=None):
+        """
+        Iterate over the records in a time window, from the oldest to the newest.
+
+        Args:
+            start (int): the earliest timestamp to include.
+            end (Optional[int]): the latest timestamp to include. None for no upper bound.
+
+        Yields:
+            int: the physical index of each record.
+        """
+        capacity = self.capacity
+        timestamps = self.timestamps
+        index = self._head + self._bisect(start)
+        last = self._head + self._length
+        while index < last:
+            physical = index - capacity if index >= capacity else index
+            if end is not None and timestamps[physical] > end:
+                return
+            yield physical
+            index += 1
+
+
+    def pack_record(self, index, buffer, offset):
+        """
+        Pack a record little-endian into a buffer: the timestamp, then one value per channel in channel order.
+
+        Args:
+            index (int): the physical index of the record.
+            buffer (bytearray): the buffer, with at least `record_size` bytes from `offset`.
+            offset (int): where to pack the record in the buffer.
+        """
+        struct.pack_into(_TIMESTAMP_FORMAT, buffer, offset, self.timestamps[index])
+        offset += _ITEM_SIZES[TIMESTAMP_TYPECODE]
+        columns = self._columns
+        for i in range(len(columns)):
+            struct.pack_into(self._formats[i], buffer, offset, columns[i][index])
+            offset += self._item_sizes[i]
+
+
+    def unpack_record(self, buffer, offset, values):
+        """
+        Unpack a record packed by `pack_record()`.
+
+        Args:
+            buffer (bytearray): the buffer, with at least `record_size` bytes from `offset`.
+            offset (int): where the record is in the buffer.
+            values (list[int]): filled with one value per channel, in channel order.
+
+        Returns:
+            int: the timestamp of the record.
+        """
+        timestamp = struct.unpack_from(_TIMESTAMP_FORMAT, buffer, offset)[0]
+        offset += _ITEM_SIZES[TIMESTAMP_TYPECODE]
+        for i in range(len(self._columns)):
+            values[i] = struct.unpack_from(self._formats[i], buffer, offset)[0]
+            offset += self._item_sizes[i]
+        return timestamp
+
+
+    def memory_usage(self):
+        """
+        Get the memory used by the columns.
+
+        Returns:
+            int: the size of the columns in bytes.
+        """
+        size = self.capacity * _ITEM_SIZES[TIMESTAMP_TYPECODE]
+        for typecode in self._typecodes:
+            size += self.capacity * _ITEM_SIZES[typecode]
+        return size
+
+
+    def _bisect(self, timestamp):
+        """Find the position of the first record with a timestamp not earlier than `timestamp`."""
+        low = 0
+        high = self._length
+        while low < high:
+            middle = (low + high) >> 1
+            if self.timestamps[self.index(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
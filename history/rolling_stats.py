@@ -0,0 +1,162 @@
+from array import array
+
+
+class RollingStats:
+    """
+    Incremental statistics over the latest `window` values of one channel, plus an exponential moving average.
+
+    Every update is O(1): the mean and variance use Welford's algorithm, adding the new value and removing the one
+    leaving the window, and the minimum and maximum are kept with monotonic queues of fixed capacity. All buffers are
+    allocated once on construction.
+
+    Attributes:
+        window (int): the number of values in the window.
+        ema_window (int): the span of the exponential moving average, in values. Its smoothing factor is 2 / (span + 1).
+    """
+
+    def __init__(self, window, ema_window=None):
+        self.window = window
+        self.ema_window = window if ema_window is None else ema_window
+        self._alpha = 2 / (self.ema_window + 1)
+
+        self._values = array("f", [0.0] * window)
+
+        # monotonic queues of sequence numbers, as ring buffers
+        self._min_queue = array("l", [0] * window)
+        self._max_queue = array("l", [0] * window)
+
+        self.reset()
+
+
+    def reset(self):
+        """Forget every value."""
+        self._sequence = 0
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._ema = None
+        self._min_head = 0
+        self._min_length = 0
+        self._max_head = 0
+        self._max_length = 0
+
+
+    def add(self, value):
+        """
+        Add a value, removing the oldest one if the window is full.
+
+        Args:
+            value (float): the new value.
+        """
+        window = self.window
+        slot = self._sequence % window
+
+        # Welford: remove the value leaving the window, then add the new one
+        if self._count == window:
+            old = self._values[slot]
+            if self._count == 1:
+                self._count = 0
+                self._mean = 0.0
+                self._m2 = 0.0
+            else:
+                self._count -= 1
+                delta = old - self._mean
+                self._mean -= delta / self._count
+                self._m2 -= delta * (old - self._mean)
+        # add the value as stored, so the same value is removed later and the rounding errors do not accumulate
+        self._values[slot] = value
+        value = self._values[slot]
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+
+        self._min_head, self._min_length = self._push(self._min_queue, self._min_head, self._min_length, value, True)
+        self._max_head, self._max_length = self._push(self._max_queue, self._max_head, self._max_length, value, False)
+
+        if self._ema is None:
+            self._ema = value
+        else:
+            self._ema += self._alpha * (value - self._ema)
+
+        self._sequence += 1
+
+
+    def count(self):
+        """Number of values in the window."""
+        return self._count
+
+
+    def mean(self):
+        """Mean of the window. None if empty."""
+        return self._mean if self._count > 0 else None
+
+
+    def variance(self):
+        """Sample variance of the window. None if fewer than two values."""
+        if self._count < 2:
+            return None
+        return max(self._m2, 0.0) / (self._count - 1)
+
+
+    def min(self):
+        """Minimum of the window. None if empty."""
+        if self._min_length == 0:
+            return None
+        return self._values[self._min_queue[self._min_head] % self.window]
+
+
+    def max(self):
+        """Maximum of the window. None if empty."""
+        if self._max_length == 0:
+            return None
+        return self._values[self._max_queue[self._max_head] % self.window]
+
+
+    def ema(self):
+        """Exponential moving average of every value so far. None if no values yet."""
+        return self._ema
+
+
+    def get_summary(self):
+        """
+        Get every statistic.
+
+        Returns:
+            dict: "count", "mean", "min", "max", "variance" and "ema".
+        """
+        return {
+            "count": self.count(),
+            "mean": self.mean(),
+            "min": self.min(),
+            "max": self.max(),
+            "variance": self.variance(),
+            "ema": self.ema()
+        }
+
+
+    def _push(self, queue, head, length, value, is_min):
+        """
+        Push the current sequence number into a monotonic queue and drop the entries that left the window.
+
+        Returns:
+            Tuple[int, int]: the new head and length of the queue.
+        """
+        window = self.window
+        values = self._values
+        sequence = self._sequence
+
+        # drop the entries from the back that can no longer be the extreme
+        while length > 0:
+            back = values[queue[(head + length - 1) % window] % window]
+            if (is_min and back < value) or (not is_min and back > value):
+                break
+            length -= 1
+
+        # drop the entry from the front that left the window
+        if length > 0 and queue[head] <= sequence - window:
+            head = (head + 1) % window
+            length -= 1
+
+        queue[(head + length) % window] = sequence
+        return head, length + 1
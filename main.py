@@ -4,7 +4,7 @@ from ble_wrapper import BLEWrapper, BLECommands
 from state import Context, AdvertiseState
 
 from time import sleep
-from machine import Pin
+from hal import Pin
 
 led = Pin('LED', Pin.OUT) 
 
@@ -0,0 +1,134 @@
+FRAME_LENGTH = 32
+START_CHARACTER_1 = 0x42
+START_CHARACTER_2 = 0x4D
+
+# Frame length field, which counts the bytes after itself (13 data words + checksum)
+FRAME_LENGTH_FIELD = FRAME_LENGTH - 4
+
+# Ring buffer size. Must be a power of two so indices can be wrapped with a mask.
+BUFFER_SIZE = 64
+_MASK = BUFFER_SIZE - 1
+
+
+class FrameParser:
+    """
+    Incremental parser for the PMS7003 32-byte data frame.
+
+    Bytes are read from the UART into a fixed ring buffer, which is scanned for the
+    0x42 0x4D start characters. A candidate frame is accepted only if its frame length
+    field and checksum are valid, otherwise the parser drops a single byte and rescans,
+    so it realigns on the next frame after a partial or corrupted read.
+
+    All buffers are allocated once on construction. A valid frame is copied into
+    `self.frame`, which is overwritten by the next call to `next_frame()`.
+
+    Attributes:
+        frame (bytearray): the latest valid frame.
+        frames_parsed (int): number of valid frames found.
+        bytes_dropped (int): number of bytes skipped while resynchronizing.
+    """
+
+    def __init__(self):
+        self._ring = bytearray(BUFFER_SIZE)
+        self._scratch = bytearray(BUFFER_SIZE)
+        self._head = 0
+        self._count = 0
+
+        self.frame = bytearray(FRAME_LENGTH)
+        self.frames_parsed = 0
+        self.bytes_dropped = 0
+
+
+    def read_from(self, uart):
+        """
+        Move the bytes waiting in the UART into the ring buffer, without blocking.
+
+        Args:
+            uart (machine.UART): the UART to read from.
+
+        Returns:
+            int: the number of bytes read.
+        """
+        n_bytes = min(uart.any(), BUFFER_SIZE - self._count)
+        if n_bytes <= 0:
+            return 0
+
+        n_bytes = uart.readinto(self._scratch, n_bytes)
+        if n_bytes is None: # timeout
+            return 0
+
+        ring = self._ring
+        scratch = self._scratch
+        tail = self._head + self._count
+        for i in range(n_bytes):
+            ring[(tail + i) & _MASK] = scratch[i]
+        self._count += n_bytes
+
+        return n_bytes
+
+
+    def next_frame(self):
+        """
+        Scan the buffered bytes for the next valid frame and copy it into `self.frame`.
+
+        Returns:
+            bool: True if a valid frame was found, False if more bytes are needed.
+        """
+        while self._count >= 2:
+            if self._peek(0) != START_CHARACTER_1 or self._peek(1) != START_CHARACTER_2:
+                self._skip()
+                continue
+
+            if self._count < FRAME_LENGTH:
+                return False
+
+            if self._peek_word(2) != FRAME_LENGTH_FIELD or self._peek_word(FRAME_LENGTH - 2) != self._checksum():
+                self._skip()
+                continue
+
+            frame = self.frame
+            for i in range(FRAME_LENGTH):
+                frame[i] = self._peek(i)
+            self._consume(FRAME_LENGTH)
+            self.frames_parsed += 1
+            return True
+
+        # a lone byte can only be kept if it may start the next frame
+        if self._count == 1 and self._peek(0) != START_CHARACTER_1:
+            self._skip()
+
+        return False
+
+
+    def reset(self):
+        """Discard all buffered bytes."""
+        self.bytes_dropped += self._count
+        self._head = 0
+        self._count = 0
+
+
+    def _peek(self, index):
+        return self._ring[(self._head + index) & _MASK]
+
+
+    def _peek_word(self, index):
+        return (self._peek(index) << 8) | self._peek(index + 1)
+
+
+    def _checksum(self):
+        ring = self._ring
+        head = self._head
+        checksum = 0
+        for i in range(FRAME_LENGTH - 2):
+            checksum += ring[(head + i) & _MASK]
+        return checksum & 0xFFFF
+
+
+    def _skip(self):
+        self._consume(1)
+        self.bytes_dropped += 1
+
+
+    def _consume(self, n_bytes):
+        self._head = (self._head + n_bytes) & _MASK
+        self._count -= n_bytes
@@ -1,10 +1,9 @@
-import time
-import asyncio
-import logging
+from clock import system_clock
+from hal import UART, Pin
+from sensor_driver import SensorDriver, DEFAULT_MEDIAN_SIZE
 
-from machine import UART, Pin
-
-from .utilities import get_logger, config_logger
+from .frame_parser import FrameParser
+from .utilities import get_logger, NAME
 
 # Time to wait for the first character
 TIMEOUT = 50
@@ -14,53 +13,51 @@ TIMEOUT_CHAR = 50
 
 DEFAULT_INTERVAL = 1.0 # once every 1 second
 
+# Size of the receive FIFO. The sensor sends a 32-byte frame every 200-800ms in active mode, and the scheduler drains
+# the UART once per sampling epoch, so it holds the 25 frames of a 5 second epoch at the fastest rate.
+RX_BUFFER_SIZE = 1024
+
+# Reset the sensor if no valid frame is received within this time
+NO_DATA_TIMEOUT_MS = 1500
+
+# Channels that can be despiked with a median filter, the atmospheric concentrations
+FILTER_CHANNELS = ("pm1", "pm2_5", "pm10")
+
+# Deviation from the median above which a concentration counts as rejected, in µg/m³
+REJECT_THRESHOLD = 10
+
 # TODO: explicitly set to active mode
 ACTIVE_MODE_COMMAND = b''
 
 
-class PMS7003:
-    def __init__(self, uart=1, tx_pin=8, rx_pin=9, interval=DEFAULT_INTERVAL, debug=False) -> None:
+class PMS7003(SensorDriver):
+    """
+    Driver for the PMS7003 particulate matter sensor in "active mode", in which the sensor sends value periodically.
+
+    The atmospheric concentrations go through a median filter of `median_size` frames, removing the spikes of single
+    corrupted frames and warm-up transients. The filterable channels are "pm1", "pm2_5" and "pm10".
+    """
+
+    def __init__(self, uart=1, tx_pin=8, rx_pin=9, interval=DEFAULT_INTERVAL, median_size=DEFAULT_MEDIAN_SIZE, bus=None, debug=False) -> None:
+        """
+        Args:
+            bus (Optional[UART]): the UART of the sensor, e.g. a fake from hal. None to open the `uart` port on the pins.
+        """
 
         self.uart_port = uart
         self.tx_pin = tx_pin
         self.rx_pin = rx_pin
-        self.uart = UART(uart, tx=Pin(tx_pin), rx=Pin(rx_pin), baudrate=9600, bits=8, stop=1, parity=None, timeout=TIMEOUT, timeout_char=TIMEOUT_CHAR)
-
-        self._data = {
-            "concentration_cf1": {
-                "pm1": -1,
-                "pm2_5": -1,
-                "pm10": -1
-            },
-            "concentration_atm": {
-                "pm1": -1,
-                "pm2_5": -1,
-                "pm10": -1
-            },
-            "n_particles": {
-                "0_3um": -1,
-                "0_5um": -1,
-                "1um": -1,
-                "2_5um": -1,
-                "5um": -1,
-                "10um": -1,
-            },
-            "timestamp": time.ticks_ms()
-        }
-
-        # Config the logger
-        if debug:
-            config_logger(log_level=logging.DEBUG)
+        if bus is not None:
+            self.uart = bus
         else:
-            config_logger(log_level=logging.ERROR)
+            self.uart = UART(uart, tx=Pin(tx_pin), rx=Pin(rx_pin), baudrate=9600, bits=8, stop=1, parity=None, timeout=TIMEOUT, timeout_char=TIMEOUT_CHAR, rxbuf=RX_BUFFER_SIZE)
 
-        # Events
-        self._destroy_signal = asyncio.Event()
-        self._pause_signal = asyncio.Event()
-        self._resume_signal = asyncio.Event()
+        # Frame parser with a preallocated buffer
+        self._parser = FrameParser()
 
-        # Coroutine tasks
-        self._data_update_task = None
+        super().__init__(NAME, interval=interval, no_data_timeout_ms=NO_DATA_TIMEOUT_MS, streaming=True,
+                         filtered_channels=FILTER_CHANNELS, median_size=median_size,
+                         reject_threshold=REJECT_THRESHOLD, debug=debug)
 
 
     # *** PUBLIC GETTERS ***
@@ -86,77 +83,19 @@ class PMS7003:
                 "2_5um" (int): beyond 2.5um
                 "5um" (int): beyond 5um
                 "10um" (int): beyond 10um
-        - "timestamp" (int): timestamp of the latest reading. Acquired by time.tick_ms().
+        - "timestamp" (int): milliseconds since boot of the latest reading, from the system clock.
 
         Returns
             dict: The data dict.
         """
-        return self._data.copy()
+        data = self._data.copy()
+        data["concentration_cf1"] = self._data["concentration_cf1"].copy()
+        data["concentration_atm"] = self._data["concentration_atm"].copy()
+        data["n_particles"] = self._data["n_particles"].copy()
+        return data
     
 
-    # *** PUBLIC LIFECYCLE METHODS ***
-
-
-    async def start(self):
-        """
-        Start the sensor in "active mode", in which the sensor sends value periodically.
-        """
-
-        # TODO: can we read slower? will the data pile up?
-        
-        # TODO: now we skip init since default is active mode.
-        # Initialize the sensor
-        # if not await self._init_sensor():
-        #     return False
-        
-        # Start the task
-        self._data_update_task = asyncio.create_task(self._data_update_service())
-        
-        return True
-
-
-    def pause(self):
-        """Pause data collection."""
-        get_logger().info("Pausing data collection...")
-        self._pause_signal.set()
-
-
-    def resume(self):
-        """Resume data collection."""
-        get_logger().info("Resuming data collection...")
-        self._pause_signal.clear()
-        self._resume_signal.set()
-
-
-    async def destroy(self):
-        """
-        Destroy this class instance and freeing up resources.
-        """
-
-        # Send a destroy signal
-        get_logger().info("Sending destroy signal...")
-        self._destroy_signal.set()
-
-        # Wait for tasks to finish
-        try:
-            if isinstance(self._data_update_task, asyncio.Task):
-                await asyncio.wait_for(self._data_update_task, timeout=10)
-
-        except asyncio.TimeoutError:
-            get_logger().warning("Destroy signal timed out, sending task cancel signal...")
-            
-            # cancel the tasks
-
-            if isinstance(self._data_update_task, asyncio.Task):
-                self._data_update_task.cancel()
-            
-            # wait for the tasks to be cancelled
-
-            if isinstance(self._data_update_task, asyncio.Task):
-                await asyncio.wait_for(self._data_update_task, timeout=10)
-
-
-    # *** PRIVATE METHODS ***
+    # *** SENSOR DRIVER HOOKS ***
 
 
     async def _init_sensor(self):
@@ -164,7 +103,14 @@ class PMS7003:
         Initialize the sensor by explicitly setting to "active mode" with the command.
         """
 
+        # Drop any partial frame left from before
+        if self.uart.any() > 0:
+            self.uart.read()  # Clear buffer
+        self._parser.reset()
+
         # TODO: explicitly set to active mode. Right now we're relying on the default being the active mode.
+        if len(ACTIVE_MODE_COMMAND) == 0:
+            return True
 
         get_logger().info("Initializing...")
         bytes = self.uart.write(ACTIVE_MODE_COMMAND)
@@ -178,95 +124,46 @@ class PMS7003:
         return True
 
     
-    async def _data_update_service(self):
-        
-        try:
-            while not self._destroy_signal.is_set():
-
-                if self._pause_signal.is_set():
-                    get_logger().info("Data collection paused. Waiting to resume...")
-                    await self._resume_signal.wait()
-                    self._resume_signal.clear()
-
-                get_logger().info(f"starting a data cycle at timestamp {time.ticks_ms()}...")
-
-                nRetries = 5
-                while self.uart.any() < 32 and nRetries > 0:
-                    await asyncio.sleep(0.3)
-                    nRetries -= 1
-                    get_logger().debug(f"Retrying... Remaining retries: {nRetries}")
-                    if nRetries == 0:
-                        if self.uart.any() > 0:
-                            self.uart.read()  # Clear buffer
-                        await self._init_sensor() # reset the sensor
-                        self._data = self._invalid_data()
-                        get_logger().debug(f"Resetting...")
-
-                # Read data
-                raw_data = self.uart.read()
-
-                if raw_data is None: # timeout
-                    await asyncio.sleep(1)
-                    continue # skip this data
-
-                get_logger().info(f"Received {len(raw_data)} bytes from sensor")
-                if len(raw_data) < 32:
-                    get_logger().warning(f"too short")
-                    # TODO: realign data
-                    continue
-
-                # Validation: checksum
-                checksum = self._caclulate_checksum(raw_data)
-                if checksum != (raw_data[30] << 8) | raw_data[31]:
-                    get_logger().warning(f"invalid checksum, skipping frame (should be {checksum} but received {raw_data[8]})")
-                    continue
-
-                # Parse data
-                try:
-                    self._data = self._parse_data(raw_data)
-                    self._data["timestamp"] = time.ticks_ms()
-                    get_logger().info(f"Parsed result: {self._data}")
-                except ValueError as e:
-                    get_logger().error(f"Invalid data, clearing buffer")
-                    self._data = self._parse_data(raw_data)
-                    if self.uart.any() > 0:
-                        self.uart.read()  # Clear buffer
-                    await self._init_sensor() # reset the sensor\
-
-            get_logger().info("data update service stopped via destroy signal")
-        except asyncio.CancelledError:
-            get_logger().info("data update service cancelled")
+    async def _acquire(self):
+        """
+        Move the received bytes into the frame parser and get the next valid frame.
+
+        Returns:
+            bytearray: the frame, or None if no complete frame yet.
+        """
+        while not self._parser.next_frame():
+            n_bytes = self._parser.read_from(self.uart)
+            if n_bytes == 0:
+                return None
+            get_logger().debug("Received %d bytes from sensor", n_bytes)
+
+        return self._parser.frame
 
 
     def _parse_data(self, data):
-        # Start characters validation
-        if data[0] != 0x42 or data[1] != 0x4d:
-            raise ValueError("Invalid start characters")
-        
-        # Frame length (2 bytes, skip for now)
-        frame_length = (data[2] << 8) | data[3]
+        """
+        Parse a validated frame into the data dict in place.
 
-        return {
-            "concentration_cf1": {
-                "pm1": (data[4] << 8) | data[5],
-                "pm2_5": (data[6] << 8) | data[7],
-                "pm10": (data[8] << 8) | data[9]
-            },
-            "concentration_atm": {
-                "pm1": (data[10] << 8) | data[11],
-                "pm2_5": (data[12] << 8) | data[13],
-                "pm10": (data[14] << 8) | data[15]
-            },
-            "n_particles": {
-                "0_3um": (data[16] << 8) | data[17],
-                "0_5um": (data[18] << 8) | data[19],
-                "1um": (data[20] << 8) | data[21],
-                "2_5um": (data[22] << 8) | data[23],
-                "5um": (data[24] << 8) | data[25],
-                "10um": (data[26] << 8) | data[27],
-            },
-            "timestamp": time.ticks_ms()
-        }
+        Args:
+            data (bytearray): a 32-byte frame, validated by the frame parser.
+        """
+        concentration_cf1 = self._data["concentration_cf1"]
+        concentration_cf1["pm1"] = (data[4] << 8) | data[5]
+        concentration_cf1["pm2_5"] = (data[6] << 8) | data[7]
+        concentration_cf1["pm10"] = (data[8] << 8) | data[9]
+
+        concentration_atm = self._data["concentration_atm"]
+        concentration_atm["pm1"] = self._filter("pm1", (data[10] << 8) | data[11])
+        concentration_atm["pm2_5"] = self._filter("pm2_5", (data[12] << 8) | data[13])
+        concentration_atm["pm10"] = self._filter("pm10", (data[14] << 8) | data[15])
+
+        n_particles = self._data["n_particles"]
+        n_particles["0_3um"] = (data[16] << 8) | data[17]
+        n_particles["0_5um"] = (data[18] << 8) | data[19]
+        n_particles["1um"] = (data[20] << 8) | data[21]
+        n_particles["2_5um"] = (data[22] << 8) | data[23]
+        n_particles["5um"] = (data[24] << 8) | data[25]
+        n_particles["10um"] = (data[26] << 8) | data[27]
 
     
     def _invalid_data(self):
@@ -289,9 +186,5 @@ class PMS7003:
                 "5um": -1,
                 "10um": -1,
             },
-            "timestamp": time.ticks_ms()
+            "timestamp": system_clock.uptime_ms()
         }
-    
-
-    def _caclulate_checksum(self, data):
-        return sum(data[:-2]) & 0xFFFF
\ No newline at end of file
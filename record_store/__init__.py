@@ -0,0 +1,5 @@
+# Import the RecordStore class to make it accessible from the module level
+from .record_store import RecordStore
+
+# Define what should be available when the module is imported
+__all__ = ["RecordStore"]
\ No newline at end of file
@@ -0,0 +1,568 @@
+import os
+from array import array
+
+from .utilities import get_logger
+
+# Segment files are named by their sequence number, e.g. "seg_00000012.bin"
+SEGMENT_PREFIX = "seg_"
+SEGMENT_SUFFIX = ".bin"
+INDEX_SUFFIX = ".idx"
+TEMP_FILE_NAME = "recover.tmp"
+
+DEFAULT_SEGMENT_RECORDS = 512
+DEFAULT_MAX_SEGMENTS = 16
+DEFAULT_BATCH_RECORDS = 12 # one flash write per minute at a 5 second interval
+DEFAULT_INDEX_INTERVAL = 32 # one indexed timestamp every 32 records
+
+# Records read from flash at a time when iterating
+READ_CHUNK_RECORDS = 32
+
+# Initial value of the check byte, so an all-zero record is invalid
+CHECK_SEED = 0xA5
+
+# Layout of a segment index: the number of records, the last timestamp, then the timestamp of every
+# `index_interval`-th record from the first
+_INDEX_COUNT = 0
+_INDEX_LAST = 1
+_INDEX_SPARSE = 2
+
+
+def check_byte(buffer, offset, length):
+    """
+    Calculate the check byte of a record: a rotate-and-xor over its bytes.
+
+    Args:
+        buffer (bytearray): the buffer holding the record.
+        offset (int): the start of the record in the buffer.
+        length (int): the size of the record, without the check byte.
+
+    Returns:
+        int: the check byte.
+    """
+    check = CHECK_SEED
+    for i in range(offset, offset + length):
+        check = (((check << 1) | (check >> 7)) & 0xFF) ^ buffer[i]
+    return check
+
+
+def _timestamp(buffer, offset):
+    """Read the uint32 little-endian timestamp at the start of a record."""
+    return buffer[offset] | (buffer[offset + 1] << 8) | (buffer[offset + 2] << 16) | (buffer[offset + 3] << 24)
+
+
+class RecordStore:
+    """
+    Append-only store of fixed-size binary records on the flash filesystem.
+
+    Records are appended to a RAM batch and written to flash once `batch_records` are pending, so flash is touched once
+    every `batch_records` records. On flash, records are stored in segment files of `segment_records` records each,
+    with a check byte after every record. Once the newest segment is full, a new segment is started, and the oldest
+    segment is removed if there are more than `max_segments`.
+
+    A power loss can only tear the latest batch written to the newest segment. `open()` finds the first record of that
+    batch that fails its check byte and rewrites the segment without it and the records after it. A write error can
+    leave a partial record at the end of the newest segment, which `flush()` cuts off the same way before writing
+    again.
+
+    Attributes:
+        directory (str): the directory of the segment files.
+        record_size (int): the size of one record, in bytes.
+        segment_records (int): the number of records per segment.
+        max_segments (int): the number of segments kept on flash.
+        batch_records (int): the number of records written to flash at once.
+        index_interval (int): the number of records between two indexed timestamps.
+    """
+
+    def __init__(self, directory, record_size, segment_records=DEFAULT_SEGMENT_RECORDS,
+                 max_segments=DEFAULT_MAX_SEGMENTS, batch_records=DEFAULT_BATCH_RECORDS,
+                 index_interval=DEFAULT_INDEX_INTERVAL):
+        self.directory = directory
+        self.record_size = record_size
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.batch_records = batch_records
+        self.index_interval = index_interval
+        self._stride = record_size + 1
+
+        # RAM batch of the pending records, each followed by its check byte
+        self._batch = bytearray(self._stride * batch_records)
+        self._batch_view = memoryview(self._batch)
+        self._pending = 0
+
+        # Buffer of the flash reads
+        self._read_buffer = bytearray(self._stride * max(READ_CHUNK_RECORDS, batch_records))
+        self._read_view = memoryview(self._read_buffer)
+
+        self._segments = [] # sequence numbers of the segments on flash, oldest first
+        self._tail_records = 0 # number of records in the newest segment
+        self._tail_torn = False # True if the newest segment may end with a partial record after a write error
+        self._stored_records = 0 # number of records on flash
+        self._index = {} # sparse index of each segment, by sequence number
+
+        self._stats = {
+            "flushes": 0,
+            "bytes_written": 0,
+            "evicted_segments": 0,
+            "recovered_records": 0,
+            "write_errors": 0,
+            "index_rebuilds": 0
+        }
+
+
+    def __len__(self):
+        return self._stored_records + self._pending
+
+
+    # *** PUBLIC GETTERS ***
+
+
+    def get_stats(self):
+        """
+        Get the store statistics.
+
+        Fields:
+        - "segments" (int): number of segments on flash.
+        - "records" (int): number of records, on flash and pending.
+        - "pending" (int): number of records waiting in the RAM batch.
+        - "flushes" (int): number of batches written to flash.
+        - "bytes_written" (int): number of bytes written to flash.
+        - "evicted_segments" (int): number of oldest segments removed to stay under the cap.
+        - "recovered_records" (int): number of torn records dropped when opening the store.
+        - "write_errors" (int): number of batches lost to flash write errors.
+        - "index_rebuilds" (int): number of segment indexes read back from the records when opening the store.
+
+        Returns
+            dict: The statistics dict.
+        """
+        stats = self._stats.copy()
+        stats["segments"] = len(self._segments)
+        stats["records"] = len(self)
+        stats["pending"] = self._pending
+        return stats
+
+
+    def segments(self):
+        """
+        Get the sequence numbers of the segments on flash.
+
+        Returns
+            list[int]: the sequence numbers, oldest first.
+        """
+        return self._segments.copy()
+
+
+    def time_range(self, sequence):
+        """
+        Get the time range of a segment on flash, from its index.
+
+        Args:
+            sequence (int): the sequence number of the segment.
+
+        Returns
+            Optional[tuple[int, int]]: the first and the last timestamp, None if the segment is empty.
+        """
+        index = self._index[sequence]
+        if index[_INDEX_COUNT] == 0:
+            return None
+        return index[_INDEX_SPARSE], index[_INDEX_LAST]
+
+
+    def last_timestamp(self):
+        """
+        Get the timestamp of the newest record.
+
+        Returns
+            Optional[int]: the timestamp, None if the store is empty.
+        """
+        if self._pending > 0:
+            return _timestamp(self._batch, (self._pending - 1) * self._stride)
+        for sequence in reversed(self._segments):
+            index = self._index[sequence]
+            if index[_INDEX_COUNT] > 0:
+                return index[_INDEX_LAST]
+        return None
+
+
+    # *** PUBLIC METHODS ***
+
+
+    def open(self):
+        """
+        Find the segments on flash, recover the newest one after a power loss and load the segment indexes. Call once
+        before using the store.
+
+        Returns:
+            int: the number of torn records dropped.
+        """
+        try:
+            os.mkdir(self.directory)
+        except OSError:
+            pass # already exists
+
+        self._segments = []
+        indexes = []
+        names = os.listdir(self.directory)
+        for name in names:
+            if name == TEMP_FILE_NAME:
+                os.remove(self._path(name))
+            elif name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                self._segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+            elif name.startswith(SEGMENT_PREFIX) and name.endswith(INDEX_SUFFIX):
+                indexes.append(int(name[len(SEGMENT_PREFIX):-len(INDEX_SUFFIX)]))
+        self._segments.sort()
+
+        # an index left over by an evicted segment
+        for sequence in indexes:
+            if sequence not in self._segments:
+                os.remove(self._index_path(sequence))
+
+        # the older segments were complete when the next one was started, and saved their index
+        self._stored_records = 0
+        self._index = {}
+        for sequence in self._segments[:-1]:
+            n_records = self._file_size(self._segment_path(sequence)) // self._stride
+            self._stored_records += n_records
+            if not self._load_index(sequence, n_records):
+                self._build_index(sequence, n_records)
+                self._save_index(sequence)
+
+        dropped = self._recover_tail() if self._segments else 0
+        self._tail_records = self._file_size(self._segment_path(self._segments[-1])) // self._stride \
+            if self._segments else 0
+        self._stored_records += self._tail_records
+        self._stats["recovered_records"] += dropped
+        if self._segments:
+            self._build_index(self._segments[-1], self._tail_records)
+
+        get_logger().info(f"Opened {len(self._segments)} segments, {self._stored_records} records, {dropped} dropped")
+        return dropped
+
+
+    def append(self, record):
+        """
+        Append a record. Written to flash with the next full batch.
+
+        Args:
+            record (bytearray): the record, `record_size` bytes.
+        """
+        offset = self._pending * self._stride
+        self._batch_view[offset:offset + self.record_size] = record
+        self._batch[offset + self.record_size] = check_byte(self._batch, offset, self.record_size)
+        self._pending += 1
+        if self._pending == self.batch_records:
+            self.flush()
+
+
+    def flush(self):
+        """
+        Write the pending records to flash, starting new segments and evicting the oldest ones as needed.
+
+        On a write error, the rest of the batch is lost and the newest segment is cut back to its last whole record, so
+        the next batch is written aligned. If that fails too, it is retried before the next batch is written.
+
+        Returns:
+            bool: True if successful, False if the batch was lost to a write error.
+        """
+        pending = self._pending
+        if pending == 0:
+            return True
+        self._pending = 0
+
+        written = 0
+        try:
+            if self._tail_torn:
+                self._truncate_tail()
+            while written < pending:
+                if not self._segments or self._tail_records == self.segment_records:
+                    self._rotate()
+                n_records = min(pending - written, self.segment_records - self._tail_records)
+                with open(self._segment_path(self._segments[-1]), "ab") as file:
+                    file.write(self._batch_view[written * self._stride:(written + n_records) * self._stride])
+                self._index_batch(written, n_records)
+                self._tail_records += n_records
+                self._stored_records += n_records
+                written += n_records
+                self._stats["bytes_written"] += n_records * self._stride
+        except OSError as e:
+            get_logger().error(f"Failed to write {pending - written} records: {e}")
+            self._stats["write_errors"] += 1
+            self._tail_torn = True
+            try:
+                self._truncate_tail()
+            except OSError as e:
+                get_logger().error(f"Failed to cut segment {self._segments[-1]} back to its last record: {e}")
+            return False
+
+        self._stats["flushes"] += 1
+        return True
+
+
+    def records(self):
+        """
+        Iterate over every record, on flash then pending, from the oldest to the newest.
+
+        Appending while iterating may evict the segment being read, so finish iterating first.
+
+        Yields:
+            memoryview: each record, without its check byte. Valid until the next record is requested.
+        """
+        for sequence in self._segments:
+            for record in self.segment_records_of(sequence):
+                yield record
+        for i in range(self._pending):
+            offset = i * self._stride
+            yield self._batch_view[offset:offset + self.record_size]
+
+
+    def since(self, timestamp):
+        """
+        Iterate over the records from a timestamp, on flash then pending, from the oldest to the newest.
+
+        The first segment to read is found by bisecting the last timestamp of the segments, and the first record by
+        bisecting the index of that segment, so no record earlier than `index_interval` records before the first one
+        yielded is read from flash. Appending while iterating may evict the segment being read, so finish iterating
+        first.
+
+        Args:
+            timestamp (int): the earliest timestamp to include.
+
+        Yields:
+            memoryview: each record, without its check byte. Valid until the next record is requested.
+        """
+        segments = self._segments
+        low = 0
+        high = len(segments)
+        while low < high:
+            middle = (low + high) >> 1
+            # only the newest segment can be empty, e.g. after dropping its torn first batch, and has no last
+            # timestamp, so it counts as later than any
+            index = self._index[segments[middle]]
+            if index[_INDEX_COUNT] > 0 and index[_INDEX_LAST] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        for i in range(low, len(segments)):
+            sequence = segments[i]
+            if self._index[sequence][_INDEX_COUNT] == 0:
+                continue
+            start = self._find(sequence, timestamp) if i == low else 0
+            for record in self.segment_records_of(sequence, start):
+                if _timestamp(record, 0) >= timestamp:
+                    yield record
+
+        for i in range(self._pending):
+            offset = i * self._stride
+            if _timestamp(self._batch, offset) >= timestamp:
+                yield self._batch_view[offset:offset + self.record_size]
+
+
+    def segment_records_of(self, sequence, start=0):
+        """
+        Iterate over the records of one segment on flash.
+
+        Args:
+            sequence (int): the sequence number of the segment.
+            start (int): the position of the first record to read in the segment.
+
+        Yields:
+            memoryview: each record, without its check byte. Valid until the next record is requested.
+        """
+        stride = self._stride
+        with open(self._segment_path(sequence), "rb") as file:
+            file.seek(start * stride)
+            while True:
+                n_bytes = file.readinto(self._read_buffer)
+                if not n_bytes:
+                    return
+                for offset in range(0, n_bytes - stride + 1, stride):
+                    yield self._read_view[offset:offset + self.record_size]
+
+
+    # *** PRIVATE METHODS ***
+
+
+    def _path(self, name):
+        return self.directory + "/" + name
+
+
+    def _segment_path(self, sequence):
+        return self._path("%s%08d%s" % (SEGMENT_PREFIX, sequence, SEGMENT_SUFFIX))
+
+
+    def _index_path(self, sequence):
+        return self._path("%s%08d%s" % (SEGMENT_PREFIX, sequence, INDEX_SUFFIX))
+
+
+    def _file_size(self, path):
+        return os.stat(path)[6]
+
+
+    def _rotate(self):
+        """Start a new segment, saving the index of the full one and removing the oldest segments over the cap."""
+        if self._segments:
+            self._save_index(self._segments[-1])
+        sequence = self._segments[-1] + 1 if self._segments else 0
+        self._segments.append(sequence)
+        self._index[sequence] = self._new_index(self.segment_records)
+        self._tail_records = 0
+        while len(self._segments) > self.max_segments:
+            oldest = self._segments.pop(0)
+            path = self._segment_path(oldest)
+            self._stored_records -= self._file_size(path) // self._stride
+            os.remove(path)
+            del self._index[oldest]
+            try:
+                os.remove(self._index_path(oldest))
+            except OSError:
+                pass # never saved, rebuilt from the records
+            self._stats["evicted_segments"] += 1
+            get_logger().info(f"Evicted segment {oldest}")
+
+
+    def _new_index(self, n_records):
+        """Allocate the index of a segment of up to `n_records` records, or of `segment_records` if more."""
+        n_records = max(n_records, self.segment_records)
+        return array("I", [0] * (_INDEX_SPARSE + (n_records + self.index_interval - 1) // self.index_interval))
+
+
+    def _index_batch(self, written, n_records):
+        """Add the records of the batch just written to the newest segment to its index."""
+        index = self._index[self._segments[-1]]
+        interval = self.index_interval
+        stride = self._stride
+        for i in range(n_records):
+            position = self._tail_records + i
+            if position % interval == 0:
+                index[_INDEX_SPARSE + position // interval] = _timestamp(self._batch, (written + i) * stride)
+        index[_INDEX_LAST] = _timestamp(self._batch, (written + n_records - 1) * stride)
+        index[_INDEX_COUNT] = self._tail_records + n_records
+
+
+    def _build_index(self, sequence, n_records):
+        """Index a segment by reading the timestamp of every `index_interval`-th record and of the last one."""
+        index = self._new_index(n_records)
+        index[_INDEX_COUNT] = n_records
+        if n_records > 0:
+            stride = self._stride
+            view = self._read_view[:4]
+            with open(self._segment_path(sequence), "rb") as file:
+                for i in range((n_records + self.index_interval - 1) // self.index_interval):
+                    file.seek(i * self.index_interval * stride)
+                    file.readinto(view)
+                    index[_INDEX_SPARSE + i] = _timestamp(self._read_buffer, 0)
+                file.seek((n_records - 1) * stride)
+                file.readinto(view)
+                index[_INDEX_LAST] = _timestamp(self._read_buffer, 0)
+            self._stats["index_rebuilds"] += 1
+        self._index[sequence] = index
+
+
+    def _load_index(self, sequence, n_records):
+        """
+        Load the saved index of a segment.
+
+        Returns:
+            bool: True if loaded, False if missing or not matching the segment.
+        """
+        index = self._new_index(n_records)
+        path = self._index_path(sequence)
+        try:
+            if self._file_size(path) != len(index) * index.itemsize:
+                return False
+            with open(path, "rb") as file:
+                file.readinto(index)
+        except OSError:
+            return False
+        if index[_INDEX_COUNT] != n_records:
+            return False
+        self._index[sequence] = index
+        return True
+
+
+    def _save_index(self, sequence):
+        """Save the index of a full segment. On failure, the index is rebuilt on the next open."""
+        try:
+            with open(self._index_path(sequence), "wb") as file:
+                file.write(self._index[sequence])
+        except OSError as e:
+            get_logger().warning(f"Failed to save the index of segment {sequence}: {e}")
+
+
+    def _find(self, sequence, timestamp):
+        """Find the position of the indexed record to read a segment from, the last one earlier than `timestamp`."""
+        index = self._index[sequence]
+        low = 0
+        high = (index[_INDEX_COUNT] + self.index_interval - 1) // self.index_interval
+        while low < high:
+            middle = (low + high) >> 1
+            if index[_INDEX_SPARSE + middle] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return max(0, low - 1) * self.index_interval
+
+
+    def _recover_tail(self):
+        """
+        Drop the torn records at the end of the newest segment: a partial record, and the records of the latest batch
+        from the first one failing its check byte.
+
+        Returns:
+            int: the number of records dropped, counting a partial record as one.
+        """
+        stride = self._stride
+        path = self._segment_path(self._segments[-1])
+        size = self._file_size(path)
+        n_records = size // stride
+
+        # only the latest batch can be torn
+        first = max(0, n_records - self.batch_records)
+        valid = n_records
+        with open(path, "rb") as file:
+            file.seek(first * stride)
+            n_bytes = file.readinto(self._read_view[:(n_records - first) * stride]) or 0
+        for i in range(n_bytes // stride):
+            offset = i * stride
+            if self._read_buffer[offset + self.record_size] != check_byte(self._read_buffer, offset, self.record_size):
+                valid = first + i
+                break
+
+        if valid * stride == size:
+            return 0
+
+        self._rewrite(path, valid * stride)
+
+        dropped = n_records - valid + (1 if size % stride else 0)
+        get_logger().warning(f"Recovered segment {self._segments[-1]}, dropped {dropped} torn records")
+        return dropped
+
+
+    def _truncate_tail(self):
+        """Cut the newest segment back to its `_tail_records` whole records after a write error."""
+        if self._segments:
+            path = self._segment_path(self._segments[-1])
+            size = self._tail_records * self._stride
+            try:
+                torn = self._file_size(path) != size
+            except OSError:
+                torn = False # never created
+            if torn:
+                self._rewrite(path, size)
+                get_logger().warning(f"Cut segment {self._segments[-1]} back to {self._tail_records} records")
+        self._tail_torn = False
+
+
+    def _rewrite(self, path, size):
+        """
+        Keep the first `size` bytes of a segment: copy them, then replace the segment by renaming, so a power loss
+        keeps either version. A copy left over is removed on the next open.
+        """
+        temp_path = self._path(TEMP_FILE_NAME)
+        remaining = size
+        with open(path, "rb") as source, open(temp_path, "wb") as target:
+            while remaining > 0:
+                n_bytes = source.readinto(self._read_view[:min(remaining, len(self._read_buffer))])
+                target.write(self._read_view[:n_bytes])
+                remaining -= n_bytes
+        os.rename(temp_path, path)
@@ -0,0 +1,6 @@
+# Import the SensorDriver class to make it accessible from the module level
+from .sensor_driver import SensorDriver
+from .median_filter import MedianFilter, DEFAULT_MEDIAN_SIZE
+
+# Define what should be available when the module is imported
+__all__ = ["SensorDriver", "MedianFilter", "DEFAULT_MEDIAN_SIZE"]
\ No newline at end of file
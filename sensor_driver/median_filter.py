@@ -0,0 +1,82 @@
+from array import array
+
+DEFAULT_MEDIAN_SIZE = 5
+
+# Smallest deviation from the median counted as a rejected value, in the units of the channel. 0 counts every value
+# replaced by a different median.
+DEFAULT_REJECT_THRESHOLD = 0
+
+
+class MedianFilter:
+    """
+    Streaming median of the latest `size` integer values, to remove single-sample spikes.
+
+    The values are kept twice in preallocated arrays: in arrival order, to know which value leaves the window, and
+    in sorted order, updated by insertion. Each update is O(size) and allocates nothing. Until the window is full,
+    the median is taken over the values so far, the lower one of the two middle values if their number is even.
+
+    Attributes:
+        size (int): the number of values in the window.
+        threshold (int): the deviation from the median above which a value counts as rejected, so the noise around a
+            steady reading is not counted.
+        rejected (int): the number of values further than `threshold` from the median.
+    """
+
+    def __init__(self, size=DEFAULT_MEDIAN_SIZE, threshold=DEFAULT_REJECT_THRESHOLD):
+        self.size = size
+        self.threshold = threshold
+        self.rejected = 0
+        self._window = array("l", [0] * size)
+        self._sorted = array("l", [0] * size)
+        self.reset()
+
+
+    def reset(self):
+        """Forget the values in the window, e.g. after a sensor reset. The rejected count is kept."""
+        self._head = 0
+        self._count = 0
+
+
+    def update(self, value):
+        """
+        Add a value and get the median of the window.
+
+        Args:
+            value (int): the new value.
+
+        Returns:
+            int: the median of the window, including the new value.
+        """
+        window = self._window
+        ordered = self._sorted
+        count = self._count
+
+        # remove the oldest value from the sorted values
+        if count == self.size:
+            old = window[self._head]
+            i = 0
+            while ordered[i] != old:
+                i += 1
+            count -= 1
+            while i < count:
+                ordered[i] = ordered[i + 1]
+                i += 1
+
+        window[self._head] = value
+        self._head += 1
+        if self._head == self.size:
+            self._head = 0
+
+        # insert the new value in order
+        i = count
+        while i > 0 and ordered[i - 1] > value:
+            ordered[i] = ordered[i - 1]
+            i -= 1
+        ordered[i] = value
+        count += 1
+        self._count = count
+
+        median = ordered[(count - 1) >> 1]
+        if value - median > self.threshold or median - value > self.threshold:
+            self.rejected += 1
+        return median
@@ -0,0 +1,441 @@
+import time
+import asyncio
+import logging
+
+from clock import system_clock
+
+from .median_filter import MedianFilter, DEFAULT_REJECT_THRESHOLD
+from .utilities import get_logger, config_logger
+
+INIT_TIMEOUT = 5 # seconds
+DESTROY_TIMEOUT = 10 # seconds
+DEFAULT_INTERVAL = 1.0 # once every 1 second
+
+# Retry with an exponential backoff after a failed acquisition, and reset the sensor after too many in a row
+RETRY_BACKOFF_MIN = 0.5 # seconds
+RETRY_BACKOFF_MAX = 8.0 # seconds
+MAX_CONSECUTIVE_FAILURES = 3
+
+# Lifecycle states
+STATE_CREATED = "created"
+STATE_RUNNING = "running"
+STATE_PAUSED = "paused"
+STATE_FAILED = "failed"
+STATE_DESTROYED = "destroyed"
+
+
+class SensorDriver:
+    """
+    Base class for the sensor drivers. Owns the lifecycle (start, pause, resume, destroy), the data update loop,
+    the retry/backoff policy, the health counters and the publication of readings.
+
+    Lifecycle:
+        created --start()--> running <--pause()/resume()--> paused
+        created --start()--> failed, if the sensor fails to initialize
+        any --destroy()--> destroyed
+
+    Subclasses supply three hooks:
+    - `_init_sensor()`: initialize the sensor. Called on start and to reset the sensor after failures.
+    - `_acquire()`: get the raw data of one reading. Returns None if no new reading is available yet,
+        raises an exception on failure.
+    - `_parse_data(raw)`: parse the raw data into `self._data` in place.
+
+    and `_invalid_data()`, which returns the data dict with every field marked invalid.
+
+    Integer channels can be despiked with a median filter, switched per channel with `set_filter()`. Subclasses
+    pass their values through `_filter(channel, value)` in `_parse_data()`.
+
+    Attributes:
+        name (str): the name of the sensor, also used as the logger name.
+        interval (float): time between readings, in seconds.
+        no_data_timeout_ms (int): reset the sensor if there is no reading for this long. None to disable.
+        streaming (bool): True if the sensor pushes readings on its own, so `_acquire()` is called until it returns
+            None to drain the buffered readings.
+        filtered_channels (Sequence[str]): the channels with a median filter on start, of `median_size` values.
+        reject_threshold (int): the deviation from the median above which the filters count a value as rejected.
+    """
+
+    def __init__(self, name, interval=DEFAULT_INTERVAL, no_data_timeout_ms=None, streaming=False,
+                 filtered_channels=(), median_size=0, reject_threshold=DEFAULT_REJECT_THRESHOLD, debug=False):
+
+        self.name = name
+        self.interval = interval
+        self.no_data_timeout_ms = no_data_timeout_ms
+        self.streaming = streaming
+        self.reject_threshold = reject_threshold
+        self._empty_samples = 0
+        self._data = self._invalid_data()
+
+        self._state = STATE_CREATED
+        self._health = {
+            "readings": 0,
+            "failures": 0,
+            "consecutive_failures": 0,
+            "resets": 0,
+            "last_error": None
+        }
+
+        # Median filters by channel
+        self._filters = {}
+        for channel in filtered_channels:
+            self.set_filter(channel, median_size)
+        self._last_reading_time = time.ticks_ms()
+
+        # Config the logger
+        if debug:
+            config_logger(name=name, log_level=logging.DEBUG)
+        else:
+            config_logger(name=name, log_level=logging.ERROR)
+
+        # Events. The run signal is set while running and cleared while paused, so a resume is never lost.
+        self._destroy_signal = asyncio.Event()
+        self._run_signal = asyncio.Event()
+        self._run_signal.set()
+
+        # Coroutine tasks
+        self._data_update_task = None
+
+
+    # *** PUBLIC GETTERS ***
+
+
+    def get_latest(self):
+        """
+        Get the latest data. See the subclass for the fields.
+
+        Returns
+            dict: The data dict.
+        """
+        return self._data.copy()
+
+
+    def peek_latest(self):
+        """
+        Get the latest data without copying it, for the publishing path. The fields are the same as `get_latest()`.
+
+        The dict is updated in place by every reading and replaced on reset, so read it right away and do not keep
+        it, nor modify it.
+
+        Returns
+            dict: The live data dict.
+        """
+        return self._data
+
+
+    def get_state(self):
+        """
+        Get the lifecycle state.
+
+        Returns
+            str: one of "created", "running", "paused", "failed" and "destroyed".
+        """
+        return self._state
+
+
+    def get_health(self):
+        """
+        Get the health counters.
+
+        Fields:
+        - "readings" (int): number of readings published.
+        - "failures" (int): number of failed acquisitions.
+        - "consecutive_failures" (int): number of failed acquisitions since the latest reading.
+        - "resets" (int): number of times the sensor was reset.
+        - "rejected" (int): number of values rejected by the current median filters, see `get_filters()`.
+        - "last_error" (str): the latest error. None if no errors yet.
+
+        Returns
+            dict: The health dict.
+        """
+        health = self._health.copy()
+        health["rejected"] = sum(f.rejected for f in self._filters.values())
+        return health
+
+
+    def get_filters(self):
+        """
+        Get the median filter of every filtered channel.
+
+        Fields, by channel:
+        - "size" (int): number of values in the filter window.
+        - "rejected" (int): number of values further than `reject_threshold` from the median.
+
+        Returns
+            dict: The filters dict.
+        """
+        return {channel: {"size": f.size, "rejected": f.rejected} for channel, f in self._filters.items()}
+
+
+    # *** PUBLIC CONFIGURATION ***
+
+
+    def set_filter(self, channel, size):
+        """
+        Switch the median filter of a channel on or off. Takes effect on the next reading.
+
+        Args:
+            channel (str): the channel name. See the subclass for the filterable channels.
+            size (int): the number of values in the median window. 0 or 1 to switch the filter off.
+        """
+        if size is None or size <= 1:
+            self._filters.pop(channel, None)
+        else:
+            self._filters[channel] = MedianFilter(size, self.reject_threshold)
+
+
+    # *** PUBLIC LIFECYCLE METHODS ***
+
+
+    async def start(self, run_loop=True, timeout=INIT_TIMEOUT):
+        """
+        Initialize the sensor and start the data update loop.
+
+        Args:
+            run_loop (bool): True to sample every `interval` in the driver's own loop. False if the sampling is
+                triggered externally through `sample()`, e.g. by a scheduler.
+            timeout (float): the longest time to wait for the initialization, in seconds.
+
+        Returns:
+            bool: True if successful. False if failed.
+        """
+        self._logger().info("Starting...")
+
+        try:
+            if not await asyncio.wait_for(self._init_sensor(), timeout):
+                self._logger().warning("Initialization failed")
+                self._state = STATE_FAILED
+                return False
+        except asyncio.TimeoutError:
+            self._logger().error("Initialization timeout")
+            self._state = STATE_FAILED
+            return False
+
+        if self._state == STATE_CREATED:
+            self._state = STATE_RUNNING if self._run_signal.is_set() else STATE_PAUSED
+        self._last_reading_time = time.ticks_ms()
+        if run_loop:
+            self._data_update_task = asyncio.create_task(self._data_update_service())
+
+        self._logger().info("start success")
+        return True
+
+
+    def pause(self):
+        """Pause data collection."""
+        if self._state == STATE_DESTROYED:
+            return
+        self._logger().info("Pausing data collection...")
+        if self._state == STATE_RUNNING:
+            self._state = STATE_PAUSED
+        self._run_signal.clear()
+
+
+    def resume(self):
+        """Resume data collection."""
+        if self._state == STATE_DESTROYED:
+            return
+        self._logger().info("Resuming data collection...")
+        if self._state == STATE_PAUSED:
+            self._state = STATE_RUNNING
+        self._run_signal.set()
+
+
+    async def destroy(self):
+        """
+        Destroy this instance and free up resources.
+        """
+
+        # Send a destroy signal, waking up the loop if paused
+        self._logger().info("Sending destroy signal...")
+        self._state = STATE_DESTROYED
+        self._destroy_signal.set()
+        self._run_signal.set()
+
+        if not isinstance(self._data_update_task, asyncio.Task):
+            return
+
+        # Wait for the task to finish
+        try:
+            await asyncio.wait_for(self._data_update_task, timeout=DESTROY_TIMEOUT)
+
+        except asyncio.TimeoutError:
+            self._logger().warning("Destroy signal timed out, sending task cancel signal...")
+            self._data_update_task.cancel()
+            await asyncio.wait_for(self._data_update_task, timeout=DESTROY_TIMEOUT)
+
+
+    def abort(self):
+        """Cancel the data update loop without waiting, e.g. when `destroy()` overran a shutdown deadline."""
+        self._state = STATE_DESTROYED
+        if isinstance(self._data_update_task, asyncio.Task):
+            self._data_update_task.cancel()
+
+
+    async def sample(self):
+        """
+        Run one sampling cycle: acquire, parse and publish a reading. Streaming sensors are drained, so every
+        buffered reading is published and the newest one is kept.
+
+        Failures are counted and reset the sensor after too many in a row. The sensor is also reset if two samples
+        in a row find no reading and there has been no reading for `no_data_timeout_ms`.
+
+        Returns:
+            bool: True if a new reading was published.
+        """
+        published = False
+        try:
+            raw = await self._acquire()
+            while raw is not None:
+                self._parse_data(raw)
+                self._publish()
+                published = True
+                if not self.streaming:
+                    break
+                raw = await self._acquire()
+        except Exception as e:
+            await self._on_failure(e)
+            return False
+
+        if published:
+            self._empty_samples = 0
+        else:
+            self._empty_samples += 1
+            if self.no_data_timeout_ms is not None and self._empty_samples >= 2 \
+                    and time.ticks_diff(time.ticks_ms(), self._last_reading_time) > self.no_data_timeout_ms:
+                self._logger().warning(f"No reading for {self.no_data_timeout_ms} ms, resetting...")
+                await self._reset()
+
+        return published
+
+
+    # *** HOOKS FOR SUBCLASSES ***
+
+
+    async def _init_sensor(self):
+        """
+        Initialize the sensor.
+
+        Returns:
+            bool: True if successful, False if failed.
+        """
+        return True
+
+
+    async def _acquire(self):
+        """
+        Get the raw data of one reading.
+
+        Returns:
+            The raw data, or None if no new reading is available yet.
+        """
+        raise NotImplementedError("Subclasses should implement this method")
+
+
+    def _parse_data(self, raw):
+        """
+        Parse the raw data into `self._data` in place.
+        """
+        raise NotImplementedError("Subclasses should implement this method")
+
+
+    def _invalid_data(self):
+        """
+        Returns:
+            dict: the data dict with every field marked invalid.
+        """
+        return {
+            "timestamp": system_clock.uptime_ms()
+        }
+
+
+    def _filter(self, channel, value):
+        """
+        Pass a value through the median filter of its channel, if any.
+
+        Args:
+            channel (str): the channel name.
+            value (int): the raw value.
+
+        Returns:
+            int: the filtered value.
+        """
+        median_filter = self._filters.get(channel)
+        if median_filter is None:
+            return value
+        return median_filter.update(value)
+
+
+    # *** PRIVATE METHODS ***
+
+
+    def _logger(self):
+        return get_logger(self.name)
+
+
+    async def _data_update_service(self):
+        """
+        Acquires, parses and publishes a reading every interval until destroyed.
+        """
+
+        self._logger().info("data update service started")
+
+        try:
+            while not self._destroy_signal.is_set():
+
+                if not self._run_signal.is_set():
+                    self._logger().info("Data collection paused. Waiting to resume...")
+                    await self._run_signal.wait()
+                    self._last_reading_time = time.ticks_ms()
+                    continue
+
+                cycle_start = time.ticks_ms()
+
+                if not await self.sample() and self._health["consecutive_failures"] > 0:
+                    # back off after a failure
+                    failures = self._health["consecutive_failures"]
+                    await asyncio.sleep(min(RETRY_BACKOFF_MIN * (1 << min(failures - 1, 8)), RETRY_BACKOFF_MAX))
+                    continue
+
+                # wait for the next interval's start time
+                wait_time = self.interval - time.ticks_diff(time.ticks_ms(), cycle_start) / 1000
+                if wait_time > 0:
+                    await asyncio.sleep(wait_time)
+
+            self._logger().info("data update service stopped via destroy signal")
+        except asyncio.CancelledError:
+            self._logger().info("data update service cancelled")
+
+
+    def _publish(self):
+        """Stamp the reading parsed into `self._data` and update the health counters."""
+        self._data["timestamp"] = system_clock.uptime_ms()
+        self._last_reading_time = time.ticks_ms()
+        self._health["readings"] += 1
+        self._health["consecutive_failures"] = 0
+        if self._state == STATE_FAILED:
+            self._state = STATE_RUNNING
+
+
+    async def _on_failure(self, error):
+        """Count a failed acquisition and reset the sensor after too many in a row."""
+        self._health["failures"] += 1
+        self._health["consecutive_failures"] += 1
+        self._health["last_error"] = f"{type(error).__name__}: {error}"
+        self._logger().error(f"Acquisition failed: {self._health['last_error']}")
+
+        failures = self._health["consecutive_failures"]
+        if failures % MAX_CONSECUTIVE_FAILURES == 0:
+            await self._reset()
+
+
+    async def _reset(self):
+        """Invalidate the data and re-initialize the sensor."""
+        self._health["resets"] += 1
+        self._data = self._invalid_data()
+        for median_filter in self._filters.values():
+            median_filter.reset()
+        self._last_reading_time = time.ticks_ms()
+        try:
+            await asyncio.wait_for(self._init_sensor(), INIT_TIMEOUT)
+        except Exception as e:
+            self._logger().error(f"Reset failed: {type(e).__name__}: {e}")
@@ -0,0 +1,5 @@
+# Import the ShutdownCoordinator class to make it accessible from the module level
+from .shutdown_coordinator import ShutdownCoordinator
+
+# Define what should be available when the module is imported
+__all__ = ["ShutdownCoordinator"]
\ No newline at end of file
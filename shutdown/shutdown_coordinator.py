@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+from .utilities import get_logger
+
+# Time given to the cancelled components to unwind, in seconds
+CANCEL_GRACE = 0.1
+
+
+class ShutdownCoordinator:
+    """
+    Shuts several components down together under one deadline.
+
+    Every component is given a coroutine function that signals it and waits for it to finish, e.g. its `destroy()`,
+    and optionally an abort function that cancels its tasks. `run()` starts every shutdown at once, so the components
+    stop concurrently, and waits until they all finish or the deadline passes. The components still running then are
+    aborted and their shutdown cancelled, and reported as overrun.
+
+    Example:
+        coordinator = ShutdownCoordinator(5)
+        coordinator.add("pms7003", pms7003.destroy, pms7003.abort)
+        coordinator.add_task("sampling", sampling_task)
+        report = await coordinator.run()
+
+    Attributes:
+        deadline (float): the longest time to wait for every component, in seconds.
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self._components = [] # name, shutdown coroutine function and abort function of every component
+
+
+    def add(self, name, shutdown, abort=None):
+        """
+        Add a component.
+
+        Args:
+            name (str): the name reported if the component overruns or fails.
+            shutdown (Callable[[], Coroutine]): signals the component and waits until it finished.
+            abort (Optional[Callable[[], None]]): cancels the tasks of the component, called if it overruns.
+        """
+        self._components.append((name, shutdown, abort))
+
+
+    def add_task(self, name, task):
+        """
+        Add a task, already signalled to finish. Cancelled if it overruns.
+
+        Args:
+            name (str): the name reported if the task overruns or fails.
+            task (Optional[asyncio.Task]): the task. Ignored if None.
+        """
+        if task is None:
+            return
+
+        async def shutdown():
+            await task
+
+        self.add(name, shutdown, task.cancel)
+
+
+    async def run(self):
+        """
+        Shut every component down concurrently, then abort those still running at the deadline.
+
+        Fields of the report:
+        - "elapsed_ms" (int): time until every component finished or was aborted.
+        - "overrun" (list[str]): the components aborted at the deadline.
+        - "errors" (dict[str, str]): the error of every component whose shutdown raised.
+
+        Returns:
+            dict: the report.
+        """
+        start = time.ticks_ms()
+        errors = {}
+        pending = {name: None for name, _, _ in self._components}
+        finished = asyncio.Event()
+        if not self._components:
+            finished.set()
+
+        async def shut_down(name, shutdown):
+            try:
+                await shutdown()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {e}"
+            del pending[name]
+            if not pending:
+                finished.set()
+
+        for name, shutdown, _ in self._components:
+            pending[name] = asyncio.create_task(shut_down(name, shutdown))
+
+        try:
+            await asyncio.wait_for(finished.wait(), self.deadline)
+        except asyncio.TimeoutError:
+            pass
+
+        overrun = [name for name, _, _ in self._components if name in pending]
+        if overrun:
+            for name, _, abort in self._components:
+                if name not in pending:
+                    continue
+                get_logger().warning(f"{name} overran the {self.deadline} s shutdown deadline, aborting")
+                if abort is not None:
+                    abort()
+                pending[name].cancel()
+            await asyncio.sleep(CANCEL_GRACE)
+
+        for name, error in errors.items():
+            get_logger().error(f"{name} failed to shut down: {error}")
+
+        elapsed_ms = time.ticks_diff(time.ticks_ms(), start)
+        get_logger().info(f"Shut down {len(self._components)} components in {elapsed_ms} ms, overrun: {overrun}")
+        return {
+            "elapsed_ms": elapsed_ms,
+            "overrun": overrun,
+            "errors": errors
+        }
@@ -4,6 +4,7 @@ from .advertise_state import AdvertiseState
 from .data_state import DataState
 from .setup_state import SetupState
 from .idle_state import IdleState
+from .sampling_scheduler import SamplingScheduler
 
 # Define what should be available when the module is imported
-__all__ = ["Context", "AdvertiseState", "DataState", "SetupState", "IdleState"]
\ No newline at end of file
+__all__ = ["Context", "AdvertiseState", "DataState", "SetupState", "IdleState", "SamplingScheduler"]
\ No newline at end of file
@@ -1,14 +1,21 @@
 import asyncio
 import logging
+import time
 
-from ble_wrapper import BLEEventHandler, BLEWrapper
+from ble_wrapper import BLEEventHandler, BLEWrapper, EXTENDED_FIELDS
+from clock import system_clock
 from dht20 import DHT20
+from history import History, RollingStats, INVALID_UINT16
 from pms7003 import PMS7003
+from record_store import RecordStore
+from shutdown import ShutdownCoordinator
+from sensor_driver import DEFAULT_MEDIAN_SIZE
 from ze07co import ZE07CO
 
 from .state import State
 from .advertise_state import AdvertiseState
 from .data_state import DataState
+from .sampling_scheduler import SamplingScheduler
 from .utilities import get_logger, config_logger
 from ws2812b import WS2812B
 
@@ -17,14 +24,54 @@ DEFAULT_DEVICE_NAME = "bioinfo"
 
 UPDATE_INTERVAL = 5 # seconds
 
+# Number of records kept in the history, 16 bytes each. One hour at 1 Hz, or five hours at UPDATE_INTERVAL.
+DEFAULT_HISTORY_CAPACITY = 3600
+
+# Fixed-point history channels
+HISTORY_CHANNELS = (
+    ("temperature", "h"), # hundredths of a degree celcius
+    ("humidity", "H"), # per mille
+    ("pm1", "H"), # µg/m³, atmospheric
+    ("pm2_5", "H"), # µg/m³, atmospheric
+    ("pm10", "H"), # µg/m³, atmospheric
+    ("co", "H") # tenths of a PPM
+)
+
+# Directory of the flash record store, which keeps every history record across reboots
+RECORD_STORE_DIRECTORY = "records"
+
+# Rolling statistics of the published channels, over the latest DEFAULT_STATS_WINDOW readings. One minute at UPDATE_INTERVAL.
+DEFAULT_STATS_WINDOW = 12
+STATS_CHANNELS = ("temperature", "humidity", "pm2_5", "co")
+
+# Longest initialization of each sensor at boot, in seconds. The I2C sensor waits 100 ms after power on, the UART
+# sensors only set up their port. A sensor over its timeout is marked degraded and recovered by its failure handling.
+SENSOR_START_TIMEOUTS = {
+    "dht20": 2,
+    "pms7003": 3,
+    "ze07co": 3
+}
+
+# Longest shutdown of every component together, after which the ones still running are cancelled
+SHUTDOWN_DEADLINE = 5 # seconds
+
+# What send_data() publishes: the latest readings, or their rolling mean or exponential moving average
+SMOOTHING_NONE = "none"
+SMOOTHING_MEAN = "mean"
+SMOOTHING_EMA = "ema"
+
 class Context(BLEEventHandler):
-    def __init__(self, initial_state_class, debug=False, debug_sensor=False):
+    def __init__(self, initial_state_class, debug=False, debug_sensor=False, buses=None):
 
         self.debug = debug
         self.debug_sensor = debug_sensor
         
         # Read from the config file
         self.device_name = DEFAULT_DEVICE_NAME
+        self.history_capacity = DEFAULT_HISTORY_CAPACITY
+        self.stats_window = DEFAULT_STATS_WINDOW
+        self.smoothing = SMOOTHING_NONE
+        self.median_filter = DEFAULT_MEDIAN_SIZE
         with open(FILE_NAME, "r") as file:
             while True:
                 line = file.readline()
@@ -37,6 +84,14 @@ class Context(BLEEventHandler):
                     self.debug = (value == "true" or value == "True")
                 if name == "debug_sensor":
                     self.debug_sensor = (value == "true" or value == "True")
+                if name == "history_capacity":
+                    self.history_capacity = int(value)
+                if name == "stats_window":
+                    self.stats_window = int(value)
+                if name == "smoothing":
+                    self.smoothing = value
+                if name == "median_filter":
+                    self.median_filter = int(value)
 
         
         get_logger().info(f"Logging: debug={self.debug}, debug_sensor={self.debug_sensor}")
@@ -44,13 +99,41 @@ class Context(BLEEventHandler):
 
         get_logger().info(f"Device name: {self.device_name}")
 
-        # Initialize BLE
+        # Initialize BLE, with the fixed-point values of the extended frame filled in place
         self.ble_wrapper = BLEWrapper(name=self.device_name)
+        self._frame_values = [0] * len(EXTENDED_FIELDS)
+
+        # Initialize sensors, on the bus of each sensor in `buses` if given, e.g. fakes from hal, else on the device ports
+        buses = buses or {}
+        self.dht20 = DHT20(bus=buses.get("dht20"), debug=self.debug_sensor)
+        # Despike the UART sensors with a median filter of `median_filter` frames, 0 to switch it off
+        self.pms7003 = PMS7003(median_size=self.median_filter, bus=buses.get("pms7003"), debug=self.debug_sensor)
+        self.ze07co = ZE07CO(median_size=self.median_filter, bus=buses.get("ze07co"), debug=self.debug_sensor)
+        self._sensors = {
+            "dht20": self.dht20,
+            "pms7003": self.pms7003,
+            "ze07co": self.ze07co
+        }
+
+        # Initialize the history of readings
+        self.history = History(self.history_capacity, HISTORY_CHANNELS)
+        self._history_values = [0] * len(HISTORY_CHANNELS)
+        get_logger().info(f"History: {self.history_capacity} records, {self.history.memory_usage()} bytes")
+
+        # Open the flash record store, recovering from a power loss during the latest write
+        self.record_store = RecordStore(RECORD_STORE_DIRECTORY, self.history.record_size)
+        self.record_store.open()
+        self._record = bytearray(self.history.record_size)
 
-        # Initialize sensors
-        self.dht20 = DHT20(debug=self.debug_sensor)
-        self.pms7003 = PMS7003(debug=self.debug_sensor)
-        self.ze07co = ZE07CO(debug=self.debug_sensor)
+        # Keep the timestamps sorted after a reboot, which resets the RTC until the client syncs the time
+        last_timestamp = self.record_store.last_timestamp()
+        if last_timestamp is not None:
+            system_clock.hold(last_timestamp)
+
+        # Initialize the rolling statistics, updated with every new reading
+        self.statistics = {name: RollingStats(self.stats_window) for name in STATS_CHANNELS}
+        self._statistics_timestamps = {name: None for name in STATS_CHANNELS}
+        get_logger().info(f"Statistics: window of {self.stats_window} readings, smoothing={self.smoothing}")
 
         # Initialize LEDs
         self.rgb_led = WS2812B()
@@ -75,6 +158,44 @@ class Context(BLEEventHandler):
         # Other Attributes
         self.update_interval = UPDATE_INTERVAL
 
+        # Sample every sensor on a common epoch, the I2C sensor first since it is the slowest, then publish
+        self.sampling_scheduler = SamplingScheduler(
+            [self.dht20, self.pms7003, self.ze07co],
+            self._on_sampled,
+            self.update_interval
+        )
+        self._sampling_task = None
+        self._sensors_task = None
+        self._history_transfer = False
+
+        # Boot timings, in milliseconds since boot from time.ticks_ms(), which starts at 0 at boot on the device, so
+        # the time spent importing the modules counts too, unlike the uptime of the system clock
+        self._boot_stats = {
+            "advertise_ms": -1,
+            "sensors_ready_ms": -1,
+            "degraded": []
+        }
+
+
+    # *** PUBLIC GETTERS ***
+
+
+    def get_boot_stats(self):
+        """
+        Get the boot timings and the sensors that failed to start.
+
+        Fields:
+        - "advertise_ms" (int): time from boot until advertising started. -1 if not started yet.
+        - "sensors_ready_ms" (int): time from boot until every sensor started or timed out. -1 if still starting.
+        - "degraded" (list[str]): the sensors that failed or timed out at boot, e.g. "pms7003".
+
+        Returns
+            dict: The statistics dict.
+        """
+        stats = self._boot_stats.copy()
+        stats["degraded"] = self._boot_stats["degraded"].copy()
+        return stats
+
 
     # *** PUBLIC METHODS (USED BY STATES) ***
 
@@ -92,8 +213,22 @@ class Context(BLEEventHandler):
         }
     
     
+    def get_statistics(self):
+        """
+        Get the rolling statistics of every published channel.
+
+        Returns
+            dict: The statistics of each channel, see `RollingStats.get_summary()`.
+        """
+        return {name: stats.get_summary() for name, stats in self.statistics.items()}
+
+
     def send_data(self):
-        """Update the value in the BLE characteristic. Might contain invalid values if data isn't ready.
+        """Update the value in the BLE characteristics. Might contain invalid values if data isn't ready.
+
+        The legacy characteristic gets the four floats, the extended one every channel in fixed point.
+        With `smoothing` set to "mean" or "ema", the rolling mean or the exponential moving average is published
+        instead of each valid reading.
         
         Invalid values:
         - PM2.5: -1
@@ -102,26 +237,186 @@ class Context(BLEEventHandler):
         - Humidity: float("-inf")
         """
 
-        dht_data = self.dht20.get_latest()
+        dht_data = self.dht20.peek_latest()
         humidity = dht_data["humidity"] 
         temperature = dht_data["temperature"]
-        pms_data = self.pms7003.get_latest()
+        pms_data = self.pms7003.peek_latest()
         pm2_5 = pms_data["concentration_atm"]["pm2_5"]
-        co_data = self.ze07co.get_latest()
+        co_data = self.ze07co.peek_latest()
         co_concentration = co_data["concentration"]
+
+        values = self._frame_values
+        values[0] = dht_data["temperature_centi"]
+        values[1] = dht_data["humidity_permille"]
+        concentration_atm = pms_data["concentration_atm"]
+        values[2] = concentration_atm["pm1"]
+        values[3] = pm2_5
+        values[4] = concentration_atm["pm10"]
+        n_particles = pms_data["n_particles"]
+        values[5] = n_particles["0_3um"]
+        values[6] = n_particles["0_5um"]
+        values[7] = n_particles["1um"]
+        values[8] = n_particles["2_5um"]
+        values[9] = n_particles["5um"]
+        values[10] = n_particles["10um"]
+        values[11] = co_data["concentration_deci"]
+        values[12] = round(co_data["range"] * 10)
+
+        # smooth the valid readings only, so a failed sensor still shows up as invalid
+        if self.smoothing != SMOOTHING_NONE:
+            if humidity >= 0:
+                temperature = self._smoothed("temperature", temperature)
+                humidity = self._smoothed("humidity", humidity)
+                values[0] = round(temperature * 100)
+                values[1] = round(humidity * 1000)
+            if pm2_5 >= 0:
+                pm2_5 = self._smoothed("pm2_5", pm2_5)
+                values[3] = round(pm2_5)
+            if co_concentration >= 0:
+                co_concentration = self._smoothed("co", co_concentration)
+                values[11] = round(co_concentration * 10)
         
-        self.ble_wrapper.update_bioinfo_data(temperature, humidity, pm2_5, co_concentration, keep_old=True)
+        self.ble_wrapper.update_bioinfo_data(temperature, humidity, pm2_5, co_concentration, keep_old=True,
+                                             extended=values, timestamp=system_clock.now())
+
+
+    def update_statistics(self):
+        """Add the new valid readings of the published channels to their rolling statistics."""
+
+        dht_data = self.dht20.peek_latest()
+        pms_data = self.pms7003.peek_latest()
+        co_data = self.ze07co.peek_latest()
+
+        if dht_data["humidity"] >= 0:
+            self._add_statistic("temperature", dht_data["temperature"], dht_data["timestamp"])
+            self._add_statistic("humidity", dht_data["humidity"], dht_data["timestamp"])
+        if pms_data["concentration_atm"]["pm2_5"] >= 0:
+            self._add_statistic("pm2_5", pms_data["concentration_atm"]["pm2_5"], pms_data["timestamp"])
+        if co_data["concentration"] >= 0:
+            self._add_statistic("co", co_data["concentration"], co_data["timestamp"])
     
 
+    def record_history(self):
+        """Append the latest readings of every sensor to the history, in fixed point, and to the flash record store."""
+
+        dht_data = self.dht20.peek_latest()
+        pms_data = self.pms7003.peek_latest()["concentration_atm"]
+        co_data = self.ze07co.peek_latest()
+
+        values = self._history_values
+        values[0] = dht_data["temperature_centi"]
+        values[1] = dht_data["humidity_permille"]
+        values[2] = pms_data["pm1"]
+        values[3] = pms_data["pm2_5"]
+        values[4] = pms_data["pm10"]
+        values[5] = co_data["concentration_deci"]
+
+        # mark the missing values in the unsigned channels
+        for i in range(1, len(values)):
+            if values[i] < 0:
+                values[i] = INVALID_UINT16
+
+        self.history.append(system_clock.now(), values)
+
+        # persist the record, written to flash in batches
+        self.history.pack_record(self.history.index(-1), self._record, 0)
+        self.record_store.append(self._record)
+
+
+    async def send_history(self, since, compressed=False):
+        """
+        Send the history records since a timestamp to the connected client, read back from the record store when older
+        than the history in RAM. Ignored while another transfer is running.
+
+        Args:
+            since (int): the earliest timestamp to send, in seconds.
+            compressed (bool): True to send delta/varint encoded blocks, False to send raw records.
+        """
+        if self._history_transfer:
+            get_logger().warning("History transfer already running")
+            return
+        self._history_transfer = True
+        try:
+            await self.ble_wrapper.send_history(self.history, since, compressed=compressed, store=self.record_store)
+        finally:
+            self._history_transfer = False
+
+
+    def sync_time(self, timestamp):
+        """
+        Set the clock to the time from the client, so the readings carry the real time.
+
+        Args:
+            timestamp (int): the Unix time in seconds.
+        """
+        system_clock.sync(timestamp)
+
+
     def update_name(self, name):
-        """Update the device name. Will take effect on the next advertising cycle."""
+        """Update the device name. Will take effect on the next advertising cycle. The other settings are kept."""
 
-        with open("config.txt", "w") as file:
-            content = f"device_name = {name}"
-            file.write(content)
+        lines = [f"device_name = {name}"]
+        with open(FILE_NAME, "r") as file:
+            while True:
+                line = file.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line and not line.startswith("device_name "):
+                    lines.append(line)
+        with open(FILE_NAME, "w") as file:
+            file.write("\n".join(lines))
         self.device_name = name
         self.ble_wrapper.name = name
 
+    def _on_sampled(self):
+        """Called by the sampling scheduler once every sensor has been sampled."""
+        self.record_history()
+        self.update_statistics()
+        self.send_data()
+
+
+    async def _start_sensors(self):
+        """
+        Start every sensor concurrently, each within its own timeout, then start sampling them. The sensors are
+        sampled by the sampling scheduler instead of their own loops. The scheduler runs in every state, so the
+        readings are recorded in the history while disconnected too.
+        """
+        sensors = self._sensors
+        names = list(sensors)
+        results = await asyncio.gather(
+            *[sensors[name].start(run_loop=False, timeout=SENSOR_START_TIMEOUTS[name]) for name in names],
+            return_exceptions=True
+        )
+
+        # a degraded sensor is still sampled, its failures reset it until it recovers
+        degraded = self._boot_stats["degraded"]
+        for name, result in zip(names, results):
+            if result is not True:
+                degraded.append(name)
+                get_logger().warning(f"Sensor {name} degraded at boot: {result}")
+        self._boot_stats["sensors_ready_ms"] = time.ticks_ms()
+        get_logger().info(f"Sensors started {self._boot_stats['sensors_ready_ms']} ms after boot, degraded: {degraded}")
+
+        self._sampling_task = asyncio.create_task(self.sampling_scheduler.run())
+        self._sensors_task = None
+
+
+    def _add_statistic(self, name, value, timestamp):
+        """Add a reading to the statistics of a channel, unless it was already added."""
+        if timestamp == self._statistics_timestamps[name]:
+            return
+        self._statistics_timestamps[name] = timestamp
+        self.statistics[name].add(value)
+
+
+    def _smoothed(self, name, latest):
+        """Get the smoothed value of a channel, or the latest reading if there are no statistics yet."""
+        stats = self.statistics[name]
+        value = stats.ema() if self.smoothing == SMOOTHING_EMA else stats.mean()
+        return latest if value is None else value
+
+
     # *** LIFECYCLE METHODS (USED BY THE MAIN FUNCTION) ***
 
 
@@ -129,16 +424,13 @@ class Context(BLEEventHandler):
         """Start the application and run indefinitely."""
 
         try:        
-            # Start BLE
+            # Start BLE first, so the device is discoverable while the sensors start
             await self.ble_wrapper.start()
+            self._boot_stats["advertise_ms"] = time.ticks_ms()
+            get_logger().info(f"Advertising {self._boot_stats['advertise_ms']} ms after boot")
 
-            # Start sensors
-            await self.dht20.start()
-            self.dht20.pause()
-            await self.pms7003.start()
-            self.pms7003.pause()
-            await self.ze07co.start()
-            self.ze07co.pause()
+            # Start the sensors concurrently in the background, then sample them
+            self._sensors_task = asyncio.create_task(self._start_sensors())
 
             # Start first state
             self.rgb_led.disconnected()
@@ -162,11 +454,7 @@ class Context(BLEEventHandler):
                 self.ble_wrapper.unregister_event_handler()
                 self.rgb_led.clear_strip()
 
-                if self._next_state == DataState:
-                    self._state = DataState(self, self.dht20, self.pms7003, self.ze07co)
-                else:
-                    self._state = self._next_state(self)
-                
+                self._state = self._next_state(self)
                 self._state.enter()
                 self.ble_wrapper.set_event_handler(self._state)
                 self._state_running.set()
@@ -187,16 +475,31 @@ class Context(BLEEventHandler):
         self._stop_signal.set()
         self._transition_event.set()
         self._state.exit()
+        if self._sensors_task is not None:
+            self._sensors_task.cancel()
+            self._sensors_task = None
+        if self._sampling_task is not None:
+            self._sampling_task.cancel()
+            self._sampling_task = None
+        self.record_store.flush()
 
     
     async def destroy(self):
-        """Free up the resources."""
+        """
+        Free up the resources. The BLE wrapper and the sensors are destroyed concurrently, and the ones still running
+        after SHUTDOWN_DEADLINE are cancelled.
+
+        Returns:
+            dict: the report of `ShutdownCoordinator.run()`, with the components that overran.
+        """
         # stop the application
         await self.stop()
 
         # call destroy on the ble and sensor classes
-        await self.ble_wrapper.destroy()
-        await self.dht20.destroy()
-        await self.pms7003.destroy()
-        await self.dht20.destroy()
+        coordinator = ShutdownCoordinator(SHUTDOWN_DEADLINE)
+        coordinator.add("ble_wrapper", lambda: self.ble_wrapper.destroy(timeout=SHUTDOWN_DEADLINE),
+                        self.ble_wrapper.abort)
+        for name, sensor in self._sensors.items():
+            coordinator.add(name, sensor.destroy, sensor.abort)
+        return await coordinator.run()
 
@@ -1,5 +1,3 @@
-import asyncio
-
 from .state import State
 
 from ble_wrapper import BLECommands
@@ -8,50 +6,6 @@ from .utilities import get_logger
 
 class DataState(State):
 
-    def __init__(self, context, dht20, pms7003, ze07co):
-        super().__init__(context)
-        self.dht20 = dht20
-        self.pms7003 = pms7003
-        self.ze07co = ze07co
-
-    def enter(self):
-        super().enter()
-        self.dht20.resume()
-        self.pms7003.resume()
-        self.ze07co.resume()
-
-        # TODO: start the data update coroutine
-        self.start_task(self._data_service(self.context.update_interval))
-    
-
-
-    def exit(self):
-        super().exit()
-        self.dht20.pause()
-        self.pms7003.pause()
-        self.ze07co.pause()
-
-    
-    # *** COROUTINES ***
-
-
-    async def _data_service(self, interval):
-
-        try:
-            while True:
-                # update the data
-                try:
-                    self.context.send_data()
-                except ValueError as e:
-                    get_logger().exception(f"Data not ready: {e}")
-
-                # wait
-                await asyncio.sleep(interval)
-
-        except asyncio.CancelledError:
-            pass
-
-
     # *** OVERRIDES FOR THE BLEEventHandler INTERFACE ***
 
 
@@ -74,6 +28,30 @@ class DataState(State):
         if command == BLECommands.SETUP_MODE:
             from .setup_state import SetupState
             self.context.transition(SetupState)
+        elif command == BLECommands.SET_DEADBAND:
+            try:
+                field, _, deadband = argument.partition("=")
+                self.context.ble_wrapper.notify_policy.set_deadband(field, float(deadband))
+            except (AttributeError, ValueError) as e:
+                get_logger().warning(f"Bad deadband argument {argument}: {e}")
+        elif command == BLECommands.SEND_HISTORY or command == BLECommands.SEND_HISTORY_COMPRESSED:
+            try:
+                since = 0 if argument is None else int(argument)
+            except ValueError as e:
+                get_logger().warning(f"Bad history argument {argument}: {e}")
+                return
+            compressed = (command == BLECommands.SEND_HISTORY_COMPRESSED)
+            self.start_task(self.context.send_history(since, compressed=compressed))
+        elif command == BLECommands.SYNC_TIME:
+            try:
+                self.context.sync_time(int(argument))
+            except (TypeError, ValueError) as e:
+                get_logger().warning(f"Bad time argument {argument}: {e}")
+        elif command == BLECommands.SET_HEARTBEAT:
+            try:
+                self.context.ble_wrapper.notify_policy.set_max_silence(int(float(argument) * 1000))
+            except (TypeError, ValueError) as e:
+                get_logger().warning(f"Bad heartbeat argument {argument}: {e}")
         else:
             get_logger().warning(f"Cannot process {command} command in data state")
 
@@ -0,0 +1,102 @@
+import time
+import asyncio
+
+from .utilities import get_logger
+
+# Time between the start of each sensor within a sampling epoch
+STAGGER_INTERVAL = 0.02 # seconds
+
+
+class SamplingScheduler:
+    """
+    Samples every sensor on a common epoch, then publishes right after the last sensor finishes, so the published
+    readings are time-aligned and fresh.
+
+    Sensors are started in the given order, each `stagger` seconds after the previous one, so the I2C transaction of
+    one sensor does not contend with the UART reads of the others. Put the slowest sensor first, its conversion time
+    then overlaps with the others.
+
+    The sensors are expected to be started with `run_loop=False`, so this is the only timer sampling them. An exception
+    from `on_sampled` is logged and the next epoch runs as usual.
+
+    Attributes:
+        sensors (list[SensorDriver]): the sensors, in sampling order.
+        on_sampled (Callable[[], None]): called after every sensor has been sampled.
+        interval (float): time between epochs, in seconds.
+        stagger (float): time between the start of each sensor within an epoch, in seconds.
+    """
+
+    def __init__(self, sensors, on_sampled, interval, stagger=STAGGER_INTERVAL):
+        self.sensors = sensors
+        self.on_sampled = on_sampled
+        self.interval = interval
+        self.stagger = stagger
+
+        self._stats = {
+            "epochs": 0,
+            "overruns": 0,
+            "last_latency_ms": -1,
+            "max_latency_ms": -1
+        }
+
+
+    def get_stats(self):
+        """
+        Get the scheduling statistics.
+
+        Fields:
+        - "epochs" (int): number of completed sampling epochs.
+        - "overruns" (int): number of epochs that took longer than the interval, skipping the next epoch.
+        - "last_latency_ms" (int): time from the start of the latest epoch until the readings were published. -1 if no epochs yet.
+        - "max_latency_ms" (int): the longest latency so far. -1 if no epochs yet.
+
+        Returns
+            dict: The statistics dict.
+        """
+        return self._stats.copy()
+
+
+    async def run(self):
+        """
+        Sample and publish every interval until cancelled.
+        """
+
+        get_logger().info(f"Sampling scheduler started with {len(self.sensors)} sensors every {self.interval} seconds")
+
+        interval_ms = int(self.interval * 1000)
+        epoch = time.ticks_ms()
+
+        try:
+            while True:
+                await asyncio.gather(*[self._sample(sensor, i * self.stagger) for i, sensor in enumerate(self.sensors)])
+
+                # a failed publish only loses this epoch, sampling goes on
+                try:
+                    self.on_sampled()
+                except Exception as e:
+                    get_logger().exception(f"Failed to publish the readings: {e}")
+
+                now = time.ticks_ms()
+                latency = time.ticks_diff(now, epoch)
+                self._stats["epochs"] += 1
+                self._stats["last_latency_ms"] = latency
+                self._stats["max_latency_ms"] = max(self._stats["max_latency_ms"], latency)
+
+                # wait for the next epoch, skipping the missed ones on overrun
+                epoch = time.ticks_add(epoch, interval_ms)
+                delay = time.ticks_diff(epoch, now)
+                if delay < 0:
+                    get_logger().warning(f"Sampling took {latency} ms, longer than the interval")
+                    self._stats["overruns"] += 1
+                    epoch = now
+                    delay = 0
+                await asyncio.sleep(delay / 1000)
+
+        except asyncio.CancelledError:
+            get_logger().info("Sampling scheduler stopped")
+
+
+    async def _sample(self, sensor, offset):
+        if offset > 0:
+            await asyncio.sleep(offset)
+        await sensor.sample()
@@ -31,7 +31,7 @@ class SetupState(State):
 
 
     def on_bioinfo_data_updated(self):
-        raise NotImplementedError
+        pass
 
 
     def on_command(self, command, argument):
@@ -39,8 +39,13 @@ class SetupState(State):
         if command == BLECommands.DATA_MODE:
             from .data_state import DataState
             self.context.transition(DataState)
-        if command == BLECommands.UPDATE_NAME:
+        elif command == BLECommands.UPDATE_NAME:
             if argument is not None and len(argument) > 0:
                 self.context.update_name(argument)
+        elif command == BLECommands.SYNC_TIME:
+            try:
+                self.context.sync_time(int(argument))
+            except (TypeError, ValueError) as e:
+                get_logger().warning(f"Bad time argument {argument}: {e}")
         else:
-            get_logger().warning(f"Cannot process {command} command in data state")
+            get_logger().warning(f"Cannot process {command} command in setup state")
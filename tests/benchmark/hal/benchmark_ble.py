@@ -0,0 +1,106 @@
+# Benchmark of the BLE wrapper over the simulated aioble stack of hal, run on a normal Python environment:
+#   python tests/benchmark/hal/benchmark_ble.py
+# For several link profiles, measures the handshake latency from the connection to the "howdy" indication, the round
+# trip of a command to its "OK" response, and the throughput of a history transfer, raw and compressed. The link runs
+# in real time, so the handshake includes the 300 ms delay of the wrapper.
+
+import asyncio
+import logging
+import os
+import sys
+import time
+
+# appended, so the standard logging module is used instead of the MicroPython one in the repository
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+from hal import aioble
+from ble_wrapper import BLEWrapper
+from ble_wrapper.constants import HISTORY_CHARACTERISTICS_UUID, REQUEST_CHARACTERISTICS_UUID
+from ble_wrapper.constants import RESPONSE_CHARACTERISTICS_UUID, HISTORY_DONE_RESPONSE
+from tests import helpers
+
+# Connection interval, latency and loss of each profile, and the largest MTU of its central
+PROFILES = (
+    ("fast", dict(interval_ms=8, latency_ms=1, mtu=247)),
+    ("phone", dict(interval_ms=30, latency_ms=2, mtu=185)),
+    ("lossy", dict(interval_ms=30, latency_ms=2, mtu=185, loss=0.2, seed=1)),
+    ("legacy", dict(interval_ms=50, latency_ms=2, mtu=23))
+)
+HISTORY_RECORDS = 500
+N_COMMANDS = 10
+
+
+def make_history():
+    return helpers.make_history(HISTORY_RECORDS, lambda t: (2150 + t % 7, 480 + t % 3, 5, 12 + t % 5, 20, 10 + t % 2))
+
+
+async def transfer(wrapper, client, history, compressed):
+    """Send the whole history, and return the seconds taken and the bytes notified."""
+    notifications = client.characteristic(HISTORY_CHARACTERISTICS_UUID)
+    response = client.characteristic(RESPONSE_CHARACTERISTICS_UUID)
+    # let the confirmation of the latest response arrive, the wrapper indicates one response at a time
+    await asyncio.sleep(0.3)
+    start = time.perf_counter()
+    sending = asyncio.create_task(wrapper.send_history(history, 0, compressed=compressed))
+    while not (await response.indicated(timeout_ms=10_000)).startswith(HISTORY_DONE_RESPONSE.encode()):
+        pass
+    elapsed = time.perf_counter() - start
+    assert await sending == HISTORY_RECORDS
+
+    # the notifications arrived before the final response, take them without waiting
+    n_bytes = 0
+    try:
+        while True:
+            n_bytes += len(await notifications.notified(timeout_ms=0))
+    except asyncio.TimeoutError:
+        return elapsed, n_bytes
+
+
+async def run(profile):
+    aioble.reset()
+    wrapper = BLEWrapper()
+    await wrapper.start()
+    link = aioble.Link(**profile)
+    history = make_history()
+
+    start = time.perf_counter()
+    client = await aioble.connect(link, timeout_ms=1000)
+    request = client.characteristic(REQUEST_CHARACTERISTICS_UUID)
+    response = client.characteristic(RESPONSE_CHARACTERISTICS_UUID)
+    await request.write(b"hello")
+    await response.indicated(timeout_ms=5000)
+    handshake = time.perf_counter() - start
+
+    # let the MTU exchange end before the commands
+    await asyncio.sleep(0.3)
+    start = time.perf_counter()
+    for _ in range(N_COMMANDS):
+        await request.write(b"data_mode")
+        await response.indicated(timeout_ms=5000)
+    command = (time.perf_counter() - start) / N_COMMANDS
+
+    results = {"handshake": handshake, "command": command, "mtu": wrapper._mtu}
+    for compressed in (False, True):
+        results["compressed" if compressed else "raw"] = await transfer(wrapper, client, history, compressed)
+    results["link"] = link.get_stats()
+
+    await client.disconnect()
+    await wrapper.destroy(timeout=1)
+    return results
+
+
+def main():
+    logging.disable(logging.WARNING)
+    for name, profile in PROFILES:
+        results = asyncio.run(run(profile))
+        print(f"{name}: {profile}")
+        print(f"  handshake: {results['handshake'] * 1000:.0f} ms, command round trip: "
+              f"{results['command'] * 1000:.1f} ms, MTU: {results['mtu']}")
+        for mode in ("raw", "compressed"):
+            elapsed, n_bytes = results[mode]
+            print(f"  history {mode}: {HISTORY_RECORDS} records, {n_bytes} bytes in {elapsed * 1000:.0f} ms, "
+                  f"{HISTORY_RECORDS / elapsed:.0f} records/s, {n_bytes / elapsed / 1024:.1f} KiB/s")
+        print(f"  link: {results['link']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Benchmark of the sensor stack on the hal fakes, run on a normal Python environment:
+#   python tests/benchmark/hal/benchmark_sensor_stack.py [--profile]
+# Samples the DHT20, PMS7003 and ZE07-CO drivers once a simulated second, with the sensors streaming on fake buses.
+# The drivers run on the simulated event loop of hal.virtual_time, which jumps to the next timer instead of waiting,
+# so the stack runs many times faster than real time, and the time measured is the processing time of the drivers and
+# of the event loop.
+
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import time
+
+# appended, so the standard logging module is used instead of the MicroPython one in the repository
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+from hal import I2C, UART
+from hal.devices import FakeDHT20, pms7003_frame, ze07co_frame
+from hal.virtual_time import VirtualClock
+from dht20 import DHT20
+from pms7003 import PMS7003
+from ze07co import ZE07CO
+
+SIMULATED_SECONDS = 3600
+PMS7003_FRAME_MS = 800
+ZE07CO_FRAME_MS = 1000
+
+
+def make_sensors():
+    bus = I2C(0)
+    bus.attach(0x38, FakeDHT20())
+    pms_uart = UART(1)
+    pms_uart.stream(lambda n: pms7003_frame(5 + n % 3, 12 + n % 5, 20 + n % 7), PMS7003_FRAME_MS)
+    co_uart = UART(0)
+    co_uart.stream(lambda n: ze07co_frame(10 + n % 4), ZE07CO_FRAME_MS)
+    return DHT20(bus=bus), PMS7003(bus=pms_uart), ZE07CO(bus=co_uart)
+
+
+async def run(virtual_clock, sensors):
+    for sensor in sensors:
+        await sensor.start(run_loop=False)
+    start = virtual_clock.elapsed()
+    readings = 0
+    while virtual_clock.elapsed() - start < SIMULATED_SECONDS:
+        epoch = virtual_clock.elapsed()
+        for sensor in sensors:
+            readings += await sensor.sample()
+        await asyncio.sleep(max(0, 1 - (virtual_clock.elapsed() - epoch)))
+    return readings
+
+
+def main():
+    virtual_clock = VirtualClock()
+    virtual_clock.install()
+    logging.disable(logging.WARNING)
+    sensors = make_sensors()
+
+    profiler = cProfile.Profile() if "--profile" in sys.argv else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    readings = virtual_clock.run(run(virtual_clock, sensors))
+    if profiler is not None:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    print(f"{SIMULATED_SECONDS} simulated s in {elapsed:.2f} s, {SIMULATED_SECONDS / elapsed:.0f}x real time, "
+          f"{readings} readings, {elapsed / readings * 1e6:.1f} us per reading")
+    for sensor in sensors:
+        print(f"  {sensor.__class__.__name__}: {sensor.get_health()}")
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Benchmark of the record store, run on a normal Python environment against a plain directory:
+#   python tests/benchmark/record_store/benchmark_record_store.py
+# Measures the append throughput for several batch sizes, the time to open and recover a full store, and the time to
+# find the records from a timestamp through the index against a scan of every record.
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+# appended, so the standard logging module is used instead of the MicroPython one in the repository
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+from record_store import RecordStore
+
+RECORD_SIZE = 16 # a history record
+N_RECORDS = 20000
+BATCH_SIZES = (1, 12, 64)
+SEGMENT_RECORDS = 512
+MAX_SEGMENTS = 16
+
+
+def benchmark_append(directory, batch_records):
+    store = RecordStore(directory, RECORD_SIZE, segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS,
+                        batch_records=batch_records)
+    store.open()
+    record = bytearray(RECORD_SIZE)
+
+    start = time.perf_counter()
+    for i in range(N_RECORDS):
+        struct.pack_into("<L", record, 0, i)
+        store.append(record)
+    store.flush()
+    elapsed = time.perf_counter() - start
+
+    stats = store.get_stats()
+    print(f"batch={batch_records:3d}: {N_RECORDS / elapsed:10.0f} records/s, {stats['flushes']:6d} flushes, "
+          f"{stats['evicted_segments']} evicted, {stats['records']} kept")
+
+
+def benchmark_recovery(directory):
+    # tear the tail of the newest segment like a power loss during a batch write
+    store = RecordStore(directory, RECORD_SIZE, segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS)
+    store.open()
+    path = store._segment_path(store.segments()[-1])
+    with open(path, "ab") as file:
+        file.write(b"\x00" * (RECORD_SIZE + 1) * 3 + b"\x01\x02")
+
+    store = RecordStore(directory, RECORD_SIZE, segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS)
+    start = time.perf_counter()
+    dropped = store.open()
+    elapsed = time.perf_counter() - start
+    print(f"open and recover: {elapsed * 1000:.2f} ms, {dropped} torn records dropped, {len(store)} records")
+
+
+def benchmark_lookup(directory):
+    store = RecordStore(directory, RECORD_SIZE, segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS)
+    start = time.perf_counter()
+    store.open()
+    elapsed = time.perf_counter() - start
+    print(f"open with saved indexes: {elapsed * 1000:.2f} ms, {store.get_stats()['index_rebuilds']} rebuilt")
+
+    timestamp = N_RECORDS - 100
+    start = time.perf_counter()
+    found = sum(1 for _ in store.since(timestamp))
+    indexed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanned = sum(1 for record in store.records() if struct.unpack_from("<L", record, 0)[0] >= timestamp)
+    scan = time.perf_counter() - start
+    print(f"since the last {found} records: {indexed * 1000:.3f} ms indexed, {scan * 1000:.3f} ms scanned "
+          f"({scanned} found)")
+
+
+def main():
+    root = tempfile.mkdtemp()
+    try:
+        for batch_records in BATCH_SIZES:
+            directory = os.path.join(root, f"batch_{batch_records}")
+            benchmark_append(directory, batch_records)
+        benchmark_recovery(os.path.join(root, f"batch_{BATCH_SIZES[-1]}"))
+        benchmark_lookup(os.path.join(root, f"batch_{BATCH_SIZES[-1]}"))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Shared helpers of the host-side tests and benchmarks, which run on a normal Python environment with the repository
+# root on sys.path (see conftest.py):
+#   from tests.helpers import make_history, make_context
+
+import clock
+from hal import I2C, UART, aioble
+from hal.devices import FakeDHT20, pms7003_frame, ze07co_frame
+from hal.virtual_time import VirtualClock
+from history import History
+from state import Context, AdvertiseState
+from state.context import HISTORY_CHANNELS
+
+EPOCH = 1_700_000_000
+
+# Two channels of the history, one signed and one unsigned, for the tests that read the records back by hand
+TWO_CHANNELS = (("temperature", "h"), ("pm2_5", "H"))
+
+# Time between the frames of the fake UART sensors
+FRAME_INTERVAL_MS = 1000
+
+
+def make_history(n_records, values, channels=HISTORY_CHANNELS, capacity=None, start=EPOCH, step=1):
+    """
+    Create a history of records `step` seconds apart from `start`.
+
+    Args:
+        n_records (int): the number of records appended.
+        values (Callable[[int], Sequence[int]]): the values of the record number, one per channel.
+        channels (Sequence[Tuple[str, str]]): the channels, those of the context by default.
+        capacity (Optional[int]): the capacity of the history. None for `n_records`.
+        start (int): the timestamp of the first record, in seconds.
+        step (int): the time between records, in seconds.
+
+    Returns:
+        History: the history.
+    """
+    history = History(n_records if capacity is None else capacity, channels)
+    for t in range(n_records):
+        history.append(start + step * t, values(t))
+    return history
+
+
+def install_virtual_clock(start_ms=0, epoch=EPOCH):
+    """
+    Install a virtual clock, with a system clock and a BLE stack starting afresh on it. Uninstall it once done.
+
+    Returns:
+        VirtualClock: the clock.
+    """
+    virtual_clock = VirtualClock(start_ms=start_ms, epoch=epoch)
+    virtual_clock.install()
+    clock.system_clock.__init__()
+    aioble.reset()
+    return virtual_clock
+
+
+def fake_buses(pms_frames=None, co_frames=None):
+    """
+    Create the buses of the sensors on hal fakes: a DHT20 on I2C, and the UART sensors streaming a frame every second.
+
+    Args:
+        pms_frames (Optional[bytes | Callable[[int], bytes]]): the PMS7003 frames, see `UART.stream()`.
+        co_frames (Optional[bytes | Callable[[int], bytes]]): the ZE07-CO frames.
+
+    Returns:
+        dict: the buses by sensor name, for the `buses` of the context.
+    """
+    i2c = I2C(0)
+    i2c.attach(0x38, FakeDHT20())
+    pms_uart = UART(1)
+    pms_uart.stream(pms7003_frame(5, 12, 20) if pms_frames is None else pms_frames, FRAME_INTERVAL_MS)
+    co_uart = UART(0)
+    co_uart.stream(ze07co_frame(10) if co_frames is None else co_frames, FRAME_INTERVAL_MS)
+    return {"dht20": i2c, "pms7003": pms_uart, "ze07co": co_uart}
+
+
+def make_context(tmp_path, monkeypatch, config="device_name = bioinfo-test", buses=None):
+    """
+    Create a context in the advertise state, working in `tmp_path` with the given config file.
+
+    Args:
+        config (str): the content of config.txt.
+        buses (Optional[dict]): the buses of the sensors, e.g. from `fake_buses()`.
+
+    Returns:
+        Context: the context.
+    """
+    (tmp_path / "config.txt").write_text(config)
+    monkeypatch.chdir(tmp_path)
+    return Context(AdvertiseState, buses=buses)
@@ -3,13 +3,20 @@
 import asyncio
 import bleak
 import struct
+import time
 from bleak import BleakScanner, BleakClient
 
+from history_codec import decode_block, compression_ratio
+
 
 DEVICE_NAMES = ("bioinfo", "my-device") # Max length is 15 characters
 
 # bioinfo-characteristics UUID
 _BIO_INFO_CHARACTERISTICS_UUID = "9fda7cce-48d4-4b1a-9026-6d46eec4e63a"
+# bioinfo-extended-characteristics UUID
+_BIO_INFO_EXTENDED_CHARACTERISTICS_UUID = "6aa2d0cc-1c0c-464f-9445-77f85cf79b5e"
+# history-characteristics UUID
+_HISTORY_CHARACTERISTICS_UUID = "fed58bcc-adb1-407d-baae-62c83a42d0aa"
 # request-characteristics UUID
 _REQUEST_CHARACTERISTICS_UUID = "4f2d7b8e-23b9-4bc7-905f-a8e3d7841f6a"
 # response-characteristics UUID
@@ -22,6 +29,55 @@ HANDSHAKE_MSG = "hello"
 HANDSHAKE_TIMEOUT = 3
 HANDSHAKE_RESPONSE = "howdy"
 
+# Extended bioinfo frame, see ble_wrapper/frames.py on the device
+EXTENDED_VERSION = 2
+EXTENDED_FORMAT = "<BHhHHHHHHHHHHHHI"
+EXTENDED_SIZE = struct.calcsize(EXTENDED_FORMAT)
+EXTENDED_FIELDS = (
+    ("temperature", 0.01),
+    ("humidity", 0.001),
+    ("pm1", 1),
+    ("pm2_5", 1),
+    ("pm10", 1),
+    ("n_0_3um", 1),
+    ("n_0_5um", 1),
+    ("n_1um", 1),
+    ("n_2_5um", 1),
+    ("n_5um", 1),
+    ("n_10um", 1),
+    ("co", 0.1),
+    ("co_range", 0.1)
+)
+
+# History record: timestamp, temperature, humidity, PM1, PM2.5, PM10 and CO, see HISTORY_CHANNELS on the device
+HISTORY_RECORD_FORMAT = "<LhHHHHH"
+HISTORY_RECORD_SIZE = struct.calcsize(HISTORY_RECORD_FORMAT)
+HISTORY_CHANNELS = HISTORY_RECORD_FORMAT[2:]
+HISTORY_DONE_RESPONSE = "HISTORY_DONE"
+HISTORY_TIMEOUT = 10
+
+
+def decode_extended(data):
+    """
+    Decode an extended bioinfo frame into a dict of physical values, None for the invalid fields.
+    """
+    version, mask, *values, timestamp = struct.unpack(EXTENDED_FORMAT, data)
+    if version != EXTENDED_VERSION:
+        raise ValueError(f"Unsupported frame version: {version}")
+    decoded = {"timestamp": timestamp}
+    for i, ((name, scale), value) in enumerate(zip(EXTENDED_FIELDS, values)):
+        decoded[name] = value * scale if mask & (1 << i) else None
+    return decoded
+
+
+def decode_extended_batch(data):
+    """
+    Decode a notification of back-to-back extended frames into a list of dicts, from the oldest to the newest.
+    """
+    if len(data) % EXTENDED_SIZE != 0:
+        raise ValueError(f"Batch of {len(data)} bytes is not a multiple of {EXTENDED_SIZE}")
+    return [decode_extended(data[i:i + EXTENDED_SIZE]) for i in range(0, len(data), EXTENDED_SIZE)]
+
 
 uuid_to_name = {
     "00001800-0000-1000-8000-00805f9b34fb": "Generic Access",
@@ -128,6 +184,7 @@ class Client:
                     await asyncio.wait_for(self.response_event.wait(), timeout=HANDSHAKE_TIMEOUT)
                     if self.response_msg == HANDSHAKE_RESPONSE:
                         print("Handshake success.")
+                        await self.sync_time(client)
                     else:
                         print(f"Handshake failed (Bad response). Response: {self.response_msg}")
                 except asyncio.TimeoutError:
@@ -146,12 +203,14 @@ class Client:
     async def ui_loop(self, client: BleakClient):
         while client.is_connected:
             self.stop_event.clear()
-            selection = input("Choose a characteristics to monitor (1-3) or (4) to send commands: ")
+            selection = input("Choose a characteristics to monitor (1-3), (4) to send commands or (5) to download the history: ")
 
             if selection == "1":
                 print("You've chosen the 'Machine-time characteristics'")
             elif selection == "2":
                 print("You've chosen the  'Bioinfo characteristics'")
+            elif selection == "3":
+                print("You've chosen the 'Bioinfo extended characteristics'")
             elif selection == "4":
                 self.response_event.clear()
                 cmd_str = input(f"Please enter the command string: (MTU={client.mtu_size})")
@@ -162,6 +221,16 @@ class Client:
                 except asyncio.TimeoutError:
                     print("Response timed out")
 
+            elif selection == "5":
+                since = input("Download the records since timestamp (default is 0): ")
+                try:
+                    since = int(since)
+                except ValueError:
+                    since = 0
+                compressed = input("Compressed? (Y/n): ").strip().lower() != "n"
+                await self.download_history(client, since, compressed)
+                continue
+
             else:
                 print("Invalid task selection. Please try again.")
                 continue
@@ -177,12 +246,29 @@ class Client:
                 except ValueError:
                     duration = 10
                 
-                task = asyncio.create_task(self.monitor_time(client)) if selection == "1" else asyncio.create_task(self.monitor_bioinfo(client)) 
+                if selection == 1:
+                    task = asyncio.create_task(self.monitor_time(client))
+                elif selection == 2:
+                    task = asyncio.create_task(self.monitor_bioinfo(client))
+                else:
+                    task = asyncio.create_task(self.monitor_bioinfo_extended(client))
                 await asyncio.sleep(duration)
                 self.stop_event.set()
                 await task
 
 
+    async def sync_time(self, client: BleakClient):
+        # the device stamps its readings with this time, so they need no re-alignment on this side
+        self.response_event.clear()
+        now = int(time.time())
+        await client.write_gatt_char(_REQUEST_CHARACTERISTICS_UUID, f"time {now}".encode("utf-8"), response=True)
+        try:
+            await asyncio.wait_for(self.response_event.wait(), timeout=HANDSHAKE_TIMEOUT)
+            print(f"Synced the device time to {now}")
+        except asyncio.TimeoutError:
+            print("Time sync timed out")
+
+
     async def monitor_time(self, client: BleakClient):
         while client.is_connected and not self.stop_event.is_set():
             data = await client.read_gatt_char(_MACHINE_TIME_CHARACTERISTICS_UUID)
@@ -201,7 +287,63 @@ class Client:
             print(f"bioinfo-characteristics: {unpacked_data}")
             await asyncio.sleep(1)
 
+
+    async def monitor_bioinfo_extended(self, client: BleakClient):
+        # read the latest frame, then follow the notified batches
+        data = await client.read_gatt_char(_BIO_INFO_EXTENDED_CHARACTERISTICS_UUID)
+        print(f"bioinfo-extended-characteristics: {decode_extended(data)}")
+
+        def batch_handler(sender, data):
+            samples = decode_extended_batch(data)
+            print(f"bioinfo-extended-characteristics: batch of {len(samples)} (MTU={client.mtu_size})")
+            for sample in samples:
+                print(f"  {sample}")
+
+        await client.start_notify(_BIO_INFO_EXTENDED_CHARACTERISTICS_UUID, batch_handler)
+        await self.stop_event.wait()
+        if client.is_connected:
+            await client.stop_notify(_BIO_INFO_EXTENDED_CHARACTERISTICS_UUID)
+
     
+    async def download_history(self, client: BleakClient, since, compressed=True):
+        """
+        Download the history records since a timestamp, raw or compressed. Returns the list of record tuples.
+        """
+        records = []
+        n_bytes = 0
+
+        def history_handler(sender, data):
+            nonlocal n_bytes
+            n_bytes += len(data)
+            if compressed:
+                records.extend(decode_block(data, HISTORY_CHANNELS))
+            else:
+                for offset in range(0, len(data), HISTORY_RECORD_SIZE):
+                    records.append(struct.unpack_from(HISTORY_RECORD_FORMAT, data, offset))
+
+        await client.start_notify(_HISTORY_CHARACTERISTICS_UUID, history_handler)
+        start = asyncio.get_running_loop().time()
+        command = "historyz" if compressed else "history"
+        await client.write_gatt_char(_REQUEST_CHARACTERISTICS_UUID, f"{command} {since}".encode("utf-8"), response=True)
+
+        # the device indicates progress responses along the way, then the done response
+        while True:
+            self.response_event.clear()
+            try:
+                await asyncio.wait_for(self.response_event.wait(), timeout=HISTORY_TIMEOUT)
+            except asyncio.TimeoutError:
+                print("History download timed out")
+                break
+            if self.response_msg is not None and self.response_msg.startswith(HISTORY_DONE_RESPONSE):
+                break
+
+        elapsed = asyncio.get_running_loop().time() - start
+        await client.stop_notify(_HISTORY_CHARACTERISTICS_UUID)
+        print(f"Downloaded {len(records)} records in {n_bytes} bytes in {elapsed:.2f} s, "
+              f"compression ratio {compression_ratio(len(records), n_bytes, HISTORY_RECORD_SIZE):.2f}")
+        return records
+
+
     def send_data(self, data):
         pass
 
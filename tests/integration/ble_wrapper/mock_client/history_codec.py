@@ -0,0 +1,72 @@
+# Decoder of the compressed history blocks, see history/codec.py on the device
+
+import struct
+
+CODEC_VERSION = 2
+RAW_FIRST_RECORD = 0x80
+BLOCK_HEADER_FORMAT = "<BBL"
+BLOCK_HEADER_SIZE = struct.calcsize(BLOCK_HEADER_FORMAT)
+
+# Size of a raw history record: a uint32 timestamp and six 16-bit channels
+RAW_RECORD_SIZE = 16
+
+
+def read_varint(data, offset):
+    """
+    Read an unsigned varint. Returns the value and the offset after it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def unzigzag(value):
+    return (value >> 1) if value & 1 == 0 else -((value + 1) >> 1)
+
+
+def decode_block(data, typecodes):
+    """
+    Decode one block into a list of records, each a tuple of the timestamp and the channel values.
+
+    The typecodes are those of the channels, e.g. "hH" for a signed and an unsigned 16-bit channel.
+    """
+    version, count, timestamp = struct.unpack_from(BLOCK_HEADER_FORMAT, data, 0)
+    raw_first_record = version & RAW_FIRST_RECORD
+    version &= ~RAW_FIRST_RECORD
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unsupported codec version: {version}")
+
+    offset = BLOCK_HEADER_SIZE
+    values = [0] * len(typecodes)
+    records = []
+    for i in range(count):
+        if i > 0:
+            delta, offset = read_varint(data, offset)
+            timestamp += delta
+        if i == 0 and raw_first_record:
+            values = list(struct.unpack_from("<" + typecodes, data, offset))
+            offset += struct.calcsize("<" + typecodes)
+        else:
+            for channel in range(len(typecodes)):
+                delta, offset = read_varint(data, offset)
+                values[channel] += unzigzag(delta)
+        records.append((timestamp, *values))
+
+    if offset != len(data):
+        raise ValueError(f"Block of {len(data)} bytes has {len(data) - offset} trailing bytes")
+    return records
+
+
+def compression_ratio(n_records, n_bytes, raw_record_size=RAW_RECORD_SIZE):
+    """
+    Ratio of the raw size of the records to their encoded size.
+    """
+    if n_bytes == 0:
+        return 0.0
+    return n_records * raw_record_size / n_bytes
@@ -0,0 +1,177 @@
+# Soak tests of the whole application on the hal fakes and simulated time, run on a normal Python environment:
+#   SOAK_DAYS=21 pytest tests/soak
+# Every test runs the context for SOAK_DAYS simulated days, 1 by default, starting an hour before time.ticks_ms()
+# wraps around. A simulated day takes about 12 s.
+
+import asyncio
+import gc
+import logging
+import os
+import struct
+import sys
+
+import clock
+from ble_wrapper.constants import BIO_INFO_CHARACTERISTICS_UUID, BIO_INFO_EXTENDED_CHARACTERISTICS_UUID
+from ble_wrapper.constants import MACHINE_TIME_CHARACTERISTICS_UUID, REQUEST_CHARACTERISTICS_UUID
+from ble_wrapper.constants import RESPONSE_CHARACTERISTICS_UUID, HISTORY_CHARACTERISTICS_UUID, HISTORY_DONE_RESPONSE
+from hal import aioble
+from hal.devices import pms7003_frame, ze07co_frame
+from hal.virtual_time import TICKS_PERIOD
+from state import DataState
+from state.context import UPDATE_INTERVAL
+from tests import helpers
+from tests.helpers import EPOCH, install_virtual_clock, fake_buses
+
+DAY = 86400 # seconds
+SOAK_DAYS = float(os.environ.get("SOAK_DAYS", 1))
+
+# The record store reaches its largest size after 16 segments of 512 records, under 12 hours at UPDATE_INTERVAL
+WARM_UP = 12 * 3600 # seconds
+
+
+def make_context(tmp_path, monkeypatch):
+    """Create a context on fake sensors streaming slowly varying readings, on a clock an hour before the wraparound."""
+    logging.disable(logging.CRITICAL)
+    virtual_clock = install_virtual_clock(start_ms=TICKS_PERIOD - 3600 * 1000)
+    buses = fake_buses(
+        pms_frames=lambda n: pms7003_frame(5 + n % 3, 12 + (n // 60) % 5, 20 + n % 7),
+        co_frames=lambda n: ze07co_frame(10 + (n // 300) % 4)
+    )
+    context = helpers.make_context(tmp_path, monkeypatch, config="device_name = soak", buses=buses)
+    return context, virtual_clock
+
+
+def allocated_blocks():
+    """The number of memory blocks allocated by the interpreter, once the garbage is collected."""
+    gc.collect()
+    return sys.getallocatedblocks()
+
+
+def finish(virtual_clock):
+    virtual_clock.uninstall()
+    logging.disable(logging.NOTSET)
+
+
+def check_history(context, end):
+    """The history is full and sorted, across the wraparound, up to the end of the run."""
+    history = context.history
+    assert len(history) == context.history_capacity
+    timestamps = [history.timestamps[history.index(i)] for i in range(len(history))]
+    assert all(later > earlier for earlier, later in zip(timestamps, timestamps[1:]))
+    assert end - UPDATE_INTERVAL <= timestamps[-1] <= end
+    assert context.record_store.last_timestamp() == timestamps[-1]
+
+
+# Soak tests
+
+def test_unattended(tmp_path, monkeypatch):
+    """
+    Without a client, every epoch is sampled on time through the wraparound, every reading is recorded, and memory
+    stops growing once the record store is full.
+    """
+    context, virtual_clock = make_context(tmp_path, monkeypatch)
+
+    async def run():
+        task = asyncio.create_task(context.start())
+        await asyncio.sleep(WARM_UP)
+        warm_blocks = allocated_blocks()
+        await asyncio.sleep(SOAK_DAYS * DAY - WARM_UP)
+        growth = allocated_blocks() - warm_blocks
+
+        stats = context.sampling_scheduler.get_stats()
+        health = {name: sensor.get_health() for name, sensor in context._sensors.items()}
+        uptime = clock.system_clock.uptime()
+        await context.destroy()
+        await task
+        return stats, health, uptime, growth
+
+    try:
+        stats, health, uptime, growth = virtual_clock.run(run())
+    finally:
+        finish(virtual_clock)
+
+    assert abs(stats["epochs"] - SOAK_DAYS * DAY / UPDATE_INTERVAL) <= 2
+    assert stats["overruns"] == 0
+    assert stats["max_latency_ms"] < UPDATE_INTERVAL * 1000
+    for name, sensor_health in health.items():
+        assert sensor_health["failures"] == 0, name
+        assert sensor_health["resets"] == 0, name
+    assert SOAK_DAYS * DAY - UPDATE_INTERVAL <= uptime <= SOAK_DAYS * DAY
+
+    check_history(context, EPOCH + SOAK_DAYS * DAY)
+    # a few dozen blocks come and go with the interpreter caches, a leak of one block per epoch would be thousands
+    assert growth < 1000
+
+
+def test_connected_client(tmp_path, monkeypatch):
+    """
+    A client connected for the whole run gets the readings at the update cadence, or the heartbeat when nothing moves,
+    sees the machine time tick, and reads back every record kept in flash.
+    """
+    context, virtual_clock = make_context(tmp_path, monkeypatch)
+    gaps = {"bioinfo": 0, "extended": 0}
+    received = {"bioinfo": 0, "extended": 0}
+
+    async def consume(characteristic, name):
+        last = None
+        while True:
+            await characteristic.notified()
+            now = virtual_clock.ticks_ms()
+            if last is not None:
+                gaps[name] = max(gaps[name], (now - last) % TICKS_PERIOD)
+            last = now
+            received[name] += 1
+
+    async def run():
+        task = asyncio.create_task(context.start())
+        await asyncio.sleep(60)
+        client = await aioble.connect(aioble.Link(interval_ms=30, mtu=185), timeout_ms=1000)
+        request = client.characteristic(REQUEST_CHARACTERISTICS_UUID)
+        response = client.characteristic(RESPONSE_CHARACTERISTICS_UUID)
+        await request.write(b"hello")
+        assert await response.indicated(timeout_ms=2000) == b"howdy"
+        bioinfo = client.characteristic(BIO_INFO_CHARACTERISTICS_UUID)
+        await bioinfo.subscribe()
+        consumers = [
+            asyncio.create_task(consume(bioinfo, "bioinfo")),
+            asyncio.create_task(consume(client.characteristic(BIO_INFO_EXTENDED_CHARACTERISTICS_UUID), "extended"))
+        ]
+        await request.write(f"time {EPOCH + 60}".encode())
+        assert await response.indicated(timeout_ms=1000) == b"OK"
+
+        await asyncio.sleep(SOAK_DAYS * DAY - 60)
+        assert isinstance(context._state, DataState)
+        machine_time = struct.unpack("<i", await client.characteristic(MACHINE_TIME_CHARACTERISTICS_UUID).read())[0]
+
+        # read back the whole record store, older than the history in RAM
+        history = client.characteristic(HISTORY_CHARACTERISTICS_UUID)
+        await request.write(b"historyz 0")
+        while not (await response.indicated(timeout_ms=10_000)).startswith(HISTORY_DONE_RESPONSE.encode()):
+            pass
+        n_records = 0
+        try:
+            while True:
+                n_records += (await history.notified(timeout_ms=0))[1]
+        except asyncio.TimeoutError:
+            pass
+
+        for consumer in consumers:
+            consumer.cancel()
+        await client.disconnect()
+        await context.destroy()
+        await task
+        return machine_time, n_records
+
+    try:
+        machine_time, n_records = virtual_clock.run(run())
+    finally:
+        finish(virtual_clock)
+
+    end = EPOCH + SOAK_DAYS * DAY
+    assert end - 2 <= machine_time <= end
+    max_silence = context.ble_wrapper.notify_policy.max_silence_ms
+    assert gaps["bioinfo"] <= max_silence + UPDATE_INTERVAL * 1000
+    assert received["bioinfo"] >= SOAK_DAYS * DAY * 1000 / (max_silence + UPDATE_INTERVAL * 1000)
+    assert received["extended"] > 0
+    assert n_records == len(context.record_store)
+    check_history(context, end)
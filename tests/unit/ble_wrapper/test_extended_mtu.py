@@ -0,0 +1,65 @@
+# Unit tests
+
+import asyncio
+
+from ble_wrapper import BLEWrapper, EXTENDED_FIELDS
+from ble_wrapper.constants import BIO_INFO_CHARACTERISTICS_UUID, BIO_INFO_EXTENDED_CHARACTERISTICS_UUID
+from ble_wrapper.constants import REQUEST_CHARACTERISTICS_UUID, RESPONSE_CHARACTERISTICS_UUID
+from ble_wrapper.frames import EXTENDED_SIZE
+from hal import aioble
+
+
+def run_session(mtu):
+    """Connect a client over a link of `mtu`, publish one update, and return what the client got."""
+    aioble.reset()
+
+    async def session():
+        wrapper = BLEWrapper()
+        await wrapper.start()
+        client = await aioble.connect(aioble.Link(interval_ms=5, mtu=mtu), timeout_ms=1000)
+        await client.characteristic(REQUEST_CHARACTERISTICS_UUID).write(b"hello")
+        assert await client.characteristic(RESPONSE_CHARACTERISTICS_UUID).indicated(timeout_ms=2000) == b"howdy"
+        await asyncio.sleep(0.05)
+
+        bioinfo = client.characteristic(BIO_INFO_CHARACTERISTICS_UUID)
+        extended = client.characteristic(BIO_INFO_EXTENDED_CHARACTERISTICS_UUID)
+        await bioinfo.subscribe()
+        await extended.subscribe()
+        wrapper.update_bioinfo_data(21.5, 0.4, 12.0, 1.5, extended=list(range(len(EXTENDED_FIELDS))), timestamp=1000)
+
+        legacy = await bioinfo.notified(timeout_ms=1000)
+        try:
+            notified = await extended.notified(timeout_ms=100)
+        except asyncio.TimeoutError:
+            notified = None
+        read = await extended.read()
+        stats = wrapper.get_notify_stats()
+
+        await client.disconnect()
+        await wrapper.destroy(timeout=1)
+        return legacy, notified, read, stats
+
+    return asyncio.run(session())
+
+
+def test_default_mtu():
+    """
+    At the default MTU of 23, the extended frame does not fit in a notification, so it is not notified but read whole,
+    while the legacy frame is notified.
+    """
+    legacy, notified, read, stats = run_session(23)
+    assert len(legacy) == 20
+    assert notified is None
+    assert len(read) == EXTENDED_SIZE
+    assert stats["batch_capacity"] == 0
+    assert stats["extended_skipped"] == 1
+
+
+def test_frame_fits():
+    """
+    From an MTU of 36 up, the extended frame is notified whole.
+    """
+    _, notified, _, stats = run_session(36)
+    assert len(notified) == EXTENDED_SIZE
+    assert stats["batch_capacity"] == 1
+    assert stats["extended_skipped"] == 0
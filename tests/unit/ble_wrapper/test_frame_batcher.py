@@ -0,0 +1,59 @@
+# Unit tests
+
+from ble_wrapper.frame_batcher import FrameBatcher, DEFAULT_ATT_MTU
+
+FRAME_SIZE = 33
+
+
+def make_frame(value):
+    return bytearray([value]) * FRAME_SIZE
+
+
+def test_capacity():
+    """
+    Batches hold as many frames as fit in the MTU payload, at most `max_frames`, and none if a frame does not fit.
+    """
+    batcher = FrameBatcher(FRAME_SIZE, 7, 1000)
+    assert batcher.capacity == 0
+    assert batcher.set_mtu(DEFAULT_ATT_MTU) == 0
+    assert batcher.set_mtu(36) == 1
+    assert batcher.set_mtu(103) == 3
+    assert batcher.set_mtu(247) == 7
+    assert batcher.set_mtu(512) == 7
+
+
+def test_full_batch():
+    """
+    A batch is ready once full, and flushing returns the frames back to back.
+    """
+    batcher = FrameBatcher(FRAME_SIZE, 7, 1000)
+    batcher.set_mtu(103)
+    assert not batcher.add(make_frame(1), now=0)
+    assert not batcher.add(make_frame(2), now=10)
+    assert batcher.add(make_frame(3), now=20)
+    assert bytes(batcher.flush()) == bytes(make_frame(1) + make_frame(2) + make_frame(3))
+    assert len(batcher) == 0
+    assert not batcher.is_ready(now=30)
+
+
+def test_max_delay():
+    """
+    A partial batch is ready once its oldest frame has waited for the max delay.
+    """
+    batcher = FrameBatcher(FRAME_SIZE, 7, 1000)
+    batcher.set_mtu(247)
+    assert not batcher.add(make_frame(1), now=0)
+    assert not batcher.add(make_frame(2), now=500)
+    assert not batcher.is_ready(now=999)
+    assert batcher.is_ready(now=1000)
+    assert len(batcher.flush()) == 2 * FRAME_SIZE
+
+
+def test_small_mtu():
+    """
+    With an MTU too small for two frames, every frame is its own batch.
+    """
+    batcher = FrameBatcher(FRAME_SIZE, 7, 1000)
+    batcher.set_mtu(50)
+    assert batcher.add(make_frame(1), now=0)
+    assert len(batcher.flush()) == FRAME_SIZE
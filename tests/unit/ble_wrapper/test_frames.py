@@ -0,0 +1,46 @@
+# Unit tests
+
+import struct
+
+from ble_wrapper.frames import EXTENDED_FIELDS, EXTENDED_FORMAT, EXTENDED_SIZE, EXTENDED_VERSION
+from history import INVALID_INT16
+from ble_wrapper.frames import pack_extended
+
+
+def test_size():
+    """
+    The extended frame fits in one notification with an ATT MTU of 36 bytes.
+    """
+    assert EXTENDED_SIZE == 33
+    assert EXTENDED_SIZE <= 36 - 3
+
+
+def test_pack_valid():
+    """
+    Every field is packed in order with its validity bit set.
+    """
+    values = [-1234] + list(range(1, len(EXTENDED_FIELDS)))
+    frame = bytearray(EXTENDED_SIZE)
+    pack_extended(frame, values, 1700000000)
+
+    version, mask, *fields, timestamp = struct.unpack(EXTENDED_FORMAT, frame)
+    assert version == EXTENDED_VERSION
+    assert mask == (1 << len(EXTENDED_FIELDS)) - 1
+    assert fields == values
+    assert timestamp == 1700000000
+
+
+def test_pack_invalid():
+    """
+    Invalid fields are sent as 0 with their validity bit cleared, and large values saturate.
+    """
+    values = [INVALID_INT16, 500] + [-1] * (len(EXTENDED_FIELDS) - 3) + [70000]
+    frame = bytearray(EXTENDED_SIZE)
+    pack_extended(frame, values, 0)
+
+    _, mask, *fields, _ = struct.unpack(EXTENDED_FORMAT, frame)
+    assert mask == (1 << 1) | (1 << (len(EXTENDED_FIELDS) - 1))
+    assert fields[0] == 0
+    assert fields[1] == 500
+    assert fields[2] == 0
+    assert fields[-1] == 0xFFFF
@@ -0,0 +1,153 @@
+# Unit tests
+
+import asyncio
+import struct
+
+from ble_wrapper import BLEWrapper
+from ble_wrapper.constants import REQUEST_CHARACTERISTICS_UUID, RESPONSE_CHARACTERISTICS_UUID, HISTORY_DONE_RESPONSE
+from hal import aioble
+from record_store import RecordStore
+from tests import helpers
+from tests.helpers import TWO_CHANNELS, install_virtual_clock
+
+
+class FakeCharacteristic:
+    def __init__(self):
+        self.notifications = []
+
+    def notify(self, connection, data):
+        self.notifications.append(bytes(data))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+
+def make_wrapper(mtu, acknowledge=True):
+    wrapper = BLEWrapper()
+    wrapper.history_characteristic = FakeCharacteristic()
+    wrapper._connection = FakeConnection()
+    wrapper._mtu = mtu
+    wrapper.responses = []
+
+    async def send_response(msg):
+        wrapper.responses.append(msg)
+        return acknowledge
+
+    wrapper.send_response = send_response
+    return wrapper
+
+
+def make_history(n_records):
+    return helpers.make_history(n_records, lambda t: (t, t * 2), channels=TWO_CHANNELS, capacity=64, start=100)
+
+
+def test_send_history():
+    """
+    The records since the timestamp are sent in MTU-sized notifications, then the transfer is reported done.
+    """
+    wrapper = make_wrapper(mtu=23)
+    n_records = asyncio.run(wrapper.send_history(make_history(10), 103))
+    assert n_records == 7
+
+    # 20-byte payloads hold 2 records of 8 bytes
+    notifications = wrapper.history_characteristic.notifications
+    assert [len(data) for data in notifications] == [16, 16, 16, 8]
+    records = [struct.unpack_from("<LhH", data, i) for data in notifications for i in range(0, len(data), 8)]
+    assert records == [(100 + t, t, t * 2) for t in range(3, 10)]
+    assert wrapper.responses == ["HISTORY_DONE 7"]
+
+
+def test_send_history_windows():
+    """
+    A progress response is acknowledged after every window of notifications, and the transfer stops without it.
+    """
+    wrapper = make_wrapper(mtu=11)
+    assert asyncio.run(wrapper.send_history(make_history(40), 0)) == 40
+    assert wrapper.responses == ["HISTORY 16", "HISTORY 32", "HISTORY_DONE 40"]
+
+    wrapper = make_wrapper(mtu=11, acknowledge=False)
+    assert asyncio.run(wrapper.send_history(make_history(40), 0)) == -1
+    assert len(wrapper.history_characteristic.notifications) == 16
+
+
+def test_send_history_compressed():
+    """
+    Compressed transfers send one block per notification and count the records of every block.
+    """
+    wrapper = make_wrapper(mtu=23)
+    assert asyncio.run(wrapper.send_history(make_history(30), 100, compressed=True)) == 30
+    notifications = wrapper.history_characteristic.notifications
+    assert all(len(data) <= 20 for data in notifications)
+    assert sum(data[1] for data in notifications) == 30
+    assert wrapper.responses[-1] == "HISTORY_DONE 30"
+
+
+def test_send_history_from_store(tmp_path):
+    """
+    Records older than the history are read from the store, raw or compressed.
+    """
+    history = make_history(60) # keeps the latest 64 records only
+    store = RecordStore(str(tmp_path), history.record_size, segment_records=16, batch_records=4, index_interval=4)
+    store.open()
+    record = bytearray(history.record_size)
+    for t in range(100):
+        struct.pack_into("<LhH", record, 0, t, t, t * 2)
+        store.append(record)
+
+    wrapper = make_wrapper(mtu=23)
+    assert asyncio.run(wrapper.send_history(history, 90, store=store)) == 10
+    notifications = wrapper.history_characteristic.notifications
+    records = [struct.unpack_from("<LhH", data, i) for data in notifications for i in range(0, len(data), 8)]
+    assert records == [(t, t, t * 2) for t in range(90, 100)]
+
+    wrapper = make_wrapper(mtu=23)
+    assert asyncio.run(wrapper.send_history(history, 37, compressed=True, store=store)) == 63
+
+    # the history reaches back far enough
+    wrapper = make_wrapper(mtu=23)
+    assert asyncio.run(wrapper.send_history(history, 150, store=store)) == 10
+
+
+def test_command_during_transfer():
+    """
+    A command written during a transfer waits for the progress response being indicated, and is answered between
+    the progress responses while the transfer completes.
+    """
+    virtual_clock = install_virtual_clock()
+    history = make_history(64)
+
+    async def session():
+        wrapper = BLEWrapper()
+        await wrapper.start()
+        client = await aioble.connect(aioble.Link(interval_ms=10, mtu=23), timeout_ms=1000)
+        request = client.characteristic(REQUEST_CHARACTERISTICS_UUID)
+        response = client.characteristic(RESPONSE_CHARACTERISTICS_UUID)
+        await request.write(b"hello")
+        assert await response.indicated(timeout_ms=2000) == b"howdy"
+        await asyncio.sleep(0.3)
+
+        # 2 records per notification, so a progress response after the first 32 records
+        sending = asyncio.create_task(wrapper.send_history(history, 0))
+        await asyncio.sleep(0.01)
+        await request.write(b"data_mode")
+        responses = []
+        while not responses or not responses[-1].startswith(HISTORY_DONE_RESPONSE.encode()):
+            responses.append(bytes(await response.indicated(timeout_ms=5000)))
+        n_records = await sending
+
+        await client.disconnect()
+        await wrapper.destroy(timeout=1)
+        return responses, n_records
+
+    try:
+        responses, n_records = virtual_clock.run(session())
+    finally:
+        virtual_clock.uninstall()
+
+    assert n_records == 64
+    assert sorted(responses) == [b"HISTORY 32", b"HISTORY 64", b"HISTORY_DONE 64", b"OK"]
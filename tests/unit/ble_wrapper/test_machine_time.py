@@ -0,0 +1,62 @@
+# Unit tests
+
+import asyncio
+import struct
+
+from ble_wrapper import BLEWrapper
+
+
+class FakeCharacteristic:
+    def __init__(self):
+        self.values = []
+
+    def write(self, data, send_update=False):
+        self.values.append(struct.unpack("<i", data)[0])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+
+def test_update_only_while_connected(monkeypatch):
+    """
+    The machine time is written every second while the client stays connected, and the service ends with the
+    connection.
+    """
+    wrapper = BLEWrapper()
+    wrapper.machine_time_characteristics = FakeCharacteristic()
+    connection = FakeConnection()
+    wrapper._connection = connection
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            connection.connected = False
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    asyncio.run(wrapper._update_time_service())
+    assert sleeps == [1, 1, 1]
+    assert len(wrapper.machine_time_characteristics.values) == 3
+
+    # nothing is written without a client
+    wrapper._connection = None
+    asyncio.run(wrapper._update_time_service())
+    assert len(wrapper.machine_time_characteristics.values) == 3
+
+
+def test_not_started_with_advertising():
+    """
+    Starting the BLE module does not start the machine time service before a client connects.
+    """
+    async def start():
+        wrapper = BLEWrapper()
+        await wrapper.start()
+        assert wrapper._machine_time_task is None
+        wrapper._peripheral_task.cancel()
+
+    asyncio.run(start())
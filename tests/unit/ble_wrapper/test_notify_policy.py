@@ -0,0 +1,76 @@
+# Unit tests
+
+from ble_wrapper.notify_policy import NotifyPolicy
+
+INVALID = float("-inf")
+
+
+def make_data(temperature=25.0, humidity=0.5, pm2_5=10, co_concentration=1.0):
+    return {
+        "temperature": temperature,
+        "humidity": humidity,
+        "pm2_5": pm2_5,
+        "co_concentration": co_concentration,
+        "last_update": 0
+    }
+
+
+def test_deadband():
+    """
+    Only changes past the deadband since the latest notification are notified.
+    """
+    policy = NotifyPolicy()
+    assert policy.should_notify(make_data(), now=0)
+    assert not policy.should_notify(make_data(temperature=25.05), now=100)
+    assert not policy.should_notify(make_data(pm2_5=10.5), now=200)
+    assert policy.should_notify(make_data(pm2_5=11), now=300)
+    assert not policy.should_notify(make_data(pm2_5=11.5), now=400)
+    assert policy.get_stats() == {"sent": 2, "suppressed": 3}
+
+
+def test_validity_change():
+    """
+    A field becoming invalid or valid again is always notified.
+    """
+    policy = NotifyPolicy()
+    assert policy.should_notify(make_data(), now=0)
+    assert policy.should_notify(make_data(temperature=INVALID), now=100)
+    assert not policy.should_notify(make_data(temperature=INVALID), now=200)
+    assert policy.should_notify(make_data(), now=300)
+
+
+def test_heartbeat():
+    """
+    An unchanged value is notified again once the max silence expires.
+    """
+    policy = NotifyPolicy(max_silence_ms=1000)
+    assert policy.should_notify(make_data(), now=0)
+    assert not policy.should_notify(make_data(), now=999)
+    assert policy.should_notify(make_data(), now=1000)
+
+
+def test_set_deadband():
+    """
+    Deadbands can be changed per field, and unknown fields or negative deadbands are rejected.
+    """
+    policy = NotifyPolicy()
+    policy.set_deadband("pm2_5", 0)
+    assert policy.should_notify(make_data(), now=0)
+    assert policy.should_notify(make_data(pm2_5=10.1), now=100)
+
+    for field, deadband in (("ozone", 1.0), ("pm2_5", -1.0)):
+        try:
+            policy.set_deadband(field, deadband)
+            assert False
+        except ValueError:
+            pass
+
+
+def test_reset():
+    """
+    After a reset, the next update is notified even if nothing changed.
+    """
+    policy = NotifyPolicy()
+    assert policy.should_notify(make_data(), now=0)
+    policy.reset()
+    assert policy.should_notify(make_data(), now=100)
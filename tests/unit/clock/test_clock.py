@@ -0,0 +1,77 @@
+# Unit tests
+
+import time
+
+from clock import Clock
+from hal import RTC
+
+TICKS_MAX = 0x3FFFFFFF
+
+
+class FakeTicks:
+    def __init__(self, start):
+        self.ticks = start
+
+    def __call__(self):
+        return self.ticks
+
+    def advance(self, ms):
+        self.ticks = (self.ticks + ms) & TICKS_MAX
+
+
+def make_clock(monkeypatch, start_ticks=0, rtc_time=1_600_000_000):
+    ticks = FakeTicks(start_ticks)
+    monkeypatch.setattr(time, "ticks_ms", ticks)
+    monkeypatch.setattr(time, "time", lambda: rtc_time)
+    return Clock(), ticks
+
+
+def test_uptime_across_wraparound(monkeypatch):
+    """
+    The uptime keeps counting when the ticks wrap around.
+    """
+    clock, ticks = make_clock(monkeypatch, start_ticks=TICKS_MAX - 1500)
+    ticks.advance(1200)
+    assert clock.uptime_ms() == 1200
+    ticks.advance(2500) # wraps
+    assert clock.uptime_ms() == 3700
+    assert clock.uptime() == 3
+
+    # read every hour for a month, several times the ticks period
+    for _ in range(24 * 31):
+        ticks.advance(3600 * 1000)
+        clock.uptime_ms()
+    assert clock.uptime() == 3 + 24 * 31 * 3600
+
+
+def test_sync(monkeypatch):
+    """
+    Syncing offsets the wall clock, sets the RTC, and the time never goes back.
+    """
+    clock, ticks = make_clock(monkeypatch)
+    ticks.advance(10_000)
+    assert clock.now() == 1_600_000_010
+    assert not clock.synced
+
+    assert clock.sync(1_700_000_000) == 99_999_990
+    assert clock.synced
+    assert RTC().datetime() == (2023, 11, 14, 1, 22, 13, 20, 0)
+    ticks.advance(5000)
+    assert clock.now() == 1_700_000_005
+
+    # a step backwards holds the time until it catches up
+    assert clock.sync(1_699_999_998) == -7
+    assert clock.now() == 1_700_000_005
+    ticks.advance(8000)
+    assert clock.now() == 1_700_000_006
+
+
+def test_hold(monkeypatch):
+    """
+    A held timestamp, e.g. from before a reboot, is the earliest time returned.
+    """
+    clock, ticks = make_clock(monkeypatch)
+    clock.hold(1_650_000_000)
+    assert clock.now() == 1_650_000_000
+    clock.sync(1_700_000_000)
+    assert clock.now() == 1_700_000_000
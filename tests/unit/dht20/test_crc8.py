@@ -0,0 +1,29 @@
+# Unit tests
+
+from dht20.crc8 import crc8, CRC8_TABLE
+
+
+def test_table():
+    """
+    The lookup table has one entry per byte value.
+    """
+    assert len(CRC8_TABLE) == 256
+    assert CRC8_TABLE[0] == 0x00
+    assert CRC8_TABLE[1] == 0x31
+
+
+def test_crc8():
+    """
+    CRC-8 with polynomial 0x31 and initial value 0xFF matches the reference values.
+    """
+    assert crc8(b'\xBE\xEF', 2) == 0x92
+    assert crc8(b'123456789', 9) == 0xF7
+
+
+def test_crc8_prefix():
+    """
+    Only the first `length` bytes are included, so the CRC byte can stay in the frame.
+    """
+    frame = bytearray(b'\x1C\x80\x00\x05\x66\x66\x00')
+    frame[6] = crc8(frame, 6)
+    assert crc8(frame, 6) == frame[6]
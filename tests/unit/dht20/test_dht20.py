@@ -0,0 +1,166 @@
+# Unit tests
+
+import asyncio
+import time
+
+from dht20 import DHT20
+from dht20.dht20 import POLL_BACKOFF_MAX
+from hal import I2C
+from hal.devices import FakeDHT20
+from hal.virtual_time import VirtualClock
+
+
+class LoggedDHT20(FakeDHT20):
+    """DHT20 model that logs the time of every read."""
+
+    def __init__(self, log, **kwargs):
+        super().__init__(**kwargs)
+        self.log = log
+
+    def read(self, nbytes):
+        self.log.append(("poll", time.ticks_ms()))
+        return super().read(nbytes)
+
+
+def make_sensor(log, measurement_ms, single_read=True):
+    i2c = I2C(0)
+    i2c.attach(0x38, LoggedDHT20(log, measurement_ms=measurement_ms))
+    return DHT20(bus=i2c, single_read=single_read)
+
+
+def test_poll_backoff():
+    """
+    While the sensor is busy, the status is polled with a doubling backoff capped at POLL_BACKOFF_MAX, yielding to
+    the other tasks between polls, and the read latency counts from the measurement command.
+    """
+    log = []
+    sensor = make_sensor(log, measurement_ms=300)
+
+    async def other():
+        while True:
+            await asyncio.sleep(0.02)
+            log.append(("other", None))
+
+    async def main():
+        task = asyncio.create_task(other())
+        data = await sensor._acquire()
+        task.cancel()
+        return data
+
+    with VirtualClock() as clock:
+        data = clock.run(main())
+
+    assert data is not None
+    polls = [ms for name, ms in log if name == "poll"]
+    # the command is sent at 10 ms, the first poll follows the 80 ms measurement time, the sensor is ready at 310 ms
+    assert polls[0] == 90
+    gaps = [later - earlier for earlier, later in zip(polls, polls[1:])]
+    assert gaps == [5, 10, 20, 40, 40, 40, 40, 40]
+    assert max(gaps) == int(POLL_BACKOFF_MAX * 1000)
+
+    # the other task ran between the first and the last poll
+    names = [name for name, _ in log]
+    first_poll = names.index("poll")
+    last_poll = len(names) - 1 - names[::-1].index("poll")
+    assert "other" in names[first_poll:last_poll]
+
+    assert sensor.get_read_latency() == {"last_ms": 315, "max_ms": 315, "polls": 9}
+
+
+def test_read_latency_max():
+    """
+    The latest latency follows every read while the maximum keeps the longest one.
+    """
+    log = []
+    sensor = make_sensor(log, measurement_ms=100)
+
+    async def main():
+        await sensor._acquire()
+        sensor._i2c._devices[0x38].measurement_ms = 50
+        await sensor._acquire()
+
+    with VirtualClock() as clock:
+        clock.run(main())
+
+    # first read: ready at 110 ms, polled at 90, 95, 105 and 125; second read: ready at once after the 80 ms wait
+    assert sensor.get_read_latency() == {"last_ms": 80, "max_ms": 115, "polls": 1}
+
+
+def test_poll_backoff_status_word():
+    """
+    Without single reads, the status word is polled with the same backoff before the data is read.
+    """
+    log = []
+    sensor = make_sensor(log, measurement_ms=120, single_read=False)
+
+    with VirtualClock() as clock:
+        data = clock.run(sensor._acquire())
+
+    assert len(data) == 6
+    assert sensor.get_read_latency() == {"last_ms": 155, "max_ms": 155, "polls": 5}
+
+
+# The raw 20-bit fields at the bottom, the middle and the top of the range, and the expected fixed-point values
+RAW_TABLE = [
+    (0, 0, -5000),
+    (1 << 19, 500, 5000),
+    ((1 << 20) - 1, 1000, 15000),
+]
+
+# The largest small int of MicroPython on the RP2040, which has 31-bit small ints
+SMALL_INT_MAX = (1 << 30) - 1
+
+
+def frame(raw_humidity, raw_temperature):
+    """The data of the sensor, starting with the status word, for the raw fields."""
+    return bytearray((
+        0x1C,
+        raw_humidity >> 12,
+        (raw_humidity >> 4) & 0xFF,
+        ((raw_humidity & 0x0F) << 4) | (raw_temperature >> 16),
+        (raw_temperature >> 8) & 0xFF,
+        raw_temperature & 0xFF
+    ))
+
+
+def test_parse_raw():
+    """
+    Both 20-bit fields are extracted across the byte they share, at both ends and the middle of the range.
+    """
+    sensor = make_sensor([], measurement_ms=80)
+    for raw, _, _ in RAW_TABLE:
+        for other, _, _ in RAW_TABLE:
+            assert sensor._parse_raw(frame(raw, other)) == (raw, other)
+
+
+def test_parse_fixed_point():
+    """
+    The fixed-point values match the table at both ends and the middle of the range.
+    """
+    sensor = make_sensor([], measurement_ms=80)
+    for raw, humidity_permille, temperature_centi in RAW_TABLE:
+        assert sensor._parse_fixed_point(raw, raw) == (humidity_permille, temperature_centi)
+
+
+def test_parse_fixed_point_rounding():
+    """
+    The fixed-point values are the exact conversions rounded to nearest, ties up, and every intermediate product fits
+    in a small int.
+    """
+    sensor = make_sensor([], measurement_ms=80)
+    raws = [raw for raw, _, _ in RAW_TABLE] + [1572, 1573, 1 << 16, 3 << 15, 12345, 987654]
+    for raw in raws:
+        # raw * 1000 / 2^20 and raw * 20000 / 2^20, rounded half up with integers only
+        expected_humidity = (raw * 2000 + (1 << 20)) >> 21
+        expected_temperature = ((raw * 40000 + (1 << 20)) >> 21) - 5000
+        assert sensor._parse_fixed_point(raw, raw) == (expected_humidity, expected_temperature)
+
+    # the products of the largest raw value, before the shifts
+    top = (1 << 20) - 1
+    assert top * 125 + (1 << 16) <= SMALL_INT_MAX
+    assert top * 625 + (1 << 14) <= SMALL_INT_MAX
+
+    # 1572 and 1573 fall on both sides of 1.5 per mille, 2^16 exactly on 62.5
+    assert sensor._parse_fixed_point(1572, 0)[0] == 1
+    assert sensor._parse_fixed_point(1573, 0)[0] == 2
+    assert sensor._parse_fixed_point(1 << 16, 0)[0] == 63
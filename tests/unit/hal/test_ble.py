@@ -0,0 +1,199 @@
+# Unit tests
+
+import asyncio
+
+import pytest
+
+from ble_wrapper import BLEWrapper
+from ble_wrapper.constants import REQUEST_CHARACTERISTICS_UUID, RESPONSE_CHARACTERISTICS_UUID
+from hal import UUID, aioble
+
+SERVICE_UUID = UUID(0x181A)
+VALUE_UUID = UUID(0x2A6E)
+COMMAND_UUID = UUID(0x2A6F)
+
+
+def make_server():
+    aioble.reset()
+    service = aioble.Service(SERVICE_UUID)
+    value = aioble.Characteristic(service, VALUE_UUID, read=True, notify=True, indicate=True)
+    command = aioble.Characteristic(service, COMMAND_UUID, write=True, capture=True)
+    aioble.register_services(service)
+    return value, command
+
+
+def test_wrapper_handshake_and_command():
+    """
+    A central completes the handshake of the BLE wrapper, gets the MTU of its link, and a command is acknowledged.
+    """
+    aioble.reset()
+
+    async def session():
+        wrapper = BLEWrapper()
+        await wrapper.start()
+        client = await aioble.connect(aioble.Link(interval_ms=5, mtu=100), timeout_ms=1000)
+        request = client.characteristic(REQUEST_CHARACTERISTICS_UUID)
+        response = client.characteristic(RESPONSE_CHARACTERISTICS_UUID)
+
+        await request.write(b"hello")
+        assert await response.indicated(timeout_ms=2000) == b"howdy"
+        await asyncio.sleep(0.05)
+        assert wrapper._mtu == 100
+
+        await request.write(b"data_mode")
+        assert await response.indicated(timeout_ms=1000) == b"OK"
+
+        # requests longer than the default 20-byte value buffer arrive whole
+        await request.write(b"deadband co_concentration=0.1")
+        assert await response.indicated(timeout_ms=1000) == b"OK"
+        assert wrapper.request_characteristic.read() == b"deadband co_concentration=0.1"
+
+        await client.disconnect()
+        await asyncio.sleep(0.01)
+        assert not wrapper.is_connected()
+        await wrapper.destroy(timeout=1)
+
+    asyncio.run(session())
+
+
+def test_wrapper_destroy():
+    """
+    The BLE wrapper is destroyed without waiting for a client while advertising, nor for a request while connected,
+    only for the machine time service to end its 1 s sleep.
+    """
+    async def session(connect):
+        aioble.reset()
+        wrapper = BLEWrapper()
+        await wrapper.start()
+        if connect:
+            client = await aioble.connect(aioble.Link(interval_ms=5), timeout_ms=1000)
+            await client.characteristic(REQUEST_CHARACTERISTICS_UUID).write(b"hello")
+            assert await client.characteristic(RESPONSE_CHARACTERISTICS_UUID).indicated(timeout_ms=2000) == b"howdy"
+            await asyncio.sleep(0.05)
+        else:
+            await asyncio.sleep(0.05)
+        return await wrapper.destroy(timeout=2)
+
+    for connect, longest_ms in ((False, 100), (True, 1100)):
+        report = asyncio.run(session(connect))
+        assert report["overrun"] == []
+        assert report["elapsed_ms"] < longest_ms
+
+
+def test_loss_keeps_order():
+    """
+    Lost packets are sent again on later connection events, so every notification arrives, in order, and late.
+    """
+    value, _ = make_server()
+
+    async def session():
+        link = aioble.Link(interval_ms=5, loss=0.5, packets_per_event=2, seed=1)
+        advertising = asyncio.create_task(aioble.advertise(100_000))
+        client = await aioble.connect(link)
+        connection = await advertising
+        for i in range(20):
+            value.notify(connection, bytes([i]))
+        received = client.characteristic(VALUE_UUID)
+        assert [await received.notified(timeout_ms=1000) for _ in range(20)] == [bytes([i]) for i in range(20)]
+        return link.get_stats()
+
+    stats = asyncio.run(session())
+    assert stats["packets"] == 20
+    assert stats["retransmissions"] > 0
+
+
+def test_mtu_and_permissions():
+    """
+    Values are cut to the ATT MTU, exchanged with the central's limit, and the characteristic flags are enforced.
+    """
+    value, command = make_server()
+
+    async def session():
+        advertising = asyncio.create_task(aioble.advertise(100_000))
+        client = await aioble.connect(aioble.Link(interval_ms=5, mtu=64))
+        connection = await advertising
+        received = client.characteristic(VALUE_UUID)
+
+        value.notify(connection, bytes(100))
+        assert len(await received.notified(timeout_ms=1000)) == 20
+        assert await connection.exchange_mtu(247, timeout_ms=1000) == 64
+        value.notify(connection, bytes(100))
+        assert len(await received.notified(timeout_ms=1000)) == 61
+
+        # only subscribed centrals get the updates
+        value.write(b"\x01", send_update=True)
+        await received.subscribe(timeout_ms=1000)
+        value.write(b"\x02", send_update=True)
+        assert await received.notified(timeout_ms=1000) == b"\x02"
+        assert await received.read() == b"\x02"
+
+        with pytest.raises(aioble.GattError):
+            await received.write(b"\x03")
+        with pytest.raises(ValueError):
+            await client.characteristic(COMMAND_UUID).write(bytes(62))
+
+        # captured writes are all kept, with their connection
+        sender = client.characteristic(COMMAND_UUID)
+        await sender.write(b"a")
+        await sender.write(b"b")
+        assert await command.written(timeout_ms=1000) == (connection, b"a")
+        assert await command.written(timeout_ms=1000) == (connection, b"b")
+        assert client.characteristic(UUID(0x2A00)) is None
+
+    asyncio.run(session())
+
+
+def test_write_buffer():
+    """
+    Writes from a central are cut to the value buffer, 20 bytes unless the initial value or a local write is larger.
+    """
+    aioble.reset()
+    service = aioble.Service(SERVICE_UUID)
+    short = aioble.Characteristic(service, VALUE_UUID, write=True)
+    sized = aioble.Characteristic(service, COMMAND_UUID, write=True, initial=bytes(40))
+    aioble.register_services(service)
+
+    async def session():
+        advertising = asyncio.create_task(aioble.advertise(100_000))
+        client = await aioble.connect(aioble.Link(interval_ms=5, mtu=100))
+        connection = await advertising
+        await connection.exchange_mtu(100, timeout_ms=1000)
+        await client.characteristic(VALUE_UUID).write(bytes(range(30)))
+        assert short.read() == bytes(range(20))
+        await client.characteristic(COMMAND_UUID).write(bytes(range(30)))
+        assert sized.read() == bytes(range(30))
+
+        short.write(bytes(30))
+        await client.characteristic(VALUE_UUID).write(bytes(range(30)))
+        assert short.read() == bytes(range(30))
+
+    asyncio.run(session())
+
+
+def test_disconnection_and_timeouts():
+    """
+    Replies awaited when the connection drops raise DeviceDisconnectedError, and waits without a reply time out.
+    """
+    value, command = make_server()
+
+    async def session():
+        advertising = asyncio.create_task(aioble.advertise(100_000))
+        client = await aioble.connect(aioble.Link(interval_ms=50))
+        connection = await advertising
+
+        with pytest.raises(asyncio.TimeoutError):
+            await command.written(timeout_ms=10)
+
+        indication = asyncio.create_task(value.indicate(connection, b"\x01"))
+        await asyncio.sleep(0)
+        await client.disconnect()
+        with pytest.raises(aioble.DeviceDisconnectedError):
+            await indication
+        with pytest.raises(aioble.DeviceDisconnectedError):
+            value.notify(connection)
+        await connection.disconnected(timeout_ms=10)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await aioble.connect(timeout_ms=10)
+
+    asyncio.run(session())
@@ -0,0 +1,137 @@
+# Unit tests
+
+import asyncio
+import time
+
+import pytest
+
+from dht20 import DHT20
+from hal import UART, I2C, ADC, NeoPixel, Pin
+from hal.devices import FakeDHT20, pms7003_frame, ze07co_frame
+from pms7003 import PMS7003
+from ze07co import ZE07CO
+
+
+class FakeTicks:
+    def __init__(self):
+        self.ticks = 1000
+
+    def __call__(self):
+        return self.ticks
+
+
+def test_uart_scripts(monkeypatch):
+    """
+    Fed bytes arrive at once, scheduled and streamed bytes when their time comes, and a full FIFO drops bytes.
+    """
+    ticks = FakeTicks()
+    monkeypatch.setattr(time, "ticks_ms", ticks)
+    uart = UART(0, rxbuf=8)
+    uart.feed(b"ab")
+    uart.schedule(b"cd", 50)
+    uart.stream(lambda n: bytes([n]), 100)
+    assert uart.read() == b"ab"
+    assert uart.any() == 0 and uart.read() is None
+
+    ticks.ticks += 100
+    buffer = bytearray(4)
+    assert uart.readinto(buffer) == 3
+    assert buffer[:3] == b"cd\x00"
+
+    ticks.ticks += 1000 # 10 frames of one byte, 8 fit
+    assert uart.read() == bytes(range(1, 9))
+    assert uart.overflows == 2
+
+    assert uart.write(b"\x01\x02") == 2
+    assert uart.written == b"\x01\x02"
+
+
+def test_i2c_and_peripherals():
+    """
+    A missing I2C device raises like a missing acknowledgement, the ADC returns its programmed values and the
+    NeoPixel strip keeps the colors written.
+    """
+    i2c = I2C(0)
+    with pytest.raises(OSError):
+        i2c.readfrom(0x38, 1)
+    i2c.attach(0x38, FakeDHT20())
+    assert i2c.scan() == [0x38]
+
+    adc = ADC(Pin(28))
+    adc.program([100, 200])
+    assert [adc.read_u16() for _ in range(3)] == [100, 200, 200]
+
+    strip = NeoPixel(Pin(11), 2)
+    strip.fill((1, 2, 3))
+    assert strip.shown == [(0, 0, 0), (0, 0, 0)]
+    strip.write()
+    assert strip.shown == [(1, 2, 3), (1, 2, 3)] and strip.writes == 1
+
+
+def test_dht20_on_fake_bus():
+    """
+    The DHT20 driver reads the fake device through the I2C fake, and rejects a corrupted frame.
+    """
+    bus = I2C(0)
+    device = FakeDHT20(temperature=23.5, humidity=0.6)
+    bus.attach(0x38, device)
+    sensor = DHT20(bus=bus)
+
+    async def run():
+        assert await sensor.start(run_loop=False)
+        assert await sensor.sample()
+        device.corrupt = 1
+        device.temperature = 30.0
+        await sensor.sample()
+
+    asyncio.run(run())
+    data = sensor.get_latest()
+    assert data["temperature_centi"] == 2350
+    assert data["humidity_permille"] == 600
+    assert sensor.get_crc_errors() == 1
+    assert device.measurements == 2
+
+
+def test_uart_sensors_on_fake_bus():
+    """
+    The PMS7003 and ZE07-CO drivers parse the frames streamed on fake UARTs.
+    """
+    pms_uart = UART(1)
+    co_uart = UART(0)
+    pms = PMS7003(median_size=0, bus=pms_uart)
+    co = ZE07CO(median_size=0, bus=co_uart)
+
+    async def run():
+        assert await pms.start(run_loop=False)
+        assert await co.start(run_loop=False)
+        pms_uart.feed(pms7003_frame(5, 12, 20, (300, 100, 50, 10, 2, 1)))
+        co_uart.feed(ze07co_frame(3) + ze07co_frame(15))
+        assert await pms.sample()
+        assert await co.sample()
+
+    asyncio.run(run())
+    assert pms.get_latest()["concentration_atm"] == {"pm1": 5, "pm2_5": 12, "pm10": 20}
+    assert pms.get_latest()["n_particles"]["0_3um"] == 300
+    assert co.get_latest()["concentration_deci"] == 15
+    assert co_uart.written.startswith(b"\xff\x01\x78\x40")
+
+
+def test_co_filter_sees_every_frame():
+    """
+    Every ZE07-CO frame received in a sampling cycle goes through the median filter, so a step change passes the
+    filter within one cycle of frames.
+    """
+    co_uart = UART(0)
+    co = ZE07CO(median_size=5, bus=co_uart)
+
+    async def run():
+        assert await co.start(run_loop=False)
+        co_uart.feed(b"".join(ze07co_frame(10) for _ in range(5)))
+        assert await co.sample()
+        assert co.get_latest()["concentration_deci"] == 10
+        co_uart.feed(b"".join(ze07co_frame(50) for _ in range(5)))
+        assert await co.sample()
+
+    asyncio.run(run())
+    assert co.get_latest()["concentration_deci"] == 50
+    assert co.get_health()["readings"] == 10
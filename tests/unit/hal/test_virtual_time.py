@@ -0,0 +1,57 @@
+# Unit tests
+
+import asyncio
+import time
+
+import pytest
+
+from hal.virtual_time import VirtualClock, TICKS_PERIOD
+
+
+def test_ticks_wrap():
+    """
+    The ticks start where asked and wrap around with the MicroPython period, the differences staying right.
+    """
+    clock = VirtualClock(start_ms=TICKS_PERIOD - 10, epoch=1000)
+    start = clock.ticks_ms()
+    clock.advance(0.025)
+    assert clock.ticks_ms() == 15
+    assert time.ticks_diff(clock.ticks_ms(), start) == 25
+    assert clock.ticks_us() == 15_000
+    assert clock.time() == 1000.025
+
+
+def test_run_jumps_to_timers():
+    """
+    Sleeps and timeouts on the simulated loop end at once in real time, at their simulated time, with `time` patched
+    only while installed.
+    """
+    ticks_ms = time.ticks_ms
+    clock = VirtualClock()
+
+    async def main():
+        await asyncio.gather(asyncio.sleep(3600), asyncio.sleep(60))
+        assert clock.elapsed() == 3600
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.Event().wait(), 10)
+        time.sleep(5)
+        return time.ticks_ms()
+
+    start = time.perf_counter()
+    with clock:
+        assert time.ticks_ms is not ticks_ms
+        ticks = clock.run(main())
+    assert time.perf_counter() - start < 1
+    assert ticks == 3615_000
+    assert time.ticks_ms is ticks_ms
+
+
+def test_blocked_forever():
+    """
+    A run whose tasks all wait with no timer to wake them raises instead of hanging.
+    """
+    async def main():
+        await asyncio.Event().wait()
+
+    with pytest.raises(RuntimeError):
+        VirtualClock().run(main())
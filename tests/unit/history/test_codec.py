@@ -0,0 +1,117 @@
+# Unit tests
+
+import os
+import random
+import sys
+
+import pytest
+
+from history import History, HistoryEncoder, INVALID_INT16, INVALID_UINT16
+from state.context import HISTORY_CHANNELS as CHANNELS
+from tests import helpers
+
+# The decoder lives with the mock client
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "integration", "ble_wrapper", "mock_client"))
+from history_codec import decode_block, compression_ratio
+
+TYPECODES = "".join(typecode for _, typecode in CHANNELS)
+
+
+def make_history(n_records, seed=1):
+    """A history of random walks, 5 s apart."""
+    random.seed(seed)
+    values = [2500, 450, 8, 12, 15, 10]
+
+    def walk(t):
+        values[0] += random.randint(-5, 5)
+        values[1] += random.randint(-3, 3)
+        for i in range(2, 6):
+            values[i] = max(0, values[i] + random.randint(-2, 2))
+        return values
+
+    return helpers.make_history(n_records, walk, step=5)
+
+
+def expected_records(history, start=0):
+    return [
+        (history.timestamps[i], *(history.columns[name][i] for name in history.channels))
+        for i in history.since(start)
+    ]
+
+
+def test_round_trip():
+    """
+    Decoding every block gives back the records, and every block fits in the block size.
+    """
+    history = make_history(500)
+    encoder = HistoryEncoder(len(CHANNELS), 244)
+    records = []
+    n_bytes = 0
+    for block in encoder.encode(history, history.since(0)):
+        assert len(block) <= 244
+        n_bytes += len(block)
+        records.extend(decode_block(bytes(block), TYPECODES))
+    assert records == expected_records(history)
+    assert compression_ratio(len(records), n_bytes) > 2
+
+
+def test_small_blocks():
+    """
+    Blocks as small as the default notification payload hold at least one record each.
+    """
+    history = make_history(50)
+    encoder = HistoryEncoder(len(CHANNELS), 20)
+    records = []
+    for block in encoder.encode(history, history.since(1700000100)):
+        assert len(block) <= 20
+        records.extend(decode_block(bytes(block), TYPECODES))
+    assert records == expected_records(history, 1700000100)
+
+
+def test_large_steps():
+    """
+    Invalid markers and gaps in time round-trip.
+    """
+    history = History(4, CHANNELS)
+    history.append(10, (INVALID_INT16, INVALID_UINT16, 0, 0, 0, INVALID_UINT16))
+    history.append(100000, (2500, 500, 1, 2, 3, 4))
+    history.append(100001, (INVALID_INT16, INVALID_UINT16, INVALID_UINT16, INVALID_UINT16, INVALID_UINT16, INVALID_UINT16))
+    encoder = HistoryEncoder(len(CHANNELS), 64)
+    blocks = [bytes(block) for block in encoder.encode(history, history.since(0))]
+    assert [record for block in blocks for record in decode_block(block, TYPECODES)] == expected_records(history)
+
+
+def test_encode_records():
+    """
+    Packed records, as read back from flash, encode to the same blocks as the history.
+    """
+    history = make_history(300)
+    packed = []
+    for i in history.since(0):
+        record = bytearray(history.record_size)
+        history.pack_record(i, record, 0)
+        packed.append(record)
+
+    encoder = HistoryEncoder(len(CHANNELS), 100)
+    blocks = [bytes(block) for block in encoder.encode(history, history.since(0))]
+    assert [bytes(block) for block in encoder.encode_records(history, packed)] == blocks
+
+
+def test_invalid_records_fit():
+    """
+    A record of invalid markers fits in the default notification payload, written raw as the first record of a
+    block, and blocks too small for a raw record are refused.
+    """
+    history = History(8, CHANNELS)
+    for t in range(8):
+        invalid = (INVALID_INT16,) + (INVALID_UINT16,) * (len(CHANNELS) - 1)
+        history.append(100 + t, invalid if t % 3 else (2150 + t, 480, 5, 12, 20, 10))
+    encoder = HistoryEncoder(len(CHANNELS), 20)
+    records = []
+    for block in encoder.encode(history, history.since(0)):
+        assert len(block) <= 20
+        records.extend(decode_block(bytes(block), TYPECODES))
+    assert records == expected_records(history)
+
+    with pytest.raises(ValueError):
+        HistoryEncoder(len(CHANNELS), 17)
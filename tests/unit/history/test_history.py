@@ -0,0 +1,75 @@
+# Unit tests
+
+import struct
+
+from history import History
+from tests import helpers
+from tests.helpers import TWO_CHANNELS as CHANNELS
+
+
+def make_history(capacity, n_records):
+    return helpers.make_history(n_records, lambda t: (t - 5, t * 2), channels=CHANNELS, capacity=capacity, start=0)
+
+
+def test_append():
+    """
+    Records are stored column by column until the capacity is reached.
+    """
+    history = make_history(4, 3)
+    assert len(history) == 3
+    assert [history.timestamps[history.index(i)] for i in range(3)] == [0, 1, 2]
+    assert history.columns["temperature"][history.index(-1)] == -3
+    assert history.columns["pm2_5"][history.index(-1)] == 4
+
+
+def test_overwrite_oldest():
+    """
+    Once full, appending overwrites the oldest record.
+    """
+    history = make_history(4, 10)
+    assert len(history) == 4
+    assert [history.timestamps[history.index(i)] for i in range(4)] == [6, 7, 8, 9]
+
+
+def test_since():
+    """
+    Iterating over a time window yields the records inside it, oldest first, also across the wrap-around.
+    """
+    history = make_history(8, 13)
+    assert [history.timestamps[i] for i in history.since(7)] == [7, 8, 9, 10, 11, 12]
+    assert [history.timestamps[i] for i in history.since(0)] == list(range(5, 13))
+    assert [history.timestamps[i] for i in history.since(9, 10)] == [9, 10]
+    assert list(history.since(13)) == []
+
+
+def test_memory_usage():
+    """
+    Memory usage counts the timestamp column and every value column.
+    """
+    history = History(100, CHANNELS)
+    assert history.memory_usage() == 100 * (4 + 2 + 2)
+
+    # the same as the arrays themselves
+    columns = [history.timestamps] + list(history.columns.values())
+    assert history.memory_usage() == sum(len(column) * column.itemsize for column in columns)
+
+
+def test_clear():
+    """
+    Clearing removes every record.
+    """
+    history = make_history(4, 3)
+    history.clear()
+    assert len(history) == 0
+    assert list(history.since(0)) == []
+
+
+def test_pack_record():
+    """
+    A record is packed little-endian: the timestamp, then each channel in order.
+    """
+    history = make_history(4, 3)
+    assert history.record_size == 8
+    buffer = bytearray(10)
+    history.pack_record(history.index(-1), buffer, 2)
+    assert struct.unpack_from("<LhH", buffer, 2) == (2, -3, 4)
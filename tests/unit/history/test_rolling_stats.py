@@ -0,0 +1,99 @@
+# Unit tests
+
+import random
+
+from history import RollingStats
+
+
+def window_stats(values):
+    n = len(values)
+    mean = sum(values) / n
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else None
+    return mean, min(values), max(values), variance
+
+
+def test_empty():
+    """
+    Every statistic is None before the first value.
+    """
+    stats = RollingStats(4)
+    assert stats.count() == 0
+    assert stats.mean() is None
+    assert stats.min() is None
+    assert stats.max() is None
+    assert stats.variance() is None
+    assert stats.ema() is None
+
+
+def test_matches_recomputed_window():
+    """
+    The incremental statistics match the statistics recomputed over the latest `window` values.
+    """
+    random.seed(1)
+    window = 5
+    stats = RollingStats(window)
+    values = []
+    for _ in range(200):
+        value = float(random.randint(-50, 50))
+        values.append(value)
+        stats.add(value)
+
+        mean, low, high, variance = window_stats(values[-window:])
+        assert stats.count() == min(len(values), window)
+        assert abs(stats.mean() - mean) < 1e-6
+        assert stats.min() == low
+        assert stats.max() == high
+        if variance is None:
+            assert stats.variance() is None
+        else:
+            assert abs(stats.variance() - variance) < 1e-4
+
+
+def test_monotonic_runs():
+    """
+    The minimum and maximum follow increasing and decreasing runs out of the window.
+    """
+    stats = RollingStats(3)
+    for value in (1.0, 2.0, 3.0, 4.0, 5.0):
+        stats.add(value)
+    assert (stats.min(), stats.max()) == (3.0, 5.0)
+    for value in (4.0, 3.0, 2.0, 1.0):
+        stats.add(value)
+    assert (stats.min(), stats.max()) == (1.0, 3.0)
+
+
+def test_ema():
+    """
+    The EMA starts at the first value and moves towards the new values by 2 / (span + 1).
+    """
+    stats = RollingStats(4, ema_window=3)
+    stats.add(10.0)
+    assert stats.ema() == 10.0
+    stats.add(20.0)
+    assert stats.ema() == 15.0
+
+
+def test_reset():
+    """
+    Resetting forgets every value.
+    """
+    stats = RollingStats(3)
+    for value in (1.0, 2.0, 3.0):
+        stats.add(value)
+    stats.reset()
+    assert stats.get_summary() == {
+        "count": 0, "mean": None, "min": None, "max": None, "variance": None, "ema": None
+    }
+    stats.add(7.0)
+    assert (stats.mean(), stats.min(), stats.max()) == (7.0, 7.0, 7.0)
+
+
+def test_no_drift():
+    """
+    A week of a constant value at 5 s keeps the mean on the value, as the value removed is the one added.
+    """
+    stats = RollingStats(12)
+    for _ in range(7 * 24 * 3600 // 5):
+        stats.add(23.45)
+    assert abs(stats.mean() - 23.45) < 1e-5
+    assert stats.variance() < 1e-9
@@ -0,0 +1,91 @@
+# Unit tests
+
+from pms7003.frame_parser import FrameParser, FRAME_LENGTH
+
+
+class FakeUART:
+    """Minimal UART that returns the scripted bytes."""
+
+    def __init__(self, data=b''):
+        self.data = bytearray(data)
+
+    def any(self):
+        return len(self.data)
+
+    def readinto(self, buf, nbytes):
+        n = min(nbytes, len(self.data))
+        for i in range(n):
+            buf[i] = self.data[i]
+        self.data = self.data[n:]
+        return n
+
+
+def make_frame(pm2_5=35):
+    frame = bytearray(FRAME_LENGTH)
+    frame[0] = 0x42
+    frame[1] = 0x4D
+    frame[3] = FRAME_LENGTH - 4
+    frame[12] = pm2_5 >> 8
+    frame[13] = pm2_5 & 0xFF
+    checksum = sum(frame[:-2])
+    frame[30] = checksum >> 8
+    frame[31] = checksum & 0xFF
+    return bytes(frame)
+
+
+def read_all(parser, uart):
+    frames = []
+    while uart.any() > 0:
+        parser.read_from(uart)
+        while parser.next_frame():
+            frames.append(bytes(parser.frame))
+    return frames
+
+
+def test_single_frame():
+    """
+    A complete frame is emitted as is.
+    """
+    parser = FrameParser()
+    assert read_all(parser, FakeUART(make_frame())) == [make_frame()]
+
+
+def test_every_queued_frame_is_emitted():
+    """
+    Several queued frames are all emitted, in order.
+    """
+    parser = FrameParser()
+    data = make_frame(1) + make_frame(2) + make_frame(3)
+    assert read_all(parser, FakeUART(data)) == [make_frame(1), make_frame(2), make_frame(3)]
+
+
+def test_resync_after_partial_frame():
+    """
+    A truncated frame is skipped and the next frame is found.
+    """
+    parser = FrameParser()
+    data = make_frame(1)[:20] + make_frame(2)
+    assert read_all(parser, FakeUART(data)) == [make_frame(2)]
+    assert parser.bytes_dropped == 20
+
+
+def test_resync_after_corrupted_frame():
+    """
+    A frame with a bad checksum is rejected and the next frame is found.
+    """
+    parser = FrameParser()
+    corrupted = bytearray(make_frame(1))
+    corrupted[13] ^= 0xFF
+    data = b'\x00\x42' + bytes(corrupted) + make_frame(2)
+    assert read_all(parser, FakeUART(data)) == [make_frame(2)]
+
+
+def test_frame_split_across_reads():
+    """
+    A frame arriving over several reads is emitted once complete.
+    """
+    parser = FrameParser()
+    uart = FakeUART(make_frame()[:10])
+    assert read_all(parser, uart) == []
+    uart.data.extend(make_frame()[10:])
+    assert read_all(parser, uart) == [make_frame()]
@@ -0,0 +1,240 @@
+# Unit tests
+
+import os
+
+from record_store import RecordStore
+from record_store import record_store as record_store_module
+from record_store.record_store import SEGMENT_PREFIX
+
+RECORD_SIZE = 4
+
+
+def make_record(i):
+    return bytes([i & 0xFF, (i >> 8) & 0xFF, 0x42, 0x24])
+
+
+def record_values(store):
+    return [bytes(record)[0] | (bytes(record)[1] << 8) for record in store.records()]
+
+
+def make_store(directory, **kwargs):
+    store = RecordStore(str(directory), RECORD_SIZE, **kwargs)
+    store.open()
+    return store
+
+
+def test_batched_writes(tmp_path):
+    """
+    Records are written to flash once a batch is full, and pending records are still readable.
+    """
+    store = make_store(tmp_path, batch_records=4)
+    for i in range(6):
+        store.append(make_record(i))
+    stats = store.get_stats()
+    assert stats["flushes"] == 1
+    assert stats["pending"] == 2
+    assert stats["bytes_written"] == 4 * (RECORD_SIZE + 1)
+    assert record_values(store) == list(range(6))
+
+
+def test_rotation_and_eviction(tmp_path):
+    """
+    Full segments rotate, and the oldest segments are evicted over the cap.
+    """
+    store = make_store(tmp_path, segment_records=5, max_segments=3, batch_records=2)
+    for i in range(40):
+        store.append(make_record(i))
+    store.flush()
+    assert store.segments() == [5, 6, 7]
+    assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".bin")]) == 3
+    assert record_values(store) == list(range(25, 40))
+    assert store.get_stats()["evicted_segments"] == 5
+
+
+def test_reopen(tmp_path):
+    """
+    A reopened store finds every flushed record, and appends to the newest segment.
+    """
+    store = make_store(tmp_path, segment_records=5, batch_records=2)
+    for i in range(12):
+        store.append(make_record(i))
+    store = make_store(tmp_path, segment_records=5, batch_records=2)
+    assert len(store) == 12
+    store.append(make_record(12))
+    store.append(make_record(13))
+    assert record_values(store) == list(range(14))
+    assert store.segments() == [0, 1, 2]
+
+
+def test_recover_torn_tail(tmp_path):
+    """
+    Opening drops a partial record and the records of the latest batch from the first corrupted one.
+    """
+    store = make_store(tmp_path, batch_records=4)
+    for i in range(8):
+        store.append(make_record(i))
+
+    path = os.path.join(str(tmp_path), "%s%08d.bin" % (SEGMENT_PREFIX, 0))
+    with open(path, "r+b") as file:
+        file.seek(6 * (RECORD_SIZE + 1) + 2)
+        file.write(b"\x00")
+        file.seek(0, 2)
+        file.write(b"\x01\x02")
+
+    store = make_store(tmp_path, batch_records=4)
+    assert record_values(store) == list(range(6))
+    assert store.get_stats()["recovered_records"] == 3
+    assert os.path.getsize(path) == 6 * (RECORD_SIZE + 1)
+    assert os.listdir(str(tmp_path)) == ["%s%08d.bin" % (SEGMENT_PREFIX, 0)]
+
+
+def test_recover_torn_first_batch(tmp_path):
+    """
+    A freshly rotated segment whose only batch is torn is left empty, and the records before it are still found by
+    timestamp.
+    """
+    store = make_store(tmp_path, segment_records=4, batch_records=4)
+    for i in range(100, 108):
+        store.append(make_record(i))
+
+    path = os.path.join(str(tmp_path), "%s%08d.bin" % (SEGMENT_PREFIX, 1))
+    with open(path, "r+b") as file:
+        file.seek(2)
+        file.write(b"\x00")
+
+    store = make_store(tmp_path, segment_records=4, batch_records=4)
+    assert store.get_stats()["recovered_records"] == 4
+    assert os.path.getsize(path) == 0
+    assert timestamp_values(store.since(make_timestamp(101))) == [101, 102, 103]
+    assert timestamp_values(store.since(make_timestamp(104))) == []
+    assert store.last_timestamp() == make_timestamp(103)
+
+
+def timestamp_values(records):
+    return [bytes(record)[0] | (bytes(record)[1] << 8) for record in records]
+
+
+def test_since(tmp_path):
+    """
+    The records from a timestamp are found across segments and pending records, reading only from the indexed record
+    before the first match.
+    """
+    store = make_store(tmp_path, segment_records=20, batch_records=4, index_interval=4)
+    for i in range(0, 150, 2):
+        store.append(make_record(i))
+
+    for start in (0, 1, 38, 39, 40, 41, 100, 147, 148, 149):
+        assert timestamp_values(store.since(start | (0x2442 << 16))) == list(range(start + start % 2, 150, 2))
+    assert list(store.since(0xFFFFFFFF)) == []
+
+    # within a segment, the read starts at the indexed record just before the timestamp
+    sequence = store.segments()[1]
+    assert store._find(sequence, make_timestamp(57)) == 8
+    assert store.time_range(sequence) == (make_timestamp(40), make_timestamp(78))
+
+
+def make_timestamp(i):
+    return i | (0x2442 << 16)
+
+
+def test_index_reload(tmp_path):
+    """
+    Full segments save their index, which a reopened store loads instead of reading the records. A missing or stale
+    index is rebuilt.
+    """
+    store = make_store(tmp_path, segment_records=10, batch_records=5, index_interval=3)
+    for i in range(45):
+        store.append(make_record(i))
+    store.flush()
+    names = sorted(os.listdir(str(tmp_path)))
+    assert names == ["%s%08d%s" % (SEGMENT_PREFIX, i, suffix) for i in range(5) for suffix in (".bin", ".idx")][:-1]
+
+    store = make_store(tmp_path, segment_records=10, batch_records=5, index_interval=3)
+    assert store.get_stats()["index_rebuilds"] == 1 # only the newest segment
+    assert store.time_range(2) == (make_timestamp(20), make_timestamp(29))
+    assert timestamp_values(store.since(make_timestamp(25))) == list(range(25, 45))
+
+    os.remove(os.path.join(str(tmp_path), "%s%08d.idx" % (SEGMENT_PREFIX, 1)))
+    with open(os.path.join(str(tmp_path), "%s%08d.idx" % (SEGMENT_PREFIX, 2)), "r+b") as file:
+        file.write(b"\x07")
+    store = make_store(tmp_path, segment_records=10, batch_records=5, index_interval=3)
+    assert store.get_stats()["index_rebuilds"] == 3
+    assert store.time_range(1) == (make_timestamp(10), make_timestamp(19))
+    assert timestamp_values(store.since(make_timestamp(12))) == list(range(12, 45))
+    assert os.path.exists(os.path.join(str(tmp_path), "%s%08d.idx" % (SEGMENT_PREFIX, 1)))
+
+
+def test_evicted_index(tmp_path):
+    """
+    Evicting a segment removes its index, and lookups before the oldest segment start from it.
+    """
+    store = make_store(tmp_path, segment_records=5, max_segments=2, batch_records=5)
+    for i in range(30):
+        store.append(make_record(i))
+    assert store.segments() == [4, 5]
+    assert sorted(os.listdir(str(tmp_path))) == [
+        "%s%08d.bin" % (SEGMENT_PREFIX, 4), "%s%08d.idx" % (SEGMENT_PREFIX, 4), "%s%08d.bin" % (SEGMENT_PREFIX, 5)
+    ]
+    assert timestamp_values(store.since(0)) == list(range(20, 30))
+
+
+def test_last_timestamp(tmp_path):
+    """
+    The newest timestamp is found in the pending records, then in the index of the newest segment.
+    """
+    store = make_store(tmp_path, batch_records=4)
+    assert store.last_timestamp() is None
+    for i in range(6):
+        store.append(make_record(i))
+    assert store.last_timestamp() == make_timestamp(5)
+    store = make_store(tmp_path, batch_records=4)
+    assert store.last_timestamp() == make_timestamp(3)
+
+
+def test_partial_write_error(tmp_path, monkeypatch):
+    """
+    A write failing partway loses its batch only: the newest segment is cut back to its last whole record, so the
+    next batches stay aligned, also when the first cut fails and is retried on the next flush.
+    """
+    failures = {"rename": 1}
+    writes = []
+    rename = os.rename
+
+    class FailingFile:
+        def __init__(self, file):
+            self.file = file
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self.file.close()
+
+        def write(self, data):
+            writes.append(len(data))
+            if len(writes) == 2:
+                self.file.write(bytes(data[:len(data) // 2 + 1]))
+                raise OSError(28, "No space left on device")
+            return self.file.write(data)
+
+    def failing_open(path, mode="r"):
+        file = open(path, mode)
+        return FailingFile(file) if mode == "ab" else file
+
+    def failing_rename(source, target):
+        if failures["rename"] > 0:
+            failures["rename"] -= 1
+            raise OSError(5, "I/O error")
+        rename(source, target)
+
+    monkeypatch.setattr(record_store_module, "open", failing_open, raising=False)
+    monkeypatch.setattr(os, "rename", failing_rename)
+
+    store = make_store(tmp_path, batch_records=4)
+    for i in range(12):
+        store.append(make_record(i))
+
+    # the second batch was lost, the third one cut the torn record off before being written
+    assert store.get_stats()["write_errors"] == 1
+    assert record_values(store) == [0, 1, 2, 3, 8, 9, 10, 11]
+    assert record_values(make_store(tmp_path, batch_records=4)) == [0, 1, 2, 3, 8, 9, 10, 11]
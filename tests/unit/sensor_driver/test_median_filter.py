@@ -0,0 +1,57 @@
+# Unit tests
+
+from sensor_driver import MedianFilter
+
+
+def test_removes_single_spikes():
+    """
+    A single spike is replaced by the median and counted as rejected.
+    """
+    median_filter = MedianFilter(5)
+    outputs = [median_filter.update(value) for value in (10, 10, 10, 900, 10, 10)]
+    assert outputs == [10, 10, 10, 10, 10, 10]
+    assert median_filter.rejected == 1
+
+
+def test_matches_sorted_window():
+    """
+    The output is the median of the latest values, the lower middle one while the window fills up.
+    """
+    values = [5, 3, 8, 1, 9, 2, 7, 7, 0, 4, 6, 6, 3]
+    median_filter = MedianFilter(5)
+    for i, value in enumerate(values):
+        window = sorted(values[max(0, i - 4):i + 1])
+        assert median_filter.update(value) == window[(len(window) - 1) // 2]
+
+
+def test_follows_steps():
+    """
+    A lasting change passes through after half the window.
+    """
+    median_filter = MedianFilter(5)
+    for _ in range(5):
+        median_filter.update(10)
+    outputs = [median_filter.update(50) for _ in range(4)]
+    assert outputs == [10, 10, 50, 50]
+
+
+def test_reset():
+    """
+    Resetting empties the window but keeps the rejected count.
+    """
+    median_filter = MedianFilter(3)
+    for value in (1, 100, 1):
+        median_filter.update(value)
+    median_filter.reset()
+    assert median_filter.update(42) == 42
+    assert median_filter.rejected == 1
+
+
+def test_reject_threshold():
+    """
+    Only the values further than the threshold from the median are counted as rejected, not the noise around it.
+    """
+    median_filter = MedianFilter(5, threshold=3)
+    outputs = [median_filter.update(value) for value in (10, 12, 9, 11, 10, 13, 40, 10)]
+    assert outputs == [10, 10, 10, 10, 10, 11, 11, 11]
+    assert median_filter.rejected == 1
@@ -0,0 +1,192 @@
+# Unit tests
+
+import asyncio
+
+import sensor_driver.sensor_driver as sensor_driver_module
+from sensor_driver import SensorDriver
+
+
+class FakeDriver(SensorDriver):
+    """Driver that publishes a counter, or fails while `failing` is set."""
+
+    def __init__(self, init_result=True):
+        self.init_result = init_result
+        self.n_inits = 0
+        self.failing = False
+        self.counter = 0
+        super().__init__("FakeDriver", interval=0.01)
+
+    async def _init_sensor(self):
+        self.n_inits += 1
+        return self.init_result
+
+    async def _acquire(self):
+        if self.failing:
+            raise OSError("disconnected")
+        self.counter += 1
+        return self.counter
+
+    def _parse_data(self, raw):
+        self._data["value"] = raw
+
+    def _invalid_data(self):
+        return {"value": -1, "timestamp": 0}
+
+
+def test_lifecycle():
+    """
+    The driver moves through the lifecycle states and publishes readings only while running.
+    """
+    async def run():
+        driver = FakeDriver()
+        assert driver.get_state() == "created"
+
+        assert await driver.start()
+        assert driver.get_state() == "running"
+        await asyncio.sleep(0.05)
+        assert driver.get_latest()["value"] > 0
+
+        driver.pause()
+        assert driver.get_state() == "paused"
+        await asyncio.sleep(0.02)
+        n_readings = driver.get_health()["readings"]
+        await asyncio.sleep(0.05)
+        assert driver.get_health()["readings"] == n_readings
+
+        driver.resume()
+        assert driver.get_state() == "running"
+        await asyncio.sleep(0.05)
+        assert driver.get_health()["readings"] > n_readings
+
+        await driver.destroy()
+        assert driver.get_state() == "destroyed"
+        assert driver._data_update_task.done()
+
+    asyncio.run(run())
+
+
+def test_pause_before_start():
+    """
+    A driver paused before starting stays paused until resumed.
+    """
+    async def run():
+        driver = FakeDriver()
+        driver.pause()
+        assert await driver.start()
+        assert driver.get_state() == "paused"
+        await asyncio.sleep(0.05)
+        assert driver.get_health()["readings"] == 0
+
+        driver.resume()
+        await asyncio.sleep(0.05)
+        assert driver.get_health()["readings"] > 0
+
+        await driver.destroy()
+
+    asyncio.run(run())
+
+
+def test_destroy_while_paused():
+    """
+    Destroying a paused driver wakes up and stops the loop.
+    """
+    async def run():
+        driver = FakeDriver()
+        assert await driver.start()
+        driver.pause()
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(driver.destroy(), 1)
+        assert driver._data_update_task.done()
+
+    asyncio.run(run())
+
+
+def test_failed_init():
+    """
+    A driver that fails to initialize does not start its loop.
+    """
+    async def run():
+        driver = FakeDriver(init_result=False)
+        assert not await driver.start()
+        assert driver.get_state() == "failed"
+        assert driver._data_update_task is None
+        await driver.destroy()
+
+    asyncio.run(run())
+
+
+def test_failures_reset_sensor(monkeypatch):
+    """
+    Consecutive failures are counted and reset the sensor, and a reading clears the streak.
+    """
+    monkeypatch.setattr(sensor_driver_module, "RETRY_BACKOFF_MIN", 0.001)
+    monkeypatch.setattr(sensor_driver_module, "RETRY_BACKOFF_MAX", 0.001)
+
+    async def run():
+        driver = FakeDriver()
+        assert await driver.start()
+        await asyncio.sleep(0.03)
+
+        driver.failing = True
+        await asyncio.sleep(0.05)
+        health = driver.get_health()
+        assert health["consecutive_failures"] >= sensor_driver_module.MAX_CONSECUTIVE_FAILURES
+        assert health["resets"] >= 1
+        assert health["last_error"] == "OSError: disconnected"
+        assert driver.get_latest()["value"] == -1
+        assert driver.n_inits >= 2
+
+        driver.failing = False
+        await asyncio.sleep(0.05)
+        assert driver.get_health()["consecutive_failures"] == 0
+        assert driver.get_latest()["value"] > 0
+
+        await driver.destroy()
+
+    asyncio.run(run())
+
+
+def test_filter():
+    """
+    A filtered channel is despiked and the rejected values are counted in the health, until the filter is switched off.
+    """
+    class SpikyDriver(FakeDriver):
+        def _parse_data(self, raw):
+            self._data["value"] = self._filter("value", 1000 if raw == 3 else 10)
+
+    async def run():
+        driver = SpikyDriver()
+        driver.set_filter("value", 3)
+        assert await driver.start(run_loop=False)
+        values = []
+        for _ in range(4):
+            await driver.sample()
+            values.append(driver.get_latest()["value"])
+        assert values == [10, 10, 10, 10]
+        assert driver.get_health()["rejected"] == 1
+        assert driver.get_filters() == {"value": {"size": 3, "rejected": 1}}
+
+        driver.set_filter("value", 0)
+        driver.counter = 2
+        await driver.sample()
+        assert driver.get_latest()["value"] == 1000
+        assert driver.get_filters() == {}
+
+    asyncio.run(run())
+
+
+def test_peek_latest():
+    """
+    Peeking returns the live data dict, updated in place by every reading, while getting returns a copy.
+    """
+    async def run():
+        driver = FakeDriver()
+        assert await driver.start(run_loop=False)
+        live = driver.peek_latest()
+        copy = driver.get_latest()
+        await driver.sample()
+        assert live["value"] == 1
+        assert copy["value"] == -1
+        assert driver.peek_latest() is live
+
+    asyncio.run(run())
@@ -0,0 +1,75 @@
+# Unit tests
+
+import asyncio
+import time
+
+from shutdown import ShutdownCoordinator
+
+
+class FakeComponent:
+    def __init__(self, duration, error=None):
+        self.duration = duration
+        self.error = error
+        self.started = None
+        self.aborted = False
+
+    async def destroy(self):
+        self.started = time.ticks_ms()
+        await asyncio.sleep(self.duration)
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        self.aborted = True
+
+
+def test_concurrent_shutdown():
+    """
+    Every component is shut down at once, so the total time is the longest shutdown, not their sum.
+    """
+    components = [FakeComponent(0.05) for _ in range(4)]
+    coordinator = ShutdownCoordinator(1)
+    for i, component in enumerate(components):
+        coordinator.add(f"component{i}", component.destroy, component.abort)
+
+    report = asyncio.run(coordinator.run())
+    assert report["overrun"] == []
+    assert report["errors"] == {}
+    assert report["elapsed_ms"] < 150
+    assert max(c.started for c in components) - min(c.started for c in components) < 10
+    assert not any(c.aborted for c in components)
+
+
+def test_overrun_and_errors():
+    """
+    Components still running at the deadline are aborted and reported, and errors do not stop the others.
+    """
+    slow = FakeComponent(10)
+    failing = FakeComponent(0, error=OSError("bus"))
+    fast = FakeComponent(0.01)
+
+    async def run():
+        task = asyncio.create_task(asyncio.sleep(10))
+        coordinator = ShutdownCoordinator(0.1)
+        coordinator.add("slow", slow.destroy, slow.abort)
+        coordinator.add("failing", failing.destroy)
+        coordinator.add("fast", fast.destroy)
+        coordinator.add_task("task", task)
+        coordinator.add_task("none", None)
+        report = await coordinator.run()
+        return report, task.cancelled()
+
+    report, cancelled = asyncio.run(run())
+    assert report["overrun"] == ["slow", "task"]
+    assert report["errors"] == {"failing": "OSError: bus"}
+    assert report["elapsed_ms"] < 400
+    assert slow.aborted
+    assert cancelled
+
+
+def test_empty():
+    """
+    Nothing to shut down returns at once.
+    """
+    report = asyncio.run(ShutdownCoordinator(1).run())
+    assert report["overrun"] == [] and report["elapsed_ms"] < 50
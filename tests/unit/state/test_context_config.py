@@ -0,0 +1,31 @@
+# Unit tests
+
+from state import Context, AdvertiseState
+from tests.helpers import make_context
+
+CONFIG = """device_name = bioinfo-test
+debug = false
+debug_sensor = false
+history_capacity = 120
+stats_window = 6
+smoothing = mean
+median_filter = 3"""
+
+
+def test_update_name_keeps_settings(monkeypatch, tmp_path):
+    """
+    Renaming the device rewrites only the name in the config file, and the other settings are read back after it.
+    """
+    context = make_context(tmp_path, monkeypatch, config=CONFIG)
+
+    context.update_name("bioinfo-renamed")
+    context.update_name("bioinfo-again")
+
+    assert (tmp_path / "config.txt").read_text() == CONFIG.replace("bioinfo-test", "bioinfo-again")
+
+    reloaded = Context(AdvertiseState)
+    assert reloaded.device_name == "bioinfo-again"
+    assert reloaded.history_capacity == 120
+    assert reloaded.stats_window == 6
+    assert reloaded.smoothing == "mean"
+    assert reloaded.median_filter == 3
@@ -0,0 +1,111 @@
+# Unit tests
+
+import asyncio
+import time
+
+import clock
+import state.context
+from hal.virtual_time import VirtualClock
+from tests import helpers
+
+
+def make_context(monkeypatch, tmp_path, init_durations):
+    """Create a context whose sensors take the given time to initialize, None for a failing sensor."""
+    monkeypatch.setattr(state.context, "SENSOR_START_TIMEOUTS", {"dht20": 0.1, "pms7003": 0.1, "ze07co": 0.1})
+    context = helpers.make_context(tmp_path, monkeypatch)
+    started = []
+
+    async def ble_start():
+        started.append(("ble", time.ticks_ms()))
+
+    context.ble_wrapper.start = ble_start
+
+    for name, duration in init_durations.items():
+        sensor = getattr(context, name)
+
+        async def init_sensor(name=name, duration=duration):
+            started.append((name, time.ticks_ms()))
+            if duration is None:
+                return False
+            await asyncio.sleep(duration)
+            return True
+
+        sensor._init_sensor = init_sensor
+        sensor.sample = lambda: asyncio.sleep(0)
+
+    return context, started
+
+
+def test_parallel_start(monkeypatch, tmp_path):
+    """
+    Advertising starts before the sensors, the sensors start concurrently, and the failing or slow ones are marked
+    degraded without delaying the others.
+    """
+    context, started = make_context(monkeypatch, tmp_path, {"dht20": 0.05, "pms7003": None, "ze07co": 1.0})
+
+    async def run():
+        task = asyncio.create_task(context.start())
+        await asyncio.sleep(0.01)
+        assert context.get_boot_stats()["advertise_ms"] >= 0
+        assert context.get_boot_stats()["sensors_ready_ms"] == -1
+        await asyncio.sleep(0.2)
+        stats = context.get_boot_stats()
+        assert context._sampling_task is not None
+        await context.stop()
+        await task
+        return stats
+
+    stats = asyncio.run(run())
+    assert [name for name, _ in started] == ["ble", "dht20", "pms7003", "ze07co"]
+
+    # every sensor started together, and the boot was bounded by the longest timeout
+    assert max(ticks for _, ticks in started) - started[0][1] < 20
+    assert stats["degraded"] == ["pms7003", "ze07co"]
+    assert stats["sensors_ready_ms"] - stats["advertise_ms"] < 180
+    assert context.dht20.get_state() != "failed"
+    assert context.ze07co.get_state() == "failed"
+
+
+def test_destroy(monkeypatch, tmp_path):
+    """
+    Destroying shuts every sensor and the BLE wrapper down once, concurrently, and reports the ones that overran.
+    """
+    monkeypatch.setattr(state.context, "SHUTDOWN_DEADLINE", 0.1)
+    context, _ = make_context(monkeypatch, tmp_path, {})
+    destroyed = []
+
+    for name in ("dht20", "pms7003", "ze07co"):
+        sensor = getattr(context, name)
+
+        async def destroy(name=name):
+            destroyed.append(name)
+            await asyncio.sleep(1 if name == "ze07co" else 0)
+
+        sensor.destroy = destroy
+
+    report = asyncio.run(context.destroy())
+    assert sorted(destroyed) == ["dht20", "pms7003", "ze07co"]
+    assert report["overrun"] == ["ze07co"]
+    assert context.ze07co.get_state() == "destroyed"
+
+
+def test_boot_stats_from_boot(monkeypatch, tmp_path):
+    """
+    The boot timings count from boot, time.ticks_ms() 0, including the imports before the system clock was created.
+    """
+    with VirtualClock() as virtual_clock:
+        virtual_clock.advance(0.3) # the imports
+        clock.system_clock.__init__()
+        context, _ = make_context(monkeypatch, tmp_path, {"dht20": 0.05, "pms7003": 0.05, "ze07co": 0.05})
+
+        async def run():
+            task = asyncio.create_task(context.start())
+            await asyncio.sleep(0.2)
+            await context.stop()
+            await task
+
+        virtual_clock.run(run())
+
+    stats = context.get_boot_stats()
+    assert stats["advertise_ms"] == 300
+    assert stats["sensors_ready_ms"] == 350
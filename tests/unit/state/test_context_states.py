@@ -0,0 +1,73 @@
+# Unit tests
+
+import asyncio
+import logging
+
+from ble_wrapper.constants import REQUEST_CHARACTERISTICS_UUID, RESPONSE_CHARACTERISTICS_UUID
+from hal import aioble
+from state import DataState, SetupState
+from state.context import UPDATE_INTERVAL
+from tests import helpers
+from tests.helpers import install_virtual_clock, fake_buses
+
+
+def make_context(tmp_path, monkeypatch):
+    """Create a context on fake sensors and a virtual clock."""
+    virtual_clock = install_virtual_clock()
+    context = helpers.make_context(tmp_path, monkeypatch, buses=fake_buses())
+    return context, virtual_clock
+
+
+def test_sampling_across_states(tmp_path, monkeypatch):
+    """
+    Sampling goes on through the data and setup states and back, recording every epoch in the history.
+    """
+    context, virtual_clock = make_context(tmp_path, monkeypatch)
+    progress = []
+
+    def record(state_class):
+        progress.append((state_class, context.sampling_scheduler.get_stats()["epochs"], len(context.history)))
+
+    async def command(request, response, message):
+        await request.write(message)
+        assert await response.indicated(timeout_ms=1000) == b"OK"
+        await asyncio.sleep(0.1)
+
+    async def run():
+        task = asyncio.create_task(context.start())
+        await asyncio.sleep(1)
+        client = await aioble.connect(aioble.Link(interval_ms=10), timeout_ms=1000)
+        request = client.characteristic(REQUEST_CHARACTERISTICS_UUID)
+        response = client.characteristic(RESPONSE_CHARACTERISTICS_UUID)
+        await request.write(b"hello")
+        assert await response.indicated(timeout_ms=2000) == b"howdy"
+        await asyncio.sleep(0.1)
+
+        for message, state_class in ((b"setup_mode", SetupState), (b"data_mode", DataState)):
+            await asyncio.sleep(6 * UPDATE_INTERVAL)
+            record(type(context._state))
+            await command(request, response, message)
+            assert isinstance(context._state, state_class)
+            # publishing is handled in every state
+            context.send_data()
+        await asyncio.sleep(6 * UPDATE_INTERVAL)
+        record(type(context._state))
+
+        sampling_task = context._sampling_task
+        await client.disconnect()
+        await context.destroy()
+        await task
+        return sampling_task
+
+    logging.disable(logging.CRITICAL)
+    try:
+        sampling_task = virtual_clock.run(run())
+    finally:
+        virtual_clock.uninstall()
+        logging.disable(logging.NOTSET)
+
+    assert [state_class for state_class, _, _ in progress] == [DataState, SetupState, DataState]
+    for (_, epochs, records), (_, later_epochs, later_records) in zip(progress, progress[1:]):
+        assert later_epochs - epochs >= 5
+        assert later_records - records >= 5
+    assert sampling_task.cancelled() or sampling_task.exception() is None
@@ -0,0 +1,116 @@
+# Unit tests
+
+import asyncio
+import time
+
+from hal.virtual_time import VirtualClock
+from state import SamplingScheduler
+
+
+class FakeSensor:
+    """Sensor that records when it was sampled."""
+
+    def __init__(self, log, name, duration=0):
+        self.log = log
+        self.name = name
+        self.duration = duration
+
+    async def sample(self):
+        self.log.append((self.name, time.ticks_ms()))
+        await asyncio.sleep(self.duration)
+        return True
+
+
+def test_publishes_after_every_sensor():
+    """
+    Each epoch samples every sensor in order and publishes after the last one finishes.
+    """
+    log = []
+    sensors = [FakeSensor(log, "i2c", duration=0.03), FakeSensor(log, "uart1"), FakeSensor(log, "uart2")]
+    scheduler = SamplingScheduler(sensors, lambda: log.append(("publish", time.ticks_ms())), 0.1, stagger=0.01)
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.25)
+        task.cancel()
+        await asyncio.sleep(0)
+
+    with VirtualClock() as clock:
+        clock.run(run())
+
+    assert log[:8] == [("i2c", 0), ("uart1", 10), ("uart2", 20), ("publish", 30),
+                       ("i2c", 100), ("uart1", 110), ("uart2", 120), ("publish", 130)]
+    assert scheduler.get_stats()["epochs"] == 3
+    assert scheduler.get_stats()["overruns"] == 0
+
+
+def test_epochs_are_aligned():
+    """
+    Epochs start one interval apart, independent of the sampling duration.
+    """
+    log = []
+    sensors = [FakeSensor(log, "i2c", duration=0.04)]
+    scheduler = SamplingScheduler(sensors, lambda: None, 0.1)
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.35)
+        task.cancel()
+        await asyncio.sleep(0)
+
+    with VirtualClock() as clock:
+        clock.run(run())
+
+    starts = [timestamp for _, timestamp in log]
+    assert starts == [0, 100, 200, 300]
+    assert scheduler.get_stats()["last_latency_ms"] == 40
+
+
+def test_overrun():
+    """
+    An epoch longer than the interval is counted and the next epoch starts right away.
+    """
+    log = []
+    sensors = [FakeSensor(log, "slow", duration=0.15)]
+    scheduler = SamplingScheduler(sensors, lambda: None, 0.1)
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.4)
+        task.cancel()
+        await asyncio.sleep(0)
+
+    with VirtualClock() as clock:
+        clock.run(run())
+
+    starts = [timestamp for _, timestamp in log]
+    assert starts == [0, 150, 300]
+    assert scheduler.get_stats()["overruns"] == 2
+    assert scheduler.get_stats()["max_latency_ms"] == 150
+
+
+def test_publish_error():
+    """
+    An exception from the publish callback is logged and sampling goes on.
+    """
+    log = []
+    sensors = [FakeSensor(log, "i2c")]
+
+    def on_sampled():
+        log.append(("publish", time.ticks_ms()))
+        raise NotImplementedError
+
+    scheduler = SamplingScheduler(sensors, on_sampled, 0.1)
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.25)
+        assert not task.done()
+        task.cancel()
+        await asyncio.sleep(0)
+
+    with VirtualClock() as clock:
+        clock.run(run())
+
+    assert [name for name, _ in log] == ["i2c", "publish"] * 3
+    assert scheduler.get_stats()["epochs"] == 3
@@ -0,0 +1,37 @@
+# Unit tests
+
+import logging
+
+from ble_wrapper import BLECommands
+from state import DataState, SetupState
+
+
+class FakeContext:
+    def __init__(self):
+        self.transitions = []
+        self.names = []
+
+    def transition(self, state_class):
+        self.transitions.append(state_class)
+
+    def update_name(self, name):
+        self.names.append(name)
+
+
+def test_on_command(caplog):
+    """
+    The data mode and rename commands are handled without a warning, the other commands are refused in the setup state.
+    """
+    context = FakeContext()
+    state = SetupState(context)
+
+    with caplog.at_level(logging.WARNING, logger="STATE"):
+        state.on_command(BLECommands.DATA_MODE, None)
+        state.on_command(BLECommands.UPDATE_NAME, "bioinfo-renamed")
+        assert caplog.messages == []
+
+        state.on_command(BLECommands.SETUP_MODE, None)
+
+    assert context.transitions == [DataState]
+    assert context.names == ["bioinfo-renamed"]
+    assert caplog.messages == [f"Cannot process {BLECommands.SETUP_MODE} command in setup state"]
@@ -0,0 +1,80 @@
+# Unit tests
+
+from ze07co.frame_parser import FrameParser, calculate_checksum
+
+
+class FakeUART:
+    """Minimal UART that returns the scripted bytes."""
+
+    def __init__(self, data=b''):
+        self.data = bytearray(data)
+
+    def any(self):
+        return len(self.data)
+
+    def readinto(self, buf, nbytes):
+        n = min(nbytes, len(self.data))
+        for i in range(n):
+            buf[i] = self.data[i]
+        self.data = self.data[n:]
+        return n
+
+
+def make_frame(concentration=25):
+    frame = bytearray(b'\xFF\x04\x03\x01\x00\x00\x13\x88\x00')
+    frame[4] = concentration >> 8
+    frame[5] = concentration & 0xFF
+    frame[8] = calculate_checksum(frame)
+    return bytes(frame)
+
+
+def test_checksum():
+    """
+    Checksum is the two's complement of the sum of bytes 1 to 7, also at an offset.
+    """
+    frame = b'\xFF\x04\x03\x01\x00\x25\x13\x88\x00'
+    assert calculate_checksum(frame) == 0x38
+    assert calculate_checksum(memoryview(b'\x00\x00' + frame), 2) == 0x38
+
+
+def test_resync_after_corrupted_frame():
+    """
+    A frame with a bad checksum is rejected and the next frame is found.
+    """
+    parser = FrameParser()
+    corrupted = bytearray(make_frame(1))
+    corrupted[5] ^= 0xFF
+    uart = FakeUART(b'\x04\xFF' + bytes(corrupted) + make_frame(2))
+    assert parser.read_next(uart)
+    assert bytes(parser.frame) == make_frame(2)
+    assert parser.bytes_dropped == 2 + len(corrupted)
+
+
+def test_read_next_in_order():
+    """
+    Queued frames are returned one by one in order, including more than fit in the buffer, skipping corrupted ones.
+    """
+    parser = FrameParser()
+    corrupted = bytearray(make_frame(99))
+    corrupted[5] ^= 0xFF
+    uart = FakeUART(b'\x04' + make_frame(0) + bytes(corrupted) + b''.join(make_frame(i) for i in range(1, 20)))
+    concentrations = []
+    while parser.read_next(uart):
+        concentrations.append(parser.frame[5])
+    assert concentrations == list(range(20))
+    assert parser.frames_parsed == 20
+    assert uart.any() == 0
+
+
+def test_read_next_split_across_reads():
+    """
+    A frame arriving over two reads is found once complete.
+    """
+    parser = FrameParser()
+    uart = FakeUART(make_frame(1) + make_frame(2)[:4])
+    assert parser.read_next(uart)
+    assert bytes(parser.frame) == make_frame(1)
+    assert not parser.read_next(uart)
+    uart.data.extend(make_frame(2)[4:])
+    assert parser.read_next(uart)
+    assert bytes(parser.frame) == make_frame(2)
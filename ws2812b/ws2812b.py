@@ -1,8 +1,8 @@
-import machine
-import neopixel
-import uasyncio as asyncio
+import asyncio
 import logging
 
+from hal import Pin, NeoPixel
+
 from .utilities import get_logger, config_logger
 
 
@@ -18,7 +18,7 @@ class WS2812B:
         self.pin = pin
         self.num_leds = num_leds
         self.brightness = brightness
-        self.np = neopixel.NeoPixel(machine.Pin(self.pin), self.num_leds)
+        self.np = NeoPixel(Pin(self.pin), self.num_leds)
         self.blinking_task = None
         self.running = False
 
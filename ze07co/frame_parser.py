@@ -0,0 +1,126 @@
+FRAME_LENGTH = 9
+START_CHARACTER = 0xFF
+GAS_NAME_CO = 0x04
+
+# Large enough to hold several frames queued in the UART
+BUFFER_SIZE = 64
+
+
+def calculate_checksum(data, offset=0):
+    """
+    Calculate the checksum of the frame starting at `offset`, without copying.
+
+    Args:
+        data (memoryview | bytearray | bytes): buffer holding the frame.
+        offset (int): index of the frame's start character.
+
+    Returns:
+        int: two's complement of the sum of bytes 1 to 7 of the frame.
+    """
+    checksum = 0
+    for i in range(offset + 1, offset + FRAME_LENGTH - 1):
+        checksum += data[i]
+    return (~checksum + 1) & 0xFF
+
+
+class FrameParser:
+    """
+    Streaming decoder for the ZE07-CO 9-byte frame in initiative upload mode.
+
+    The bytes are scanned for the 0xFF 0x04 start characters and checksums are validated in
+    place over a memoryview. `read_next()` returns the queued frames one by one, in order, so
+    every frame reaches a filter. A partial frame at the end of the buffer is kept for the
+    next call.
+
+    All buffers are allocated once on construction.
+
+    Attributes:
+        frame (bytearray): the latest valid frame returned.
+        frames_parsed (int): number of valid frames found.
+        bytes_dropped (int): number of bytes skipped while resynchronizing.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray(BUFFER_SIZE)
+        self._view = memoryview(self._buffer)
+        self._length = 0
+
+        # The views of the free space are created once instead of slicing on every read
+        self._free_views = [self._view[i:] for i in range(BUFFER_SIZE)]
+
+        self.frame = bytearray(FRAME_LENGTH)
+        self.frames_parsed = 0
+        self.bytes_dropped = 0
+
+
+    def read_next(self, uart):
+        """
+        Copy the oldest valid frame not returned yet into `self.frame`, reading from the UART without blocking only
+        when no complete frame is buffered.
+
+        Args:
+            uart (machine.UART): the UART to read from.
+
+        Returns:
+            bool: True if a valid frame was found, False if more bytes are needed.
+        """
+        while not self._next_frame():
+            n_bytes = min(uart.any(), BUFFER_SIZE - self._length)
+            if n_bytes <= 0:
+                return False
+
+            n_bytes = uart.readinto(self._free_views[self._length], n_bytes)
+            if n_bytes is None: # timeout
+                return False
+            self._length += n_bytes
+
+        return True
+
+
+    def reset(self):
+        """Discard all buffered bytes."""
+        self.bytes_dropped += self._length
+        self._length = 0
+
+
+    def _next_frame(self):
+        """
+        Scan the buffer up to the first valid frame, copy it and discard the bytes up to its end.
+
+        Returns:
+            bool: True if a valid frame was found.
+        """
+        index = 0
+        while self._length - index >= FRAME_LENGTH:
+            if self._is_frame(index):
+                self._copy_frame(index)
+                self.frames_parsed += 1
+                self._discard(index + FRAME_LENGTH)
+                return True
+            self.bytes_dropped += 1
+            index += 1
+
+        self._discard(index)
+        return False
+
+
+    def _is_frame(self, index):
+        view = self._view
+        return view[index] == START_CHARACTER and view[index + 1] == GAS_NAME_CO \
+            and calculate_checksum(view, index) == view[index + FRAME_LENGTH - 1]
+
+
+    def _copy_frame(self, index):
+        frame = self.frame
+        view = self._view
+        for i in range(FRAME_LENGTH):
+            frame[i] = view[index + i]
+
+
+    def _discard(self, n_bytes):
+        """Discard the first `n_bytes` bytes, moving the remaining ones to the front of the buffer."""
+        view = self._view
+        remaining = self._length - n_bytes
+        for i in range(remaining):
+            view[i] = view[n_bytes + i]
+        self._length = remaining
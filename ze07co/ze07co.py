@@ -1,10 +1,9 @@
-import time
-import asyncio
-import logging
+from clock import system_clock
+from hal import UART, Pin
+from sensor_driver import SensorDriver, DEFAULT_MEDIAN_SIZE
 
-from machine import UART, Pin
-
-from .utilities import get_logger, config_logger
+from .frame_parser import FrameParser
+from .utilities import get_logger, NAME
 
 # Time to wait for the first character
 TIMEOUT = 50
@@ -14,37 +13,47 @@ TIMEOUT_CHAR = 50
 
 DEFAULT_INTERVAL = 1.0 # once every 1 second
 
+# Reset the sensor if no valid frame is received within this time
+NO_DATA_TIMEOUT_MS = 1500
+
+# Channels that can be despiked with a median filter
+FILTER_CHANNELS = ("co",)
+
+# Deviation from the median above which a concentration counts as rejected, in tenths of a PPM
+REJECT_THRESHOLD = 10
+
 INITIATIVE_UPLOAD_MODE_COMMAND = b'\xFF\x01\x78\x40\x00\x00\x00\x00\x47'
 
 
-class ZE07CO:
+class ZE07CO(SensorDriver):
+    """
+    Driver for the ZE07-CO carbon monoxide sensor in "initiative upload mode", in which the sensor sends value every 1 second.
+
+    The concentration goes through a median filter of `median_size` frames, removing the spikes of single corrupted
+    frames and warm-up transients. Every frame received goes through the filter, not only the newest of each
+    sampling cycle, so the window spans `median_size` seconds. The filterable channel is "co".
+    """
 
-    def __init__(self, uart=0, tx_pin=12, rx_pin=13, interval=DEFAULT_INTERVAL, debug=False) -> None:
+    def __init__(self, uart=0, tx_pin=12, rx_pin=13, interval=DEFAULT_INTERVAL, median_size=DEFAULT_MEDIAN_SIZE, bus=None, debug=False) -> None:
+        """
+        Args:
+            bus (Optional[UART]): the UART of the sensor, e.g. a fake from hal. None to open the `uart` port on the pins.
+        """
 
         self.uart_port = uart
         self.tx_pin = tx_pin
         self.rx_pin = rx_pin
-        self.uart = UART(uart, tx=Pin(tx_pin), rx=Pin(rx_pin), baudrate=9600, bits=8, stop=1, parity=None, timeout=TIMEOUT, timeout_char=TIMEOUT_CHAR)
-
-        self._data = {
-            "concentration": float("-inf"),
-            "range": 500.0,
-            "timestamp": time.ticks_ms()
-        }
-
-        # Config the logger
-        if debug:
-            config_logger(log_level=logging.DEBUG)
+        if bus is not None:
+            self.uart = bus
         else:
-            config_logger(log_level=logging.ERROR)
+            self.uart = UART(uart, tx=Pin(tx_pin), rx=Pin(rx_pin), baudrate=9600, bits=8, stop=1, parity=None, timeout=TIMEOUT, timeout_char=TIMEOUT_CHAR)
 
-        # Events
-        self._destroy_signal = asyncio.Event()
-        self._pause_signal = asyncio.Event()
-        self._resume_signal = asyncio.Event()
+        # Frame parser with a preallocated buffer
+        self._parser = FrameParser()
 
-        # Coroutine tasks
-        self._data_update_task = None
+        super().__init__(NAME, interval=interval, no_data_timeout_ms=NO_DATA_TIMEOUT_MS, streaming=True,
+                         filtered_channels=FILTER_CHANNELS, median_size=median_size,
+                         reject_threshold=REJECT_THRESHOLD, debug=debug)
 
 
     # *** PUBLIC GETTERS ***
@@ -56,8 +65,9 @@ class ZE07CO:
 
         Fields:
         - "concentration" (float): concentration of CO in PPM. float("-inf") if no valid readings yet.
+        - "concentration_deci" (int): concentration of CO in tenths of a PPM. -1 if no valid readings yet.
         - "range" (float): the range of measurement, from 0 to "range" PPM. Should be 500.0 for normal operations.
-        - "timestamp" (int): timestamp of the latest reading. Acquired by time.tick_ms().
+        - "timestamp" (int): milliseconds since boot of the latest reading, from the system clock.
 
         Returns
             dict: The data dict.
@@ -65,72 +75,19 @@ class ZE07CO:
         return self._data.copy()
     
 
-    # *** PUBLIC LIFECYCLE METHODS ***
-
-
-    async def start(self):
-        """
-        Start the sensor in "initiative upload mode", in which the sensor sends value every 1 second.
-        """
-        
-        # Initialize the sensor
-        if not await self._init_sensor():
-            return False
-        
-        # Start the task
-        self._data_update_task = asyncio.create_task(self._data_update_service())
-        
-        return True
-
-
-    def pause(self):
-        """Pause data collection."""
-        get_logger().info("Pausing data collection...")
-        self._pause_signal.set()
-
-
-    def resume(self):
-        """Resume data collection."""
-        get_logger().info("Resuming data collection...")
-        self._pause_signal.clear()
-        self._resume_signal.set()
-
-
-    async def destroy(self):
-        """
-        Destroy the ZE07CO instance and freeing up resources.
-        """
-
-        # Send a destroy signal
-        get_logger().info("Sending destroy signal...")
-        self._destroy_signal.set()
-
-        # Wait for tasks to finish
-        try:
-            if isinstance(self._data_update_task, asyncio.Task):
-                await asyncio.wait_for(self._data_update_task, timeout=10)
-
-        except asyncio.TimeoutError:
-            get_logger().warning("Destroy signal timed out, sending task cancel signal...")
-            
-            # cancel the tasks
-
-            if isinstance(self._data_update_task, asyncio.Task):
-                self._data_update_task.cancel()
-            
-            # wait for the tasks to be cancelled
-
-            if isinstance(self._data_update_task, asyncio.Task):
-                await asyncio.wait_for(self._data_update_task, timeout=10)
-
-
-    # *** PRIVATE METHODS ***
+    # *** SENSOR DRIVER HOOKS ***
 
 
     async def _init_sensor(self):
         """
         Initialize the sensor by explicitly setting to "initiative upload mode" with the command.
         """
+
+        # Drop any partial frame left from before
+        if self.uart.any() > 0:
+            self.uart.read()  # Clear buffer
+        self._parser.reset()
+
         get_logger().info("Initializing...")
         bytes = self.uart.write(INITIATIVE_UPLOAD_MODE_COMMAND)
         if bytes is None:
@@ -143,76 +100,35 @@ class ZE07CO:
         return True
 
     
-    async def _data_update_service(self):
-        
-        try:
-            while not self._destroy_signal.is_set():
-
-                if self._pause_signal.is_set():
-                    get_logger().info("Data collection paused. Waiting to resume...")
-                    await self._resume_signal.wait()
-                    self._resume_signal.clear()
-
-                get_logger().info(f"starting a data cycle at timestamp {time.ticks_ms()}...")
-
-                nRetries = 5
-                while self.uart.any() < 9 and nRetries > 0:
-                    await asyncio.sleep(0.3)
-                    nRetries -= 1
-                    get_logger().debug(f"Retrying... Remaining retries: {nRetries}")
-                    if nRetries == 0:
-                        if self.uart.any() > 0:
-                            self.uart.read()  # Clear buffer
-                        await self._init_sensor() # reset the sensor
-                        self._data["concentration"] = float("-inf")
-                        get_logger().debug(f"Resetting...")
-
-                # Read data
-                raw_data = self.uart.read()
-
-                if raw_data is None: # timeout
-                    await asyncio.sleep(1)
-                    continue # skip this data
-                
-                get_logger().info(f"Received {len(raw_data)} bytes from sensor")
-                if len(raw_data) < 9:
-                    get_logger().warning(f"too short")
-                    # TODO: realign data
-                    continue
-
-                # Validation: checksum
-                checksum = self._caclulate_checksum(raw_data)
-                if checksum != raw_data[8]:
-                    get_logger().warning(f"invalid checksum, skipping frame (should be {checksum} but received {raw_data[8]})")
-                    continue
-
-                # Parse data
-                concentration, full_range = self._parse_data(raw_data)
-                get_logger().info(f"Parse result: {concentration} PPM")
-
-                self._data["concentration"] = concentration
-                self._data["range"] = full_range
-                self._data["timestamp"] = time.ticks_ms()
-
-
-            get_logger().info("data update service stopped via destroy signal")
-        except asyncio.CancelledError:
-            get_logger().info("data update service cancelled")
-
+    async def _acquire(self):
+        """
+        Get the next valid frame received, in order, so every frame is filtered and the newest one is published last.
 
-    def _parse_data(self, data):
-        concentration = ((data[4] << 8) + data[5]) * 0.1    
-        full_range = (data[6] * 256 + data[7]) * 0.1 # same as shifting 8 bits 
-        return concentration, full_range
-    
+        Returns:
+            bytearray: the frame, or None if no new frame yet.
+        """
+        if self._parser.read_next(self.uart):
+            return self._parser.frame
+        return None
 
-    def _caclulate_checksum(self, data):
-        # Skip the first byte and take all except the last byte
-        tempq = sum(data[1:8]) & 0xFF # Sum all bytes except the first and last
 
-        # Two's complement
-        tempq = (~tempq + 1) & 0xFF  # Keep it within 8 bits
+    def _parse_data(self, data):
+        """
+        Parse a validated frame into the data dict in place.
 
-        return tempq
+        Args:
+            data (bytearray): a 9-byte frame, validated by the frame parser.
+        """
+        self._data["concentration_deci"] = self._filter("co", (data[4] << 8) + data[5])
+        self._data["concentration"] = self._data["concentration_deci"] * 0.1
+        self._data["range"] = (data[6] * 256 + data[7]) * 0.1 # same as shifting 8 bits 
+        get_logger().debug("Parse result: %s PPM", self._data["concentration"])
 
 
+    def _invalid_data(self):
+        return {
+            "concentration": float("-inf"),
+            "concentration_deci": -1,
+            "range": 500.0,
+            "timestamp": system_clock.uptime_ms()
+        }